@@ -1,13 +1,22 @@
 import time
+import json
 import logging
 import uuid
 from datetime import datetime
 from app.services.llm_service import llm_service
 from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
-from app.services.chatbot import document_chatbot
+from app.services.chatbot import document_chatbot, LLM_CONTEXT_CHUNKS, LLM_CONTEXT_TOKENS
+from app.services.embedding_service import embedding_service
+from app.services.retrieval_index import retrieval_index_cache
+from app.services.document_store import document_store
+from app.services.text_analysis import get_document_analysis
+from app.services.chunker import CHAT_CHUNK_TOKENS, CHAT_CHUNK_OVERLAP_TOKENS
 from app.services.document_parser import extract_text  # Your existing document parser
+from app.utils.helpers import spool_upload, UploadTooLargeError
 import tempfile
 import os
 
@@ -18,15 +27,16 @@ router = APIRouter()
 
 # Request Models
 class UploadDocumentRequest(BaseModel):
-    """For uploading document via text"""
-    document_text: str = Field(..., min_length=50, max_length=50000)
+    """For uploading document via text, or referencing an ingested document"""
+    document_text: Optional[str] = Field(default=None, min_length=50, max_length=50000)
+    document_id: Optional[str] = Field(default=None, description="ID returned by /upload_file/")
     document_name: Optional[str] = Field(default="untitled", description="Name of document")
     
     @validator('document_text')
     def validate_document(cls, v):
-        if not v.strip():
+        if v is not None and not v.strip():
             raise ValueError('Document text cannot be empty')
-        return v.strip()    
+        return v.strip() if v is not None else v
 
 class ChatQuestionRequest(BaseModel):
     session_id: str
@@ -51,6 +61,7 @@ class UploadDocumentResponse(BaseModel):
     document_name: str
     document_length: int
     chunks_created: int
+    chunk_stats: Optional[Dict[str, Any]] = None
     message: str
     timestamp: str
 
@@ -60,7 +71,9 @@ class ChatResponse(BaseModel):
     question: str
     answer: str
     confidence_score: Optional[float] = None
+    match_type: Optional[str] = None
     relevant_context: Optional[str] = None
+    sources: Optional[List[Dict[str, Any]]] = None
     processing_time: float
     timestamp: str
 
@@ -90,6 +103,41 @@ async def log_chat_analytics(
         f"Time: {processing_time:.2f}s, Success: {success}"
     )
 
+async def answer_with_llm(request: ChatQuestionRequest) -> Dict[str, Any]:
+    """Retrieve excerpts from the session index, answer with the LLM, record the exchange"""
+    prepared = await run_in_threadpool(
+        document_chatbot.prepare_llm_answer, request.session_id, request.question
+    )
+    if "error" in prepared:
+        return prepared
+
+    answer = await run_in_threadpool(
+        llm_service.chat_with_llm,
+        "",
+        request.question,
+        request.language,
+        prepared["conversation_history"],
+        chunks=prepared["chunks"]
+    )
+    await run_in_threadpool(document_chatbot.record_answer, request.session_id, request.question, answer)
+
+    context = " ".join(prepared["chunks"])
+    return {
+        "answer": answer,
+        "confidence_score": round(prepared["confidence"], 3),
+        "match_type": prepared["match_type"],
+        "relevant_context": context[:500] + "..." if len(context) > 500 else context,
+        "sources": prepared["sources"]
+    }
+
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+def format_stream_event(event: str, data: Dict[str, Any], stream_format: str) -> str:
+    """One server-sent event, or one NDJSON line with an "event" field"""
+    if stream_format == "ndjson":
+        return json.dumps({"event": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # API Endpoints
 
 @router.post("/chat/upload/", response_model=UploadDocumentResponse)
@@ -98,17 +146,37 @@ async def upload_document_for_chat(request: UploadDocumentRequest):
     Upload a document to start a chat session.
     Returns a session_id that you'll use for all subsequent questions.
     """
+    document_text = request.document_text
+    document_name = request.document_name
+    metadata = {"document_name": document_name}
+    analysis = None
+
+    if request.document_id:
+        # Already parsed and analyzed at ingest: reuse instead of re-uploading
+        doc = document_store.get_document(request.document_id)
+        analysis = await run_in_threadpool(get_document_analysis, request.document_id) if doc else None
+        if analysis is None:
+            raise HTTPException(status_code=404, detail=f"Document {request.document_id} not found")
+        document_text = analysis.text
+        if document_name == "untitled":
+            document_name = doc["filename"]
+        metadata = {"document_name": document_name, "document_id": request.document_id, "filename": doc["filename"]}
+    elif not document_text:
+        raise HTTPException(status_code=400, detail="Provide either document_text or document_id")
+
     try:
         # Generate unique session ID
         session_id = str(uuid.uuid4())
         
-        logger.info(f"Creating chat session for document: {request.document_name}")
+        logger.info(f"Creating chat session for document: {document_name}")
         
         # Create session with document
-        result = document_chatbot.create_session(
+        result = await run_in_threadpool(
+            document_chatbot.create_session,
             session_id=session_id,
-            document_text=request.document_text,
-            metadata={"document_name": request.document_name}
+            document_text=document_text,
+            metadata=metadata,
+            analysis=analysis
         )
         
         if "error" in result:
@@ -117,9 +185,10 @@ async def upload_document_for_chat(request: UploadDocumentRequest):
         return UploadDocumentResponse(
             success=True,
             session_id=session_id,
-            document_name=request.document_name,
-            document_length=len(request.document_text),
+            document_name=document_name,
+            document_length=len(document_text),
             chunks_created=result.get("chunks_count", 0),
+            chunk_stats=result.get("chunk_stats"),
             message=f"Document uploaded successfully. Use session_id '{session_id}' to ask questions.",
             timestamp=datetime.now().isoformat()
         )
@@ -148,22 +217,16 @@ async def upload_document_file_for_chat(
                 detail="Unsupported file type. Allowed: .pdf, .docx, .txt"
             )
         
-        # Read file
-        file_content = await file.read()
+        # Stream the file to disk and extract from there
+        try:
+            spooled = await spool_upload(file, tempfile.gettempdir(), suffix=f".{file_ext}")
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Extract text
-        if file_ext == "txt":
-            extracted_text = file_content.decode('utf-8')
-        else:
-            # Save temporarily and extract
-            with tempfile.NamedTemporaryFile(suffix=f".{file_ext}", delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_path = temp_file.name
-            
-            try:
-                extracted_text = extract_text(temp_path, file_ext)
-            finally:
-                os.unlink(temp_path)
+        try:
+            extracted_text = await run_in_threadpool(extract_text, spooled["path"], file_ext)
+        finally:
+            os.unlink(spooled["path"])
         
         # Validate extracted text
         if len(extracted_text.split()) < 20:
@@ -177,7 +240,8 @@ async def upload_document_file_for_chat(
         doc_name = document_name or filename
         
         # Create session
-        result = document_chatbot.create_session(
+        result = await run_in_threadpool(
+            document_chatbot.create_session,
             session_id=session_id,
             document_text=extracted_text,
             metadata={"document_name": doc_name, "filename": filename}
@@ -192,6 +256,7 @@ async def upload_document_file_for_chat(
             document_name=doc_name,
             document_length=len(extracted_text),
             chunks_created=result.get("chunks_count", 0),
+            chunk_stats=result.get("chunk_stats"),
             message=f"File '{filename}' uploaded successfully. Use session_id '{session_id}' to ask questions.",
             timestamp=datetime.now().isoformat()
         )
@@ -210,17 +275,23 @@ async def ask_question(
     """
     Ask a question about your uploaded document.
     Use the session_id you received when uploading the document.
+    With use_llm, the LLM answers from the best-matching excerpts that fit
+    the prompt budget; `sources` lists the chunks used.
     """
     start_time = time.time()
     
     try:
         logger.info(f"Processing question for session: {request.session_id}")
         
-        # Get answer from stored session
-        result = document_chatbot.answer_from_session(
-            session_id=request.session_id,
-            question=request.question
-        )
+        if request.use_llm and llm_service.is_available():
+            result = await answer_with_llm(request)
+        else:
+            # Get answer from stored session
+            result = await run_in_threadpool(
+                document_chatbot.answer_from_session,
+                session_id=request.session_id,
+                question=request.question
+            )
         
         if "error" in result:
             if "not found" in result["error"].lower():
@@ -247,7 +318,9 @@ async def ask_question(
             question=request.question,
             answer=result.get("answer", ""),
             confidence_score=result.get("confidence_score"),
+            match_type=result.get("match_type"),
             relevant_context=result.get("relevant_context"),
+            sources=result.get("sources"),
             processing_time=processing_time,
             timestamp=datetime.now().isoformat()
         )
@@ -271,6 +344,85 @@ async def ask_question(
             detail=f"Failed to answer question: {str(e)}"
         )
 
+@router.post("/chat/ask/stream/")
+async def ask_question_stream(
+    request: ChatQuestionRequest,
+    stream_format: str = Query(default="sse", alias="format", pattern="^(sse|ndjson)$")
+):
+    """
+    Streaming variant of /chat/ask/ (server-sent events, or NDJSON with
+    ?format=ndjson). Events:
+      sources  retrieved chunks, sent as soon as retrieval finishes
+      token    answer text as the LLM generates it (one event for extractive answers)
+      done     the full answer; it is added to the conversation history
+      error    the LLM failed after the stream started
+    """
+    start_time = time.time()
+    use_llm = request.use_llm and llm_service.is_available()
+
+    # Retrieval happens before the response starts, so a missing session is still a 404
+    if use_llm:
+        prepared = await run_in_threadpool(
+            document_chatbot.prepare_llm_answer, request.session_id, request.question
+        )
+    else:
+        prepared = await run_in_threadpool(
+            document_chatbot.answer_from_session,
+            session_id=request.session_id,
+            question=request.question
+        )
+    if "error" in prepared:
+        status_code = 404 if "not found" in prepared["error"].lower() else 400
+        raise HTTPException(status_code=status_code, detail=prepared["error"])
+
+    confidence = prepared["confidence"] if use_llm else prepared["confidence_score"]
+
+    async def events():
+        yield format_stream_event("sources", {
+            "session_id": request.session_id,
+            "confidence_score": round(confidence, 3),
+            "match_type": prepared["match_type"],
+            "sources": prepared["sources"]
+        }, stream_format)
+
+        if use_llm:
+            pieces = []
+            try:
+                tokens = llm_service.stream_chat_with_llm(
+                    question=request.question,
+                    language=request.language,
+                    conversation_history=prepared["conversation_history"],
+                    chunks=prepared["chunks"]
+                )
+                async for piece in iterate_in_threadpool(tokens):
+                    pieces.append(piece)
+                    yield format_stream_event("token", {"text": piece}, stream_format)
+            except Exception as e:
+                logger.error(f"Error streaming answer: {str(e)}")
+                await log_chat_analytics(request.session_id, len(request.question), time.time() - start_time, False)
+                yield format_stream_event("error", {"detail": f"Failed to answer question: {str(e)}"}, stream_format)
+                return
+            answer = "".join(pieces).strip()
+            await run_in_threadpool(document_chatbot.record_answer, request.session_id, request.question, answer)
+        else:
+            # Extractive answers are complete (and recorded) already
+            answer = prepared["answer"]
+            yield format_stream_event("token", {"text": answer}, stream_format)
+
+        processing_time = time.time() - start_time
+        await log_chat_analytics(request.session_id, len(request.question), processing_time, True)
+        yield format_stream_event("done", {
+            "answer": answer,
+            "processing_time": processing_time,
+            "timestamp": datetime.now().isoformat()
+        }, stream_format)
+
+    return StreamingResponse(
+        events(),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/chat/history/{session_id}/", response_model=ConversationHistoryResponse)
 async def get_chat_history(session_id: str):
     """
@@ -407,7 +559,9 @@ async def get_chat_stats():
         "system_info": {
             "max_document_length": 50000,
             "max_question_length": 500,
-            "session_storage": "In-memory",
+            "chunking": {"max_tokens": CHAT_CHUNK_TOKENS, "overlap_tokens": CHAT_CHUNK_OVERLAP_TOKENS},
+            "llm_context": {"max_chunks": LLM_CONTEXT_CHUNKS, "token_budget": LLM_CONTEXT_TOKENS},
+            "session_storage": "SQLite + memory-mapped embedding snapshots (shared by workers)",
             "models_used": [
                 "Sentence Transformers (all-MiniLM-L6-v2)"
             ]
@@ -420,61 +574,8 @@ async def get_chat_stats():
             "confidence_scoring": True,
             "context_retrieval": True
         },
-        "supported_formats": ["PDF", "DOCX", "TXT"]
+        "supported_formats": ["PDF", "DOCX", "TXT"],
+        "embeddings": embedding_service.get_stats(),
+        "retrieval_indexes": retrieval_index_cache.get_stats(),
+        "sessions": document_chatbot.sessions.get_stats()
     }
-    
-
-
-@router.post("/chat/ask/", response_model=ChatResponse)
-async def ask_question(
-    request: ChatQuestionRequest,
-    background_tasks: BackgroundTasks
-):
-    start_time = time.time()
-    
-    try:
-        if request.use_llm and llm_service.is_available():
-            # Get document from session
-            session = document_chatbot.sessions.get(request.session_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
-            
-            # Use LLM for answer
-            answer = llm_service.chat_with_llm(
-                document_context=session["document_text"],
-                question=request.question,
-                language=request.language,
-                conversation_history=session.get("conversation_history")
-            )
-            
-            result = {
-                "answer": answer,
-                "confidence_score": 0.95,  # LLM answers are generally high confidence
-                "relevant_context": session["document_text"][:500]
-            }
-        else:
-            # Use existing semantic search method
-            result = document_chatbot.answer_from_session(
-                session_id=request.session_id,
-                question=request.question
-            )
-        
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
-        
-        processing_time = time.time() - start_time
-        
-        return ChatResponse(
-            success=True,
-            session_id=request.session_id,
-            question=request.question,
-            answer=result.get("answer", ""),
-            confidence_score=result.get("confidence_score"),
-            relevant_context=result.get("relevant_context"),
-            processing_time=processing_time,
-            timestamp=datetime.now().isoformat()
-        )
-        
-    except Exception as e:
-        logger.error(f"Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,12 +1,18 @@
 import os
-import shutil
 import uuid
-from datetime import datetime
-from typing import Optional, Dict
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from typing import Optional, Dict, Any
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel, Field
-from app.services.document_parser import extract_text
+from app.services.document_parser import extract_document, shutdown_pdf_pool
+from app.services.extraction_cache import extraction_cache
+from app.services.document_store import document_store
+from app.services.ingestion_jobs import ingestion_queue, QueueFullError, JobCancelled
+from app.services.mapped_text import mapped_text_cache
+from app.services.text_analysis import analyze_text, analysis_cache
+from app.services.vector_index import vector_index, index_document, VECTOR_INDEX_ENABLED
+from app.utils.helpers import spool_upload, UploadTooLargeError, parse_byte_range
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,9 +22,7 @@ UPLOAD_DIR = "temp_uploads"
 STORAGE_DIR = "document_storage"  # NEW: For storing documents
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(STORAGE_DIR, exist_ok=True)
-
-# In-memory document storage (replace with database in production)
-documents_db: Dict[str, dict] = {}
+INGEST_RETRY_AFTER_SECONDS = 5
 
 # ============= REQUEST/RESPONSE MODELS =============
 
@@ -32,8 +36,29 @@ class DocumentUploadResponse(BaseModel):
     character_count: int
     extraction_preview: str  # First 500 chars
     uploaded_at: str
+    content_hash: Optional[str] = None
+    cache_hit: bool = False
     message: str
 
+class IngestionJobResponse(BaseModel):
+    success: bool
+    job_id: str
+    status: str
+    status_url: str
+    message: str
+
+class IngestionJobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed, cancelled
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    elapsed: Optional[float] = None
+    cancel_requested: bool = False
+    result: Optional[DocumentUploadResponse] = None
+    error: Optional[str] = None
+    error_status_code: Optional[int] = None
+
 class DocumentInfoResponse(BaseModel):
     document_id: str
     filename: str
@@ -48,37 +73,131 @@ class AllDocumentsResponse(BaseModel):
     success: bool
     total_documents: int
     documents: list
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
 
 # ============= HELPER FUNCTIONS =============
 
-def save_document_metadata(doc_id: str, filename: str, file_ext: str, 
-                          extracted_text: str, file_size: int):
-    """Save document metadata to in-memory storage"""
-    documents_db[doc_id] = {
-        "document_id": doc_id,
-        "filename": filename,
-        "file_type": file_ext,
-        "file_size_bytes": file_size,
-        "extracted_text": extracted_text,
-        "word_count": len(extracted_text.split()),
-        "character_count": len(extracted_text),
-        "uploaded_at": datetime.now().isoformat(),
-        "storage_path": os.path.join(STORAGE_DIR, f"{doc_id}.txt")
-    }
-    
-    # Save full text to file
-    with open(documents_db[doc_id]["storage_path"], "w", encoding="utf-8") as f:
-        f.write(extracted_text)
-    
-    return documents_db[doc_id]
+def extract_upload(payload: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse a spooled upload, validate it and store its extraction and analysis"""
+    file_ext = payload["file_type"]
+    content_hash = payload["content_hash"]
+
+    # Extract text and its page index straight from the spooled file
+    try:
+        extraction = extract_document(payload["path"], file_ext)
+        extracted_text = extraction["text"]
+    except Exception as e:
+        logger.error(f"Failed to parse document: {str(e)}")
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Failed to parse document: {str(e)}"
+        )
+
+    # Validate extracted text
+    if not extracted_text or len(extracted_text.strip()) < 10:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not extract meaningful text from document."
+        )
+
+    if job["is_cancelled"]():
+        raise JobCancelled()
+
+    cached = extraction_cache.put(
+        content_hash, file_ext, extracted_text, extraction["page_index"]
+    )
+
+    # Sentence / topic / chunk analysis shared by summarize, chat and flashcards
+    analysis_cache.save(content_hash, file_ext, analyze_text(extracted_text))
+    return cached
+
+
+def ingest_document(payload: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ingestion job handler: parse a spooled upload (unless its extraction is
+    already cached) and register the document. Runs in an ingestion worker.
+    """
+    filename = payload["filename"]
+    file_ext = payload["file_type"]
+    content_hash = payload["content_hash"]
+
+    # 1. Reuse a previous extraction of the same bytes if we have one
+    cached = extraction_cache.get(content_hash, file_ext)
+    cache_hit = cached is not None
+
+    if cache_hit:
+        logger.info(f"Extraction cache hit for {filename} ({content_hash[:12]})")
+    else:
+        # 2. Extract, validate and store the text, page index and analysis
+        cached = extract_upload(payload, job)
+
+    if job["is_cancelled"]():
+        raise JobCancelled()
+
+    # 3. Save document metadata (a reference to the stored extraction)
+    doc_id = str(uuid.uuid4())
+    try:
+        doc_metadata = document_store.add_document(
+            doc_id, filename, file_ext, payload["file_size"], cached
+        )
+    except LookupError:
+        # The last document sharing this extraction was deleted meanwhile
+        logger.info(f"Extraction {content_hash[:12]} was released during ingest, extracting again")
+        cache_hit = False
+        doc_metadata = document_store.add_document(
+            doc_id, filename, file_ext, payload["file_size"], extract_upload(payload, job)
+        )
+    preview = doc_metadata["preview"]
+
+    # 4. Make its chunks searchable across the corpus (upload still succeeds without it)
+    if VECTOR_INDEX_ENABLED:
+        try:
+            index_document(doc_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not add {doc_id} to the vector index: {e}")
+
+    return DocumentUploadResponse(
+        success=True,
+        document_id=doc_id,
+        filename=filename,
+        file_type=file_ext,
+        file_size_bytes=payload["file_size"],
+        word_count=doc_metadata["word_count"],
+        character_count=doc_metadata["character_count"],
+        extraction_preview=preview[:500] + "..." if doc_metadata["character_count"] > 500 else preview,
+        uploaded_at=doc_metadata["uploaded_at"],
+        content_hash=content_hash,
+        cache_hit=cache_hit,
+        message=f"Document '{filename}' uploaded successfully. Use document_id '{doc_id}' for future operations."
+    ).dict()
+
+
+def remove_spooled_upload(payload: Dict[str, Any]):
+    if os.path.exists(payload["path"]):
+        os.remove(payload["path"])
+
+
+ingestion_queue.register("document", ingest_document, cleanup=remove_spooled_upload)
 
 # ============= API ENDPOINTS =============
 
-@router.post("/upload_file/", response_model=DocumentUploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+@router.on_event("startup")
+async def start_ingestion_workers():
+    """Every worker process polls the shared job table, not just the one that accepted the upload"""
+    ingestion_queue.start()
+
+
+@router.on_event("shutdown")
+async def stop_pdf_pool():
+    """Reap the PDF extraction processes instead of leaving them to the interpreter exit"""
+    await run_in_threadpool(shutdown_pdf_pool)
+
+
+@router.post("/upload_file/", status_code=202, response_model=IngestionJobResponse)
+async def upload_file(request: Request, file: UploadFile = File(...)):
     """
-    Upload and parse a document file (PDF, DOCX, TXT).
-    Returns document ID for future reference.
+    Upload a document file (PDF, DOCX, TXT) for ingestion.
+    Returns 202 with a job_id; poll the job status URL for the document_id.
     """
     try:
         # 1. Validate file type
@@ -91,63 +210,37 @@ async def upload_file(file: UploadFile = File(...)):
                 detail="Unsupported file type. Allowed: .pdf, .docx, .txt"
             )
 
-        # 2. Read file content and check size
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        # Limit file size to 10MB
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(
-                status_code=400,
-                detail="File too large. Maximum size is 10MB."
-            )
+        # 2. Stream the upload to disk, hashing and size-checking on the fly
+        try:
+            spooled = await spool_upload(file, UPLOAD_DIR, suffix=f".{file_ext}")
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        # 3. Save file temporarily
-        doc_id = str(uuid.uuid4())
-        temp_path = os.path.join(UPLOAD_DIR, f"{doc_id}.{file_ext}")
-        
-        with open(temp_path, "wb") as buffer:
-            buffer.write(file_content)
+        payload = {
+            "path": spooled["path"],
+            "filename": filename,
+            "file_type": file_ext,
+            "file_size": spooled["size"],
+            "content_hash": spooled["sha256"]
+        }
 
-        # 4. Extract text
+        # 3. Hand off to the ingestion workers (503 when the queue is full)
         try:
-            extracted_text = extract_text(temp_path, file_ext)
-        except Exception as e:
-            os.remove(temp_path)
-            logger.error(f"Failed to parse document: {str(e)}")
+            job = ingestion_queue.submit("document", payload)
+        except QueueFullError as e:
+            remove_spooled_upload(payload)
             raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to parse document: {str(e)}"
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)}
             )
 
-        # 5. Validate extracted text
-        if not extracted_text or len(extracted_text.strip()) < 10:
-            os.remove(temp_path)
-            raise HTTPException(
-                status_code=400,
-                detail="Could not extract meaningful text from document."
-            )
-
-        # 6. Save document metadata
-        doc_metadata = save_document_metadata(
-            doc_id, filename, file_ext, extracted_text, file_size
-        )
-
-        # 7. Clean up temp file
-        os.remove(temp_path)
-
-        # 8. Return response
-        return DocumentUploadResponse(
+        return IngestionJobResponse(
             success=True,
-            document_id=doc_id,
-            filename=filename,
-            file_type=file_ext,
-            file_size_bytes=file_size,
-            word_count=doc_metadata["word_count"],
-            character_count=doc_metadata["character_count"],
-            extraction_preview=extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
-            uploaded_at=doc_metadata["uploaded_at"],
-            message=f"Document '{filename}' uploaded successfully. Use document_id '{doc_id}' for future operations."
+            job_id=job["job_id"],
+            status=job["status"],
+            status_url=str(request.url_for("get_ingestion_job", job_id=job["job_id"])),
+            message=f"Document '{filename}' accepted for processing."
         )
 
     except HTTPException:
@@ -160,45 +253,125 @@ async def upload_file(file: UploadFile = File(...)):
         )
 
 
+@router.get("/ingest/jobs/{job_id}/", response_model=IngestionJobStatusResponse)
+async def get_ingestion_job(
+    job_id: str,
+    wait: float = Query(default=0, ge=0, le=30, description="Long-poll for up to this many seconds")
+):
+    """
+    Get the status of an ingestion job.
+    With ?wait=N the request blocks until the job finishes or N seconds pass.
+    """
+    if wait > 0:
+        job = await ingestion_queue.wait_for_job(job_id, wait)
+    else:
+        job = ingestion_queue.get_job(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return IngestionJobStatusResponse(**job)
+
+
+@router.delete("/ingest/jobs/{job_id}/", response_model=IngestionJobStatusResponse)
+async def cancel_ingestion_job(job_id: str):
+    """
+    Cancel an ingestion job. Queued jobs are cancelled at once (freeing
+    their queue slot); running jobs stop before the document is saved.
+    """
+    job = ingestion_queue.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return IngestionJobStatusResponse(**job)
+
+
+@router.get("/ingest/stats/")
+async def get_ingestion_stats():
+    """Get ingestion queue statistics"""
+    return ingestion_queue.get_stats()
+
+
 @router.get("/documents/", response_model=AllDocumentsResponse)
-async def get_all_documents():
+async def get_all_documents(
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page")
+):
     """
-    Get list of all uploaded documents with metadata.
+    Get uploaded documents with metadata, oldest first, one page at a time.
     """
     try:
+        try:
+            page = document_store.list_documents(limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         docs_list = []
-        for doc_id, doc_data in documents_db.items():
+        for doc_data in page["documents"]:
             docs_list.append({
-                "document_id": doc_id,
+                "document_id": doc_data["document_id"],
                 "filename": doc_data["filename"],
                 "file_type": doc_data["file_type"],
                 "file_size_bytes": doc_data["file_size_bytes"],
                 "word_count": doc_data["word_count"],
                 "uploaded_at": doc_data["uploaded_at"],
-                "preview": doc_data["extracted_text"][:200] + "..."
+                "preview": doc_data["preview"] + "..."
             })
         
         return AllDocumentsResponse(
             success=True,
-            total_documents=len(docs_list),
-            documents=docs_list
+            total_documents=document_store.get_stats()["total_documents"],
+            documents=docs_list,
+            next_cursor=page["next_cursor"]
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Registered before /documents/{document_id}/ so "stats" is not taken as an id
+@router.get("/documents/stats/")
+async def get_document_stats():
+    """
+    Get statistics about uploaded documents.
+    """
+    stats = document_store.get_stats()
+    total_documents = stats["total_documents"]
+    
+    if not total_documents:
+        return {
+            "total_documents": 0,
+            "total_size_bytes": 0,
+            "total_words": 0,
+            "file_types": {},
+            "extraction_cache": extraction_cache.get_stats()
+        }
+    
+    total_size = stats["total_size_bytes"]
+    
+    return {
+        "total_documents": total_documents,
+        "total_size_bytes": total_size,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "total_words": stats["total_words"],
+        "file_types": stats["file_types"],
+        "average_document_size": round(total_size / total_documents),
+        "extraction_cache": extraction_cache.get_stats()
+    }
+
+
 @router.get("/documents/{document_id}/", response_model=DocumentInfoResponse)
 async def get_document_info(document_id: str):
     """
     Get detailed information about a specific document.
     """
-    if document_id not in documents_db:
+    doc = document_store.get_document(document_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    doc = documents_db[document_id]
-    
     return DocumentInfoResponse(
         document_id=document_id,
         filename=doc["filename"],
@@ -207,7 +380,7 @@ async def get_document_info(document_id: str):
         word_count=doc["word_count"],
         character_count=doc["character_count"],
         uploaded_at=doc["uploaded_at"],
-        text_preview=doc["extracted_text"][:1000] + "..."
+        text_preview=doc["preview"][:1000] + "..."
     )
 
 
@@ -217,15 +390,13 @@ async def get_document_full_text(document_id: str):
     Get the full extracted text of a document.
     WARNING: Can be very large!
     """
-    if document_id not in documents_db:
+    doc = document_store.get_document(document_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    doc = documents_db[document_id]
-    
-    # Read from stored file
+    # Load the compressed text from the store
     try:
-        with open(doc["storage_path"], "r", encoding="utf-8") as f:
-            full_text = f.read()
+        full_text = document_store.get_text(document_id)
         
         return {
             "success": True,
@@ -239,60 +410,147 @@ async def get_document_full_text(document_id: str):
         raise HTTPException(status_code=500, detail="Failed to read document")
 
 
-@router.delete("/documents/{document_id}/")
-async def delete_document(document_id: str):
+@router.get("/documents/{document_id}/full_text/stream/")
+async def stream_document_full_text(
+    document_id: str,
+    request: Request,
+    offset: int = Query(default=0, ge=0, description="First character to return"),
+    limit: Optional[int] = Query(default=None, ge=0, description="Maximum characters to return")
+):
     """
-    Delete a document and its stored data.
+    Stream the full text (or a window of it) as text/plain from a
+    memory-mapped copy, without building the whole string.
+    Supports HTTP Range (bytes) or offset/limit character windows.
     """
-    if document_id not in documents_db:
+    try:
+        # First access materializes the text file (SQLite read, decompress, write)
+        mapped = await run_in_threadpool(mapped_text_cache.open_document, document_id)
+    except Exception as e:
+        logger.error(f"Error mapping document text: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to read document")
+
+    if mapped is None:
         raise HTTPException(status_code=404, detail="Document not found")
-    
-    doc = documents_db[document_id]
-    
-    # Delete stored file
+
+    headers = {"Accept-Ranges": "bytes"}
+    status_code = 200
+    range_header = request.headers.get("range")
+
+    if range_header:
+        byte_range = parse_byte_range(range_header, mapped.byte_size)
+        if byte_range is None:
+            size = mapped.byte_size
+            mapped.close()
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+        start, end = byte_range[0], byte_range[1] + 1
+        headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{mapped.byte_size}"
+        status_code = 206
+    else:
+        start, end = mapped.char_range(offset, limit)
+        headers["X-Char-Offset"] = str(min(offset, mapped.character_count))
+        headers["X-Total-Chars"] = str(mapped.character_count)
+
+    headers["Content-Length"] = str(end - start)
+
+    def body():
+        try:
+            yield from mapped.iter_bytes(start, end)
+        finally:
+            mapped.close()
+
+    return StreamingResponse(
+        body(),
+        status_code=status_code,
+        media_type="text/plain; charset=utf-8",
+        headers=headers
+    )
+
+
+@router.get("/documents/{document_id}/pages/")
+async def get_document_pages(document_id: str):
+    """
+    Get the page/offset index captured at extraction time: character
+    offsets of every page and heading candidates.
+    """
+    page_index = document_store.get_page_index(document_id)
+    if page_index is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return {
+        "success": True,
+        "document_id": document_id,
+        "total_pages": len(page_index["pages"]),
+        "pages": [
+            {"page": page, "start": start, "end": end}
+            for page, start, end in page_index["pages"]
+        ],
+        "headings": [
+            {"offset": offset, "page": page, "text": text}
+            for offset, page, text in page_index["headings"]
+        ]
+    }
+
+
+@router.get("/documents/{document_id}/pages/{page_number}/")
+async def get_document_page(document_id: str, page_number: int):
+    """
+    Get the text of a single page, sliced by offset from the mapped text.
+    """
+    page_index = document_store.get_page_index(document_id)
+    if page_index is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    pages = page_index["pages"]
+    if not 1 <= page_number <= len(pages):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Page {page_number} not found. Document has {len(pages)} pages."
+        )
+
+    _, start, end = pages[page_number - 1]
     try:
-        if os.path.exists(doc["storage_path"]):
-            os.remove(doc["storage_path"])
+        mapped = await run_in_threadpool(mapped_text_cache.open_document, document_id)
+        with mapped:
+            page_text = mapped.read_chars(start, end - start)
     except Exception as e:
-        logger.warning(f"Could not delete file: {str(e)}")
-    
-    # Remove from database
-    del documents_db[document_id]
-    
+        logger.error(f"Error reading page: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to read document")
+
     return {
         "success": True,
-        "message": f"Document '{doc['filename']}' deleted successfully",
-        "document_id": document_id
+        "document_id": document_id,
+        "page": page_number,
+        "start": start,
+        "end": end,
+        "headings": [
+            {"offset": offset, "text": text}
+            for offset, page, text in page_index["headings"] if page == page_number
+        ],
+        "text": page_text
     }
 
 
-@router.get("/documents/stats/")
-async def get_document_stats():
+@router.delete("/documents/{document_id}/")
+async def delete_document(document_id: str):
     """
-    Get statistics about uploaded documents.
+    Delete a document and its stored data.
     """
-    if not documents_db:
-        return {
-            "total_documents": 0,
-            "total_size_bytes": 0,
-            "total_words": 0,
-            "file_types": {}
-        }
-    
-    total_size = sum(doc["file_size_bytes"] for doc in documents_db.values())
-    total_words = sum(doc["word_count"] for doc in documents_db.values())
-    
-    file_types = {}
-    for doc in documents_db.values():
-        ft = doc["file_type"]
-        file_types[ft] = file_types.get(ft, 0) + 1
+    # The extracted text is shared by every upload of the same file; the
+    # store only deletes it with the last document that references it.
+    doc = document_store.delete_document(document_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc["text_released"]:
+        mapped_text_cache.remove(doc["content_hash"], doc["file_type"])
+        analysis_cache.forget(doc["content_hash"], doc["file_type"])
+    # Tombstones the vectors; the index compacts itself once enough pile up
+    await run_in_threadpool(vector_index.delete_document, document_id)
     
     return {
-        "total_documents": len(documents_db),
-        "total_size_bytes": total_size,
-        "total_size_mb": round(total_size / (1024 * 1024), 2),
-        "total_words": total_words,
-        "file_types": file_types,
-        "average_document_size": round(total_size / len(documents_db)) if documents_db else 0
+        "success": True,
+        "message": f"Document '{doc['filename']}' deleted successfully",
+        "document_id": document_id
     }
-
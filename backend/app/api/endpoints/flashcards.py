@@ -8,11 +8,14 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Depends
 from pydantic import BaseModel, Field
 from app.services.qna_generator import generate_flashcards 
 from app.services.llm_service import llm_service
+from app.services.text_analysis import TextAnalysis, get_document_analysis
 
 # Configure logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+FLASHCARD_MAX_CHARS = 100000  # Same cap for pasted text and uploaded documents
+
 # Enums for better type safety
 # Removed DifficultyLevel enum - simplified version
 
@@ -24,7 +27,8 @@ class FlashcardType(str, Enum):
 
 # Request Models
 class FlashcardRequest(BaseModel):
-    text: str = Field(..., min_length=50, max_length=100000)
+    text: Optional[str] = Field(default=None, min_length=50, max_length=FLASHCARD_MAX_CHARS)
+    document_id: Optional[str] = Field(default=None, description="Use an uploaded document instead of text")
     num_cards: Optional[int] = Field(default=10, ge=1, le=50)
     card_type: Optional[FlashcardType] = Field(default=FlashcardType.QA)
     focus_topics: Optional[List[str]] = Field(default=None)
@@ -78,17 +82,35 @@ def validate_text_content(text: str) -> str:
     if len(cleaned_text) < 50:
         raise ValueError("Text too short. Please provide at least 50 characters.")
     
-    if len(cleaned_text) > 100000:
-        raise ValueError("Text too long. Maximum 100,000 characters allowed.")
+    if len(cleaned_text) > FLASHCARD_MAX_CHARS:
+        raise ValueError(f"Text too long. Maximum {FLASHCARD_MAX_CHARS:,} characters allowed.")
     
     return cleaned_text
 
+def resolve_source(data: FlashcardRequest) -> tuple:
+    """
+    Text and (for uploaded documents) the ingest-time analysis to generate from.
+    Uploaded documents longer than FLASHCARD_MAX_CHARS are cut to a window
+    on topic/sentence bounds (starting at the first focus topic) instead of
+    being rejected. Returns (text, analysis_or_None).
+    """
+    if data.document_id:
+        analysis = get_document_analysis(data.document_id)
+        if analysis is None:
+            raise LookupError(f"Document {data.document_id} not found")
+        analysis = analysis.window(FLASHCARD_MAX_CHARS, data.focus_topics)
+        if len(analysis.text.strip()) < 50:
+            raise ValueError("Text too short. Please provide at least 50 characters.")
+        return analysis.text, analysis
+    return validate_text_content(data.text), None
+
 async def generate_flashcard_data(
     text: str,
     num_cards: int = 10,
     card_type: str = "question_answer",
     focus_topics: Optional[List[str]] = None,
-    language: str = "english"
+    language: str = "english",
+    analysis: Optional[TextAnalysis] = None
 ) -> List[Flashcard]:
     """Enhanced wrapper for flashcard generation"""
     try:
@@ -98,7 +120,8 @@ async def generate_flashcard_data(
             num_cards=num_cards,
             card_type=card_type,
             focus_topics=focus_topics,
-            language=language
+            language=language,
+            analysis=analysis
         )
         
         # Convert to structured format
@@ -183,14 +206,15 @@ async def generate_flashcards_batch(data: BatchRequest):
     for i, request in enumerate(data.requests):
         try:
             # Validate each request
-            cleaned_text = validate_text_content(request.text)
+            cleaned_text, analysis = resolve_source(request)
             
             flashcards = await generate_flashcard_data(
                 text=cleaned_text,
                 num_cards=request.num_cards,
                 card_type=request.card_type.value,
                 focus_topics=request.focus_topics,
-                language=request.language
+                language=request.language,
+                analysis=analysis
             )
             
             results.append({
@@ -240,7 +264,7 @@ async def get_flashcard_stats():
         "most_popular_type": "question_answer",
         "average_generation_time": 2.5,
         "supported_file_types": ["pdf", "docx", "txt"],
-        "max_text_length": 100000,
+        "max_text_length": FLASHCARD_MAX_CHARS,
         "max_flashcards_per_request": 50
     }
 
@@ -289,7 +313,12 @@ async def generate_flashcards_endpoint(
     start_time = time.time()
     
     try:
-        cleaned_text = validate_text_content(data.text)
+        try:
+            cleaned_text, analysis = resolve_source(data)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Check if user wants LLM-powered generation
         if data.use_llm and llm_service.is_available():
@@ -323,7 +352,8 @@ async def generate_flashcards_endpoint(
                 num_cards=data.num_cards,
                 card_type=data.card_type.value,
                 focus_topics=data.focus_topics,
-                language=data.language
+                language=data.language,
+                analysis=analysis
             )
         
         processing_time = time.time() - start_time
@@ -337,6 +367,8 @@ async def generate_flashcards_endpoint(
             message="Flashcards generated successfully" + (" using LLM" if data.use_llm else "")
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
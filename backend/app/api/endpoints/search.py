@@ -0,0 +1,124 @@
+import time
+import logging
+from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from app.services.embedding_service import embedding_service
+from app.services.vector_index import vector_index, index_document
+from app.services.document_store import document_store
+from app.services.mapped_text import mapped_text_cache
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+SNIPPET_CHARS = 500
+
+# ============= REQUEST/RESPONSE MODELS =============
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=2, max_length=500)
+    top_k: int = Field(default=10, ge=1, le=100)
+    nprobe: Optional[int] = Field(default=None, ge=1, le=1024, description="IVF lists to scan (recall vs speed)")
+
+class SearchResult(BaseModel):
+    document_id: str
+    filename: str
+    chunk_index: int
+    start: int
+    end: int
+    score: float
+    text: str
+
+class SearchResponse(BaseModel):
+    success: bool
+    query: str
+    results: List[SearchResult]
+    total_results: int
+    search_time_ms: float
+
+# ============= HELPER FUNCTIONS =============
+
+def build_results(hits: List[Dict[str, Any]]) -> List[SearchResult]:
+    """Attach filenames and chunk text (read from the mmap'd text) to index hits"""
+    results = []
+    documents = {}
+    for hit in hits:
+        document_id = hit["document_id"]
+        if document_id not in documents:
+            documents[document_id] = document_store.get_document(document_id)
+        doc = documents[document_id]
+        if doc is None:
+            continue  # Deleted since the index was read
+
+        with mapped_text_cache.open(doc["content_hash"], doc["file_type"], doc["character_count"]) as mapped:
+            text = mapped.read_chars(hit["start"], hit["end"] - hit["start"])
+        text = " ".join(text.split())
+
+        results.append(SearchResult(
+            filename=doc["filename"],
+            text=text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text,
+            **hit
+        ))
+    return results
+
+# ============= API ENDPOINTS =============
+
+@router.post("/search/", response_model=SearchResponse)
+async def search_documents(request: SearchRequest):
+    """
+    Semantic search over the chunks of every uploaded document.
+    """
+    start_time = time.perf_counter()
+
+    try:
+        query_embedding = await embedding_service.encode_async([request.query])
+        hits = await run_in_threadpool(
+            vector_index.search, query_embedding[0], request.top_k, request.nprobe
+        )
+        results = await run_in_threadpool(build_results, hits)
+    except Exception as e:
+        logger.error(f"Search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+    return SearchResponse(
+        success=True,
+        query=request.query,
+        results=results,
+        total_results=len(results),
+        search_time_ms=round((time.perf_counter() - start_time) * 1000, 2)
+    )
+
+@router.post("/search/reindex/")
+async def reindex_documents():
+    """
+    Add documents uploaded before the vector index existed (or while it was
+    unavailable). Already indexed documents are skipped.
+    """
+    indexed_documents = 0
+    indexed_chunks = 0
+    cursor = None
+    while True:
+        page = document_store.list_documents(limit=100, cursor=cursor)
+        for doc in page["documents"]:
+            chunks = await run_in_threadpool(index_document, doc["document_id"])
+            if chunks:
+                indexed_documents += 1
+                indexed_chunks += chunks
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    return {
+        "success": True,
+        "indexed_documents": indexed_documents,
+        "indexed_chunks": indexed_chunks,
+        "index": vector_index.get_stats()
+    }
+
+@router.get("/search/stats/")
+async def get_search_stats():
+    return {
+        "index": vector_index.get_stats(),
+        "embeddings": embedding_service.get_stats()
+    }
@@ -1,13 +1,18 @@
+from typing import Optional
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException
 from app.services import summarizer2 as summarizer_service
+from app.services.text_analysis import get_document_analysis
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+SUMMARIZE_MAX_CHARS = 15000  # Pasted text limit; uploaded documents are windowed to it
+
 class SummarizeRequest(BaseModel):
-    text: str = Field(..., min_length=100, max_length=15000)
+    text: Optional[str] = Field(default=None, min_length=100, max_length=SUMMARIZE_MAX_CHARS)
+    document_id: Optional[str] = Field(default=None, description="Summarize an uploaded document instead of text")
     num_sentences: int = Field(default=5, ge=1, le=10)
     profession: str = Field(default="general reader")
     purpose: str = Field(default="overview")
@@ -23,15 +28,28 @@ class SummarizeResponse(BaseModel):
 
 @router.post("/summarize/", response_model=SummarizeResponse)
 def summarize(req: SummarizeRequest):
+    text, analysis = req.text, None
+    if req.document_id:
+        # Reuse the sentence spans computed when the document was ingested,
+        # limited to the first SUMMARIZE_MAX_CHARS on a topic/sentence bound
+        analysis = get_document_analysis(req.document_id)
+        if analysis is None:
+            raise HTTPException(status_code=404, detail=f"Document {req.document_id} not found")
+        analysis = analysis.window(SUMMARIZE_MAX_CHARS)
+        text = analysis.text
+    elif not text:
+        raise HTTPException(status_code=400, detail="Provide either text or document_id")
+
     try:
-        logger.info(f"Summarizing text of length {len(req.text)}")
+        logger.info(f"Summarizing text of length {len(text)}")
         
         summary = summarizer_service.summarize(
-            text=req.text,
+            text=text,
             num_sentences=req.num_sentences,
             profession=req.profession,
             purpose=req.purpose,
-            document_type=req.document_type
+            document_type=req.document_type,
+            analysis=analysis
         )
         
         if not summary:
@@ -39,7 +57,7 @@ def summarize(req: SummarizeRequest):
         
         return SummarizeResponse(
             success=True,
-            original_text_length=len(req.text),
+            original_text_length=len(text),
             summary=summary,
             summary_length=len(summary),
             num_sentences=req.num_sentences,
@@ -0,0 +1,122 @@
+"""
+BM25
+Inverted-index BM25 scorer plus reciprocal-rank fusion.
+Postings store each term's document ids with their BM25 term weight
+precomputed at build time, so scoring a query is one scatter-add per
+query term.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Words, numbers and codes such as "ISO-9001", "v2.1" or "3.14"
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+_EXACT_TERM_PATTERN = re.compile(r"^(?=.*\d)\w+(?:[-.]\w+)*$|^[A-Z][A-Z0-9\-]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; compound codes also contribute their parts ("inv-1077" -> "inv", "1077")"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token or "." in token:
+            tokens.extend(part for part in re.split(r"[-.]", token) if part)
+    return tokens
+
+
+def exact_terms(text: str) -> List[str]:
+    """Tokens that only make sense as exact matches: numbers, codes, acronyms"""
+    return [
+        token.lower() for token in _TOKEN_PATTERN.findall(text)
+        if _EXACT_TERM_PATTERN.match(token)
+    ]
+
+
+class BM25Index:
+    """Postings list BM25 over a fixed list of texts"""
+
+    def __init__(self, texts: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.size = len(texts)
+        term_ids: Dict[str, int] = {}
+        posting_docs: List[List[int]] = []
+        posting_tfs: List[List[int]] = []
+        lengths = np.zeros(self.size, dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term_id = term_ids.get(token)
+                if term_id is None:
+                    term_id = term_ids[token] = len(posting_docs)
+                    posting_docs.append([])
+                    posting_tfs.append([])
+                posting_docs[term_id].append(doc_id)
+                posting_tfs[term_id].append(count)
+
+        self.term_ids = term_ids
+        self.doc_lengths = lengths
+        average_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        length_norm = k1 * (1 - b + b * lengths / average_length)
+
+        self.postings: List[Tuple[np.ndarray, np.ndarray]] = []
+        for docs, tfs in zip(posting_docs, posting_tfs):
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = idf * tfs * (k1 + 1) / (tfs + length_norm[docs])
+            self.postings.append((docs, weights.astype(np.float32)))
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        return 0 if term_id is None else len(self.postings[term_id][0])
+
+    def contains(self, doc_id: int, term: str) -> bool:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return False
+        docs = self.postings[term_id][0]
+        position = np.searchsorted(docs, doc_id)
+        return position < len(docs) and docs[position] == doc_id
+
+    def score(self, query: str, subset: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every text (0 where no query term occurs)"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is not None:
+                docs, weights = self.postings[term_id]
+                scores[docs] += weights
+        if subset is not None:
+            masked = np.zeros_like(scores)
+            masked[subset] = scores[subset]
+            scores = masked
+        return scores
+
+    def top_k(self, query: str, top_k: int, subset: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) of the best-matching texts with a positive score, best first"""
+        scores = self.score(query, subset)
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > top_k:
+            matching = np.sort(matching[np.argpartition(-scores[matching], top_k - 1)[:top_k]])
+        # Stable sort keeps document order among equal scores
+        order = matching[np.argsort(-scores[matching], kind="stable")]
+        return order, scores[order]
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], top_k: int, k: int = RRF_K) -> np.ndarray:
+    """Fuse best-first id rankings: score(id) = sum over rankings of 1 / (k + rank)"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking.tolist()):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    best = sorted(fused, key=lambda item: fused[item], reverse=True)[:top_k]
+    return np.array(best, dtype=np.int64)
@@ -1,69 +1,192 @@
+import os
+import logging
 from typing import Dict, List, Optional, Any
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import re
 from datetime import datetime
+from app.services.text_analysis import TextAnalysis
+from app.services.embedding_service import embedding_service
+from app.services.retrieval_index import RetrievalIndex, retrieval_index_cache, index_key, top_k_similar
+from app.services.bm25 import BM25Index, exact_terms, reciprocal_rank_fusion
+from app.services.session_store import SessionStore
+from app.services.chunker import chunk_by_tokens, chunk_length_stats, CHAT_CHUNK_TOKENS, CHAT_CHUNK_OVERLAP_TOKENS
+
+logger = logging.getLogger(__name__)
+
+HYBRID_CANDIDATES = 20  # Dense and BM25 candidates fused per question
+ANSWER_SENTENCES = 2
+LLM_CONTEXT_CHUNKS = int(os.getenv("LLM_CONTEXT_CHUNKS", "6"))  # Candidates for the LLM prompt
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "1000"))  # Prompt budget for document excerpts
+SOURCE_PREVIEW_CHARS = 200
 
 class DocumentChatbot:
     """Chatbot for answering questions about documents"""
     
     def __init__(self):
-        # Load sentence transformer for semantic search
-        print("Loading chatbot models...")
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Shared sentence embedding model for semantic search (loaded lazily)
+        self.embedder = embedding_service
         
-        # Store active sessions
-        self.sessions = {}
+        # Sessions persist in the shared store; recently used ones stay resident
+        self.sessions = SessionStore()
         
-        print("✓ Chatbot ready!")
+        logger.info("✅ Chatbot ready")
     
-    def chunk_document(self, text: str, chunk_size: int = 200) -> List[str]:
-        """Split document into chunks for better context retrieval"""
-        # Split by sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence_words = sentence.split()
-            sentence_length = len(sentence_words)
-            
-            if current_length + sentence_length > chunk_size and current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [sentence]
-                current_length = sentence_length
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+    def chunk_document(
+        self,
+        text: str,
+        chunk_size: int = CHAT_CHUNK_TOKENS,
+        analysis: Optional[TextAnalysis] = None,
+        overlap: int = CHAT_CHUNK_OVERLAP_TOKENS
+    ) -> List[str]:
+        """Split document into overlapping chunks of at most chunk_size model tokens"""
+        return self._chunk_with_counts(text, chunk_size, overlap, analysis)[0]
+
+    def _chunk_with_counts(
+        self,
+        text: str,
+        chunk_size: int,
+        overlap: int,
+        analysis: Optional[TextAnalysis] = None
+    ) -> tuple:
+        # Never beyond the model window, where text would be truncated at encode time
+        max_tokens = min(chunk_size, self.embedder.max_tokens)
+        # Sentence spans precomputed at ingest
+        sentences = analysis.sentences() if analysis is not None else None
+        return chunk_by_tokens(text, self.embedder.count_tokens, max_tokens, overlap, sentences=sentences)
     
+    def get_index(
+        self,
+        document_text: str,
+        chunk_size: int = CHAT_CHUNK_TOKENS,
+        analysis: Optional[TextAnalysis] = None,
+        overlap: int = CHAT_CHUNK_OVERLAP_TOKENS
+    ) -> RetrievalIndex:
+        """Chunks + embeddings for a document, built once per document content"""
+        key = index_key(document_text, f"t{chunk_size}o{overlap}")
+
+        def build() -> RetrievalIndex:
+            chunks, chunk_tokens, sentences, sentence_bounds = self._chunk_with_counts(
+                document_text, chunk_size, overlap, analysis
+            )
+            return RetrievalIndex(
+                key, chunks, self.embedder.encode(chunks),
+                chunk_tokens=chunk_tokens, sentences=sentences, sentence_bounds=sentence_bounds
+            )
+
+        return retrieval_index_cache.get_or_build(key, build)
+
+    @staticmethod
+    def chunk_stats(
+        index: RetrievalIndex,
+        chunk_size: int = CHAT_CHUNK_TOKENS,
+        overlap: int = CHAT_CHUNK_OVERLAP_TOKENS
+    ) -> Dict[str, Any]:
+        """Chunk-length statistics of an index (empty if its token counts are unknown)"""
+        if index.chunk_tokens is None:
+            return {}
+        return chunk_length_stats(index.chunk_tokens, chunk_size, overlap)
+    
+    def retrieve(self, question: str, index: RetrievalIndex, top_k: int = 3) -> tuple:
+        """
+        Hybrid retrieval over a document index: BM25 and dense rankings fused
+        with reciprocal-rank fusion. Questions about exact terms (numbers,
+        codes, acronyms) that BM25 fully matches skip the dense search and
+        take the BM25 ranking ("exact" match_type, otherwise "hybrid").
+        Confidence is always the mean cosine similarity of the chosen chunks.
+        Returns (context, confidence, relevant_chunks, chunk_ids,
+        question_embedding, match_type).
+        """
+        lexical_ids, _ = index.bm25.top_k(question, HYBRID_CANDIDATES)
+        question_embedding = self.embedder.encode([question])
+
+        terms = exact_terms(question)
+        if terms and len(lexical_ids) and all(index.bm25.contains(int(lexical_ids[0]), term) for term in terms):
+            chunk_ids = lexical_ids[:top_k]
+            match_type = "exact"
+        else:
+            dense_ids, _ = index.search(question_embedding, HYBRID_CANDIDATES)
+            chunk_ids = reciprocal_rank_fusion([dense_ids[0], lexical_ids], top_k)
+            match_type = "hybrid"
+        question_embedding = question_embedding[0]
+        confidence = float(np.mean(index.similarity(question_embedding, chunk_ids)))
+
+        relevant_chunks = [index.chunks[i] for i in chunk_ids]
+        return ' '.join(relevant_chunks), confidence, relevant_chunks, chunk_ids, question_embedding, match_type
+    
+    def describe_sources(
+        self,
+        index: RetrievalIndex,
+        chunk_ids: List[int],
+        question_embedding: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """Which chunks an answer used: id, similarity, token count and a preview"""
+        scores = index.similarity(question_embedding, chunk_ids) if question_embedding is not None else None
+        sources = []
+        for rank, chunk_id in enumerate(chunk_ids):
+            chunk = index.chunks[chunk_id]
+            sources.append({
+                "chunk_id": int(chunk_id),
+                "rank": rank + 1,
+                "score": round(float(scores[rank]), 3) if scores is not None else None,
+                "tokens": int(index.chunk_tokens[chunk_id]) if index.chunk_tokens is not None else None,
+                "preview": chunk[:SOURCE_PREVIEW_CHARS] + "..." if len(chunk) > SOURCE_PREVIEW_CHARS else chunk
+            })
+        return sources
+
+    def select_context(
+        self,
+        index: RetrievalIndex,
+        question: str,
+        top_k: int = LLM_CONTEXT_CHUNKS,
+        token_budget: int = LLM_CONTEXT_TOKENS
+    ) -> Dict[str, Any]:
+        """
+        Best-ranked chunks for an LLM prompt that fit in token_budget
+        (embedding-tokenizer tokens, a close proxy for the LLM's). The best
+        chunk is always kept. Chunks are returned in document order.
+        """
+        _, confidence, _, chunk_ids, question_embedding, match_type = self.retrieve(question, index, top_k=top_k)
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        if index.chunk_tokens is not None:
+            tokens = [int(index.chunk_tokens[chunk_id]) for chunk_id in chunk_ids]
+        else:
+            tokens = self.embedder.count_tokens([index.chunks[chunk_id] for chunk_id in chunk_ids]).tolist()
+
+        selected = []
+        used_tokens = 0
+        for chunk_id, chunk_tokens in zip(chunk_ids, tokens):
+            if selected and used_tokens + chunk_tokens > token_budget:
+                continue  # A shorter, lower-ranked chunk may still fit
+            selected.append(chunk_id)
+            used_tokens += chunk_tokens
+
+        return {
+            "chunks": [index.chunks[chunk_id] for chunk_id in sorted(selected)],
+            "sources": self.describe_sources(index, selected, question_embedding),
+            "confidence": confidence,
+            "match_type": match_type,
+            "context_tokens": used_tokens
+        }
+
     def find_relevant_context(
         self, 
         question: str, 
         document_chunks: List[str], 
-        top_k: int = 3
+        top_k: int = 3,
+        chunk_embeddings: Optional[np.ndarray] = None
     ) -> tuple:
         """Find most relevant chunks for the question"""
         
-        # Encode question and chunks
-        question_embedding = self.sentence_model.encode([question])
-        chunk_embeddings = self.sentence_model.encode(document_chunks)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(question_embedding, chunk_embeddings)[0]
+        # Encode question (and chunks, unless an index supplied them)
+        question_embedding = self.embedder.encode([question])
+        if chunk_embeddings is None:
+            chunk_embeddings = self.embedder.encode(document_chunks)
         
-        # Get top-k most similar chunks
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        # Embeddings are unit length: one matrix-vector product gives cosine scores
+        top_indices, top_scores = top_k_similar(chunk_embeddings, question_embedding, top_k)
         
-        relevant_chunks = [document_chunks[i] for i in top_indices]
-        confidence_scores = [float(similarities[i]) for i in top_indices]
+        relevant_chunks = [document_chunks[i] for i in top_indices[0]]
+        confidence_scores = top_scores[0].tolist()
         
         # Combine relevant chunks
         context = ' '.join(relevant_chunks)
@@ -75,29 +198,34 @@ class DocumentChatbot:
         self, 
         question: str, 
         context: str,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        index: Optional[RetrievalIndex] = None,
+        chunk_ids: Optional[np.ndarray] = None,
+        question_embedding: Optional[np.ndarray] = None
     ) -> str:
         """Generate answer based on context (simple extractive approach)"""
         
-        # Simple extractive approach: find sentences related to question
-        question_words = set(question.lower().split())
-        context_sentences = re.split(r'(?<=[.!?])\s+', context)
-        
-        # Score sentences
-        scored_sentences = []
-        for sentence in context_sentences:
-            sentence_words = set(sentence.lower().split())
-            overlap = len(question_words.intersection(sentence_words))
-            if overlap > 0:
-                scored_sentences.append((overlap, sentence))
+        # Extractive approach: rank the context sentences against the question.
+        # With a document index, fuse BM25 over its sentence postings with the
+        # precomputed sentence embeddings (no model call per question)
+        if index is not None and chunk_ids is not None:
+            candidates = index.sentences_for_chunks(chunk_ids)
+            lexical, _ = index.sentence_bm25.top_k(question, HYBRID_CANDIDATES, subset=candidates)
+            if question_embedding is not None and index.sentence_embeddings is not None and len(candidates):
+                scores = index.sentence_similarity(question_embedding, candidates)
+                dense = candidates[np.argsort(-scores, kind="stable")[:HYBRID_CANDIDATES]]
+                best = reciprocal_rank_fusion([dense, lexical], ANSWER_SENTENCES)
+            else:
+                best = lexical[:ANSWER_SENTENCES]
+            answer_sentences = [index.sentences[i] for i in best]
+        else:
+            context_sentences = re.split(r'(?<=[.!?])\s+', context)
+            best, _ = BM25Index(context_sentences).top_k(question, ANSWER_SENTENCES)
+            answer_sentences = [context_sentences[i] for i in best]
         
-        if not scored_sentences:
+        if not answer_sentences:
             return "I couldn't find a specific answer to your question in the document. Could you rephrase or ask something else?"
         
-        # Get top sentences
-        scored_sentences.sort(reverse=True, key=lambda x: x[0])
-        answer_sentences = [s[1] for s in scored_sentences[:2]]
-        
         answer = ' '.join(answer_sentences)
         
         # Add conversational context if available
@@ -113,29 +241,31 @@ class DocumentChatbot:
         self,
         document_text: str,
         question: str,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        analysis: Optional[TextAnalysis] = None
     ) -> Dict[str, Any]:
         """Main method to answer questions about a document"""
         
         try:
-            # Chunk the document
-            chunks = self.chunk_document(document_text)
+            # Chunked and embedded once per document, then reused
+            index = self.get_index(document_text, analysis=analysis)
             
-            if not chunks:
+            if not index.chunks:
                 return {"error": "Could not process document"}
             
             # Find relevant context
-            context, confidence, relevant_chunks = self.find_relevant_context(
-                question, 
-                chunks
-            )
+            context, confidence, relevant_chunks, chunk_ids, question_embedding, match_type = self.retrieve(question, index)
             
             # Generate answer
-            answer = self.generate_answer(question, context, conversation_history)
+            answer = self.generate_answer(
+                question, context, conversation_history, index=index, chunk_ids=chunk_ids,
+                question_embedding=question_embedding
+            )
             
             return {
                 "answer": answer,
                 "confidence_score": round(confidence, 3),
+                "match_type": match_type,
                 "relevant_context": context[:500] + "..." if len(context) > 500 else context,
                 "sources": relevant_chunks,
                 "timestamp": datetime.now().isoformat()
@@ -148,19 +278,22 @@ class DocumentChatbot:
         self,
         session_id: str,
         document_text: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        analysis: Optional[TextAnalysis] = None
     ) -> Dict[str, Any]:
         """Create a chat session with stored document"""
         
         try:
-            # Chunk and store document
-            chunks = self.chunk_document(document_text)
-            chunk_embeddings = self.sentence_model.encode(chunks)
+            # Sessions on the same document share one retrieval index
+            index = self.get_index(document_text, analysis=analysis)
+            # Sentence embeddings for answer selection, computed once per document
+            index.ensure_sentence_embeddings(self.embedder.encode)
             
             self.sessions[session_id] = {
                 "document_text": document_text,
-                "chunks": chunks,
-                "chunk_embeddings": chunk_embeddings,
+                "chunks": index.chunks,
+                "chunk_embeddings": index.embeddings,
+                "index": index,
                 "metadata": metadata or {},
                 "conversation_history": [],
                 "created_at": datetime.now().isoformat()
@@ -169,7 +302,8 @@ class DocumentChatbot:
             return {
                 "success": True,
                 "session_id": session_id,
-                "chunks_count": len(chunks)
+                "chunks_count": len(index.chunks),
+                "chunk_stats": self.chunk_stats(index)
             }
             
         except Exception as e:
@@ -182,34 +316,28 @@ class DocumentChatbot:
     ) -> Dict[str, Any]:
         """Answer question using stored session"""
         
-        if session_id not in self.sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             return {"error": "Session not found. Please create a session first."}
         
-        session = self.sessions[session_id]
-        
         try:
-            # Use pre-computed embeddings
-            question_embedding = self.sentence_model.encode([question])
-            similarities = cosine_similarity(
-                question_embedding, 
-                session["chunk_embeddings"]
-            )[0]
-            
-            # Get top chunks
-            top_indices = np.argsort(similarities)[-3:][::-1]
-            relevant_chunks = [session["chunks"][i] for i in top_indices]
-            context = ' '.join(relevant_chunks)
-            avg_confidence = float(np.mean([similarities[i] for i in top_indices]))
+            # Use the session's pre-computed index
+            index = session["index"]
+            context, avg_confidence, relevant_chunks, chunk_ids, question_embedding, match_type = self.retrieve(question, index)
+            chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
             
             # Generate answer
             answer = self.generate_answer(
                 question, 
                 context, 
-                session["conversation_history"]
+                session["conversation_history"],
+                index=index,
+                chunk_ids=chunk_ids,
+                question_embedding=question_embedding
             )
             
-            # Store in history
-            session["conversation_history"].append({
+            # Store in history (shared with the other workers)
+            self.sessions.append_history(session_id, {
                 "question": question,
                 "answer": answer,
                 "timestamp": datetime.now().isoformat()
@@ -218,32 +346,50 @@ class DocumentChatbot:
             return {
                 "answer": answer,
                 "confidence_score": round(avg_confidence, 3),
+                "match_type": match_type,
                 "relevant_context": context[:500] + "..." if len(context) > 500 else context,
-                "sources": relevant_chunks
+                "sources": self.describe_sources(index, chunk_ids, question_embedding)
             }
             
         except Exception as e:
             return {"error": f"Failed to answer from session: {str(e)}"}
+
+    def prepare_llm_answer(self, session_id: str, question: str) -> Dict[str, Any]:
+        """Retrieved excerpts and recent history for answering with an LLM"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return {"error": "Session not found. Please create a session first."}
+        
+        try:
+            selection = self.select_context(session["index"], question)
+            selection["conversation_history"] = list(session["conversation_history"])
+            return selection
+        except Exception as e:
+            return {"error": f"Failed to retrieve context: {str(e)}"}
+
+    def record_answer(self, session_id: str, question: str, answer: str) -> bool:
+        """Append an externally generated (LLM) answer to the session history"""
+        return self.sessions.append_history(session_id, {
+            "question": question,
+            "answer": answer,
+            "timestamp": datetime.now().isoformat()
+        })
     
     def delete_session(self, session_id: str) -> Dict[str, bool]:
         """Delete a chat session"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return {"success": True}
-        return {"success": False}
+        return {"success": self.sessions.pop(session_id)}
     
     def get_session_history(self, session_id: str) -> Dict[str, Any]:
         """Get conversation history for a session"""
-        if session_id not in self.sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             return {"error": "Session not found"}
         
-        session = self.sessions[session_id]
-        
         # Generate quick summary of document
         doc_preview = session["document_text"][:200] + "..."
         
         return {
-            "history": session["conversation_history"],
+            "history": list(session["conversation_history"]),
             "document_summary": doc_preview,
             "created_at": session["created_at"],
             "total_questions": len(session["conversation_history"])
@@ -251,23 +397,14 @@ class DocumentChatbot:
     
     def clear_history(self, session_id: str) -> Dict[str, Any]:
         """Clear conversation history but keep document"""
-        if session_id not in self.sessions:
+        if not self.sessions.clear_history(session_id):
             return {"error": "Session not found"}
         
-        self.sessions[session_id]["conversation_history"] = []
         return {"success": True}
     
     def get_all_sessions(self) -> Dict[str, Any]:
-        """Get info about all active sessions"""
-        sessions_list = []
-        for session_id, session_data in self.sessions.items():
-            sessions_list.append({
-                "session_id": session_id,
-                "document_name": session_data["metadata"].get("document_name", "Unknown"),
-                "created_at": session_data["created_at"],
-                "total_questions": len(session_data["conversation_history"]),
-                "document_length": len(session_data["document_text"])
-            })
+        """Get info about all active sessions, with per-session memory use"""
+        sessions_list = self.sessions.describe()
         
         return {
             "sessions": sessions_list,
@@ -279,7 +416,7 @@ class DocumentChatbot:
         try:
             # Test encoding
             test_text = "This is a test"
-            self.sentence_model.encode([test_text])
+            self.embedder.encode([test_text])
             return {"available": True}
         except:
             return {"available": False}
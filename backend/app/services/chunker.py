@@ -0,0 +1,137 @@
+"""
+Token-aware Chunker
+Packs consecutive sentences into chunks measured in embedding-model tokens,
+so no chunk exceeds the model window (and gets silently truncated), with a
+configurable overlap between neighbouring chunks. Sentences are counted in
+one batched tokenizer call; chunk boundaries come from prefix sums.
+"""
+
+import os
+from typing import Callable, Dict, List, Optional, Any, Tuple
+import numpy as np
+from app.services.text_analysis import find_sentence_spans
+
+CHAT_CHUNK_TOKENS = int(os.getenv("CHAT_CHUNK_TOKENS", "200"))
+CHAT_CHUNK_OVERLAP_TOKENS = int(os.getenv("CHAT_CHUNK_OVERLAP_TOKENS", "32"))
+
+MAX_SPLIT_ROUNDS = 3
+
+TokenCounter = Callable[[List[str]], np.ndarray]
+
+
+def split_long_sentences(
+    sentences: List[str],
+    counts: np.ndarray,
+    max_tokens: int,
+    count_tokens: TokenCounter
+) -> Tuple[List[str], np.ndarray]:
+    """Split sentences longer than max_tokens into word runs that fit (pieces are re-counted in one batch per round)"""
+    for _ in range(MAX_SPLIT_ROUNDS):
+        long_ids = set(np.flatnonzero(counts > max_tokens).tolist())
+        if not long_ids:
+            break
+        pieces: List[str] = []
+        piece_counts: List[int] = []
+        recount: List[int] = []
+        for i, sentence in enumerate(sentences):
+            words = sentence.split()
+            if i not in long_ids or len(words) < 2:
+                pieces.append(sentence)
+                piece_counts.append(int(counts[i]))
+                continue
+            parts = min(len(words), -(-int(counts[i]) // max_tokens) + 1)
+            for part in np.array_split(np.arange(len(words)), parts):
+                recount.append(len(pieces))
+                pieces.append(" ".join(words[part[0]:part[-1] + 1]))
+                piece_counts.append(0)
+        if not recount:
+            break
+        new_counts = np.array(piece_counts, dtype=np.int32)
+        new_counts[recount] = count_tokens([pieces[i] for i in recount])
+        sentences, counts = pieces, new_counts
+    return sentences, counts
+
+
+def find_window_bounds(counts: np.ndarray, max_tokens: int, overlap_tokens: int = 0) -> np.ndarray:
+    """
+    Greedy windows over sentence token counts: each holds as many whole
+    sentences as fit in max_tokens, and the next one starts far enough back
+    to repeat at most overlap_tokens of trailing sentences.
+    Returns (C, 2) int32 [first_sentence, last_sentence + 1).
+    """
+    prefix = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    bounds = []
+    start = 0
+    while start < len(counts):
+        end = int(np.searchsorted(prefix, prefix[start] + max_tokens, side="right")) - 1
+        end = min(max(end, start + 1), len(counts))
+        bounds.append((start, end))
+        if end == len(counts):
+            break
+        next_start = min(max(int(np.searchsorted(prefix, prefix[end] - overlap_tokens, side="left")), start + 1), end)
+        # Overlap only if the next window still reaches past this one
+        if prefix[end + 1] - prefix[next_start] > max_tokens:
+            next_start = end
+        start = next_start
+    return np.array(bounds, dtype=np.int32).reshape(-1, 2)
+
+
+def chunk_by_tokens(
+    text: str,
+    count_tokens: TokenCounter,
+    max_tokens: int = CHAT_CHUNK_TOKENS,
+    overlap_tokens: int = CHAT_CHUNK_OVERLAP_TOKENS,
+    sentences: Optional[List[str]] = None
+) -> Tuple[List[str], np.ndarray, List[str], np.ndarray]:
+    """
+    Returns (chunk texts, token count per chunk, sentences, (C, 2) sentence
+    bounds per chunk). Pass sentences to reuse a precomputed split.
+    """
+    if sentences is None:
+        sentences = [text[start:end] for start, end in find_sentence_spans(text).tolist()]
+    sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+    if not sentences:
+        return [], np.zeros(0, dtype=np.int32), [], np.zeros((0, 2), dtype=np.int32)
+
+    counts = np.asarray(count_tokens(sentences), dtype=np.int32)
+    sentences, counts = split_long_sentences(sentences, counts, max_tokens, count_tokens)
+    bounds = find_window_bounds(counts, max_tokens, min(overlap_tokens, max_tokens // 2))
+
+    prefix = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    chunks = [" ".join(sentences[first:last]) for first, last in bounds.tolist()]
+    return chunks, (prefix[bounds[:, 1]] - prefix[bounds[:, 0]]).astype(np.int32), sentences, bounds
+
+
+def locate_sentences(text: str, sentences: List[str]) -> np.ndarray:
+    """
+    (N, 2) int32 [start, end) char spans of sentences (or pieces of split
+    sentences) taken in order from text. Pieces were re-joined with single
+    spaces, so their words are located one by one.
+    """
+    spans = np.zeros((len(sentences), 2), dtype=np.int32)
+    position = 0
+    for i, sentence in enumerate(sentences):
+        words = sentence.split()
+        start = text.find(words[0], position)
+        position = start
+        for word in words:
+            position = text.find(word, position) + len(word)
+        spans[i] = (start, position)
+    return spans
+
+
+def chunk_length_stats(chunk_tokens: np.ndarray, max_tokens: int, overlap_tokens: int) -> Dict[str, Any]:
+    """Chunk-length distribution, for tuning recall against embeddings stored"""
+    if not len(chunk_tokens):
+        return {"chunks": 0, "max_tokens": max_tokens, "overlap_tokens": overlap_tokens}
+    return {
+        "chunks": int(len(chunk_tokens)),
+        "max_tokens": max_tokens,
+        "overlap_tokens": overlap_tokens,
+        "tokens_min": int(chunk_tokens.min()),
+        "tokens_mean": round(float(chunk_tokens.mean()), 1),
+        "tokens_p50": int(np.percentile(chunk_tokens, 50)),
+        "tokens_p95": int(np.percentile(chunk_tokens, 95)),
+        "tokens_max": int(chunk_tokens.max()),
+        "tokens_total": int(chunk_tokens.sum())
+    }
@@ -0,0 +1,665 @@
+"""
+Document Store
+Persistent SQLite store (WAL mode) shared by all uvicorn workers.
+Document metadata lives in indexed columns; extracted text is stored once
+per content hash as a zlib-compressed blob and only loaded on demand. A
+stored text is reference counted by the documents that point at it and is
+deleted with the last of them.
+"""
+
+import os
+import json
+import zlib
+import base64
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_DB_PATH = os.getenv("DOCUMENT_DB_PATH", os.path.join("document_storage", "documents.db"))
+PREVIEW_CHARS = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    content_hash TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    text BLOB NOT NULL,
+    word_count INTEGER NOT NULL,
+    character_count INTEGER NOT NULL,
+    preview TEXT NOT NULL,
+    page_index TEXT,
+    analysis BLOB,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (content_hash, file_type)
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    file_size_bytes INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    character_count INTEGER NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    preview TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_uploaded_at_id ON documents (uploaded_at, document_id);
+CREATE INDEX IF NOT EXISTS idx_documents_file_type ON documents (file_type);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash, file_type);
+
+-- Running aggregates, updated in the same transaction as documents
+CREATE TABLE IF NOT EXISTS document_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_documents INTEGER NOT NULL,
+    total_size_bytes INTEGER NOT NULL,
+    total_words INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS file_type_counts (
+    file_type TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+
+-- Extraction cache lookups, counted across all workers
+CREATE TABLE IF NOT EXISTS extraction_cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO extraction_cache_stats (id, hits, misses) VALUES (1, 0, 0);
+
+-- Chat sessions; embeddings live in snapshot files named by index_key
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    index_key TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    document_length INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    last_access REAL NOT NULL,
+    history_version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_access ON chat_sessions (last_access);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_index_key ON chat_sessions (index_key);
+
+CREATE TABLE IF NOT EXISTS chat_turns (
+    turn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns (session_id, turn_id);
+
+-- Ingestion jobs, claimed by whichever worker process polls first
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    elapsed REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    error_status_code INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, created_at);
+"""
+
+_DOCUMENT_COLUMNS = (
+    "document_id, filename, file_type, file_size_bytes, word_count, "
+    "character_count, uploaded_at, content_hash, preview"
+)
+LIST_PREVIEW_CHARS = 200
+
+
+class DocumentStore:
+    """SQLite-backed document metadata and compressed text storage"""
+
+    def __init__(self, db_path: str = DOCUMENT_DB_PATH):
+        self.db_path = db_path
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+        logger.info(f"✅ Document store ready at {self.db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.executescript(_SCHEMA)
+            self._add_missing_columns(conn, "texts", {"page_index": "TEXT", "analysis": "BLOB"})
+            self._backfill_totals(conn)
+
+    @staticmethod
+    def _backfill_totals(conn: sqlite3.Connection):
+        """Seed the running aggregates once (new or pre-aggregate databases)"""
+        if conn.execute("SELECT 1 FROM document_totals WHERE id = 1").fetchone():
+            return
+        conn.execute(
+            "INSERT INTO document_totals (id, total_documents, total_size_bytes, total_words) "
+            "SELECT 1, COUNT(*), COALESCE(SUM(file_size_bytes), 0), COALESCE(SUM(word_count), 0) "
+            "FROM documents"
+        )
+        conn.execute("DELETE FROM file_type_counts")
+        conn.execute(
+            "INSERT INTO file_type_counts (file_type, count) "
+            "SELECT file_type, COUNT(*) FROM documents GROUP BY file_type"
+        )
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+        """Upgrade databases created before a column was introduced"""
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    # ============= EXTRACTED TEXT =============
+
+    def get_extraction(self, content_hash: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """Metadata of a stored extraction (without the text)"""
+        row = self._connect().execute(
+            "SELECT content_hash, file_type, word_count, character_count, preview, created_at "
+            "FROM texts WHERE content_hash = ? AND file_type = ?",
+            (content_hash, file_type)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def put_extraction(
+        self,
+        content_hash: str,
+        file_type: str,
+        text: str,
+        page_index: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Store extracted text (compressed) and its page index once per content hash"""
+        entry = {
+            "content_hash": content_hash,
+            "file_type": file_type,
+            "word_count": len(text.split()),
+            "character_count": len(text),
+            "preview": text[:PREVIEW_CHARS],
+            "created_at": datetime.now().isoformat()
+        }
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO texts "
+                "(content_hash, file_type, text, word_count, character_count, preview, page_index, created_at) "
+                "VALUES (:content_hash, :file_type, :text, :word_count, :character_count, "
+                ":preview, :page_index, :created_at)",
+                {
+                    **entry,
+                    "text": zlib.compress(text.encode("utf-8")),
+                    "page_index": json.dumps(page_index, separators=(",", ":")) if page_index else None
+                }
+            )
+        return entry
+
+    def read_extraction_text(self, content_hash: str, file_type: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT text FROM texts WHERE content_hash = ? AND file_type = ?",
+            (content_hash, file_type)
+        ).fetchone()
+        return zlib.decompress(row["text"]).decode("utf-8") if row else None
+
+    def get_analysis(self, content_hash: str, file_type: str) -> Optional[bytes]:
+        """Serialized text analysis of an extraction, if computed"""
+        row = self._connect().execute(
+            "SELECT analysis FROM texts WHERE content_hash = ? AND file_type = ?",
+            (content_hash, file_type)
+        ).fetchone()
+        return row["analysis"] if row else None
+
+    def put_analysis(self, content_hash: str, file_type: str, data: bytes):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE texts SET analysis = ? WHERE content_hash = ? AND file_type = ?",
+                (data, content_hash, file_type)
+            )
+
+    def record_extraction_lookup(self, hit: bool):
+        column = "hits" if hit else "misses"
+        conn = self._connect()
+        with conn:
+            conn.execute(f"UPDATE extraction_cache_stats SET {column} = {column} + 1 WHERE id = 1")
+
+    def get_extraction_lookups(self) -> Dict[str, int]:
+        row = self._connect().execute(
+            "SELECT hits, misses FROM extraction_cache_stats WHERE id = 1"
+        ).fetchone()
+        return dict(row)
+
+    # ============= DOCUMENTS =============
+
+    def add_document(
+        self,
+        document_id: str,
+        filename: str,
+        file_type: str,
+        file_size_bytes: int,
+        extraction: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Register a document as a reference to an already stored extraction.
+        Counts and preview are copied from the extraction, so the text itself
+        is never touched. Raises LookupError if the extraction was deleted
+        along with its last document in the meantime.
+        """
+        doc = {
+            "document_id": document_id,
+            "filename": filename,
+            "file_type": file_type,
+            "file_size_bytes": file_size_bytes,
+            "word_count": extraction["word_count"],
+            "character_count": extraction["character_count"],
+            "uploaded_at": datetime.now().isoformat(),
+            "content_hash": extraction["content_hash"],
+            "preview": extraction["preview"]
+        }
+        conn = self._connect()
+        with conn:
+            inserted = conn.execute(
+                f"INSERT INTO documents ({_DOCUMENT_COLUMNS}) SELECT "
+                ":document_id, :filename, :file_type, :file_size_bytes, :word_count, "
+                ":character_count, :uploaded_at, :content_hash, :preview "
+                "WHERE EXISTS (SELECT 1 FROM texts WHERE content_hash = :content_hash AND file_type = :file_type)",
+                doc
+            ).rowcount
+            if not inserted:
+                raise LookupError(f"Extraction {doc['content_hash'][:12]} is no longer stored")
+            self._update_totals(conn, doc, +1)
+        return doc
+
+    @staticmethod
+    def _update_totals(conn: sqlite3.Connection, doc: Dict[str, Any], sign: int):
+        conn.execute(
+            "UPDATE document_totals SET total_documents = total_documents + ?, "
+            "total_size_bytes = total_size_bytes + ?, total_words = total_words + ? WHERE id = 1",
+            (sign, sign * doc["file_size_bytes"], sign * doc["word_count"])
+        )
+        conn.execute(
+            "INSERT INTO file_type_counts (file_type, count) VALUES (?, ?) "
+            "ON CONFLICT(file_type) DO UPDATE SET count = count + excluded.count",
+            (doc["file_type"], sign)
+        )
+        conn.execute("DELETE FROM file_type_counts WHERE count <= 0")
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE document_id = ?",
+            (document_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        """Lazily load and decompress a document's full text"""
+        row = self._connect().execute(
+            "SELECT t.text FROM documents d JOIN texts t "
+            "ON t.content_hash = d.content_hash AND t.file_type = d.file_type "
+            "WHERE d.document_id = ?",
+            (document_id,)
+        ).fetchone()
+        return zlib.decompress(row["text"]).decode("utf-8") if row else None
+
+    def get_page_index(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Page/offset index captured at extraction time:
+        {"pages": [[page, start, end], ...], "headings": [[offset, page, text], ...]}.
+        Extractions stored before the index existed are reported as one page.
+        """
+        row = self._connect().execute(
+            "SELECT t.page_index, t.character_count FROM documents d JOIN texts t "
+            "ON t.content_hash = d.content_hash AND t.file_type = d.file_type "
+            "WHERE d.document_id = ?",
+            (document_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row["page_index"]:
+            return json.loads(row["page_index"])
+        return {"pages": [[1, 0, row["character_count"]]], "headings": []}
+
+    @staticmethod
+    def _encode_cursor(doc: Dict[str, Any]) -> str:
+        raw = f"{doc['uploaded_at']}|{doc['document_id']}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            uploaded_at, document_id = raw.split("|", 1)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        return uploaded_at, document_id
+
+    def list_documents(self, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of documents in upload order, using keyset pagination on
+        (uploaded_at, document_id). Returns {"documents", "next_cursor"}.
+        """
+        columns = (
+            "document_id, filename, file_type, file_size_bytes, word_count, uploaded_at, "
+            f"substr(preview, 1, {LIST_PREVIEW_CHARS}) AS preview"
+        )
+        if cursor:
+            uploaded_at, document_id = self._decode_cursor(cursor)
+            rows = self._connect().execute(
+                f"SELECT {columns} FROM documents WHERE (uploaded_at, document_id) > (?, ?) "
+                "ORDER BY uploaded_at, document_id LIMIT ?",
+                (uploaded_at, document_id, limit + 1)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                f"SELECT {columns} FROM documents ORDER BY uploaded_at, document_id LIMIT ?",
+                (limit + 1,)
+            ).fetchall()
+
+        documents = [dict(row) for row in rows[:limit]]
+        next_cursor = self._encode_cursor(documents[-1]) if len(rows) > limit else None
+        return {"documents": documents, "next_cursor": next_cursor}
+
+    def delete_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove a document. Its extraction (text, page index, analysis) is
+        deleted too when no other document references it; doc["text_released"]
+        tells the caller to drop files derived from it.
+        """
+        doc = self.get_document(document_id)
+        if doc is None:
+            return None
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM documents WHERE document_id = ?", (document_id,)
+            ).rowcount
+            # Another worker may have deleted it in the meantime
+            if not deleted:
+                return None
+            self._update_totals(conn, doc, -1)
+            # Reference count through idx_documents_content_hash, in the same transaction
+            released = conn.execute(
+                "DELETE FROM texts WHERE content_hash = ? AND file_type = ? AND NOT EXISTS "
+                "(SELECT 1 FROM documents WHERE content_hash = ? AND file_type = ?)",
+                (doc["content_hash"], doc["file_type"], doc["content_hash"], doc["file_type"])
+            ).rowcount
+        doc["text_released"] = bool(released)
+        return doc
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Running aggregates; O(1) regardless of corpus size"""
+        conn = self._connect()
+        totals = conn.execute(
+            "SELECT total_documents, total_size_bytes, total_words FROM document_totals WHERE id = 1"
+        ).fetchone()
+        file_types = {
+            row["file_type"]: row["count"]
+            for row in conn.execute("SELECT file_type, count FROM file_type_counts")
+        }
+        return {**dict(totals), "file_types": file_types}
+
+    # ============= CHAT SESSIONS =============
+
+    def put_chat_session(
+        self,
+        session_id: str,
+        index_key: str,
+        metadata: Dict[str, Any],
+        document_length: int,
+        created_at: str,
+        last_access: float
+    ):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, index_key, metadata, document_length, "
+                "created_at, last_access, history_version) VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (session_id, index_key, json.dumps(metadata), document_length, created_at, last_access)
+            )
+
+    def get_chat_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT * FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session["metadata"] = json.loads(session["metadata"])
+        return session
+
+    def touch_chat_session(self, session_id: str, last_access: float):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE chat_sessions SET last_access = ? WHERE session_id = ?", (last_access, session_id)
+            )
+
+    def list_chat_sessions(self) -> List[Dict[str, Any]]:
+        """Sessions with their turn counts, most recently used first"""
+        rows = self._connect().execute(
+            "SELECT s.*, (SELECT COUNT(*) FROM chat_turns t WHERE t.session_id = s.session_id) AS turns "
+            "FROM chat_sessions s ORDER BY last_access DESC"
+        ).fetchall()
+        sessions = []
+        for row in rows:
+            session = dict(row)
+            session["metadata"] = json.loads(session["metadata"])
+            sessions.append(session)
+        return sessions
+
+    def count_chat_sessions(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+    def get_chat_history(self, session_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT entry FROM chat_turns WHERE session_id = ? ORDER BY turn_id", (session_id,)
+        ).fetchall()
+        return [json.loads(row["entry"]) for row in rows]
+
+    def append_chat_turn(self, session_id: str, entry: Dict[str, Any], max_turns: int) -> Optional[int]:
+        """Append one exchange, keeping the newest max_turns. Returns the new history version."""
+        conn = self._connect()
+        with conn:
+            updated = conn.execute(
+                "UPDATE chat_sessions SET history_version = history_version + 1 WHERE session_id = ?",
+                (session_id,)
+            ).rowcount
+            if not updated:
+                return None
+            conn.execute(
+                "INSERT INTO chat_turns (session_id, entry) VALUES (?, ?)", (session_id, json.dumps(entry))
+            )
+            conn.execute(
+                "DELETE FROM chat_turns WHERE session_id = ? AND turn_id NOT IN "
+                "(SELECT turn_id FROM chat_turns WHERE session_id = ? ORDER BY turn_id DESC LIMIT ?)",
+                (session_id, session_id, max_turns)
+            )
+            row = conn.execute(
+                "SELECT history_version FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row["history_version"]
+
+    def clear_chat_history(self, session_id: str) -> Optional[int]:
+        """Drop all turns. Returns the new history version (None if no such session)."""
+        conn = self._connect()
+        with conn:
+            updated = conn.execute(
+                "UPDATE chat_sessions SET history_version = history_version + 1 WHERE session_id = ?",
+                (session_id,)
+            ).rowcount
+            if not updated:
+                return None
+            conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+            row = conn.execute(
+                "SELECT history_version FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row["history_version"]
+
+    def delete_chat_sessions(self, session_ids: List[str]) -> List[str]:
+        """Delete sessions and their turns. Returns index keys no session uses any more."""
+        if not session_ids:
+            return []
+        conn = self._connect()
+        placeholders = ",".join("?" * len(session_ids))
+        with conn:
+            keys = {
+                row["index_key"] for row in conn.execute(
+                    f"SELECT index_key FROM chat_sessions WHERE session_id IN ({placeholders})", session_ids
+                )
+            }
+            conn.execute(f"DELETE FROM chat_turns WHERE session_id IN ({placeholders})", session_ids)
+            conn.execute(f"DELETE FROM chat_sessions WHERE session_id IN ({placeholders})", session_ids)
+            return [
+                key for key in keys
+                if not conn.execute("SELECT 1 FROM chat_sessions WHERE index_key = ? LIMIT 1", (key,)).fetchone()
+            ]
+
+    def chat_index_key_in_use(self, index_key: str) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM chat_sessions WHERE index_key = ? LIMIT 1", (index_key,)
+        ).fetchone() is not None
+
+    def expired_chat_sessions(self, before: float) -> List[str]:
+        rows = self._connect().execute(
+            "SELECT session_id FROM chat_sessions WHERE last_access < ?", (before,)
+        ).fetchall()
+        return [row["session_id"] for row in rows]
+
+    # ============= INGESTION JOBS =============
+
+    @staticmethod
+    def _ingest_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def put_ingest_job(self, job_id: str, kind: str, payload: Dict[str, Any], max_queued: int) -> bool:
+        """Queue a job unless max_queued jobs are already waiting; False when full"""
+        conn = self._connect()
+        with conn:
+            inserted = conn.execute(
+                "INSERT INTO ingest_jobs (job_id, kind, payload, status, created_at) "
+                "SELECT ?, ?, ?, 'queued', ? WHERE (SELECT COUNT(*) FROM ingest_jobs WHERE status = 'queued') < ?",
+                (job_id, kind, json.dumps(payload), datetime.now().isoformat(), max_queued)
+            ).rowcount
+        return bool(inserted)
+
+    def get_ingest_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._ingest_job(row) if row else None
+
+    def claim_ingest_job(self, kinds: List[str]) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job of one of `kinds` to running"""
+        if not kinds:
+            return None
+        conn = self._connect()
+        placeholders = ",".join("?" * len(kinds))
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT * FROM ingest_jobs WHERE status = 'queued' AND kind IN ({placeholders}) "
+                "ORDER BY created_at LIMIT 1",
+                kinds
+            ).fetchone()
+            if row is None:
+                return None
+            started_at = datetime.now().isoformat()
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                (started_at, row["job_id"])
+            )
+        job = self._ingest_job(row)
+        job.update(status="running", started_at=started_at)
+        return job
+
+    def ingest_job_cancel_requested(self, job_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT cancel_requested FROM ingest_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish_ingest_job(
+        self,
+        job_id: str,
+        status: str,
+        elapsed: float,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        error_status_code: Optional[int] = None
+    ):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = ?, finished_at = ?, elapsed = ?, result = ?, error = ?, "
+                "error_status_code = ? WHERE job_id = ?",
+                (
+                    status, datetime.now().isoformat(), elapsed,
+                    json.dumps(result) if result is not None else None, error, error_status_code, job_id
+                )
+            )
+
+    def cancel_ingest_job(self, job_id: str) -> tuple:
+        """
+        Flag a job for cancellation. A queued job is cancelled on the spot
+        (freeing its queue slot). Returns (job or None, whether it was queued).
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM ingest_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None, False
+            was_queued = row["status"] == "queued"
+            if was_queued:
+                conn.execute(
+                    "UPDATE ingest_jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                    "WHERE job_id = ?",
+                    (datetime.now().isoformat(), job_id)
+                )
+            elif row["status"] == "running":
+                conn.execute("UPDATE ingest_jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+        return self.get_ingest_job(job_id), was_queued
+
+    def count_ingest_jobs(self) -> Dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS count FROM ingest_jobs GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def prune_ingest_jobs(self, finished_before: str) -> int:
+        """Delete finished jobs older than an ISO timestamp"""
+        conn = self._connect()
+        with conn:
+            return conn.execute(
+                "DELETE FROM ingest_jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,)
+            ).rowcount
+
+
+# ============= GLOBAL INSTANCE =============
+document_store = DocumentStore()
@@ -0,0 +1,246 @@
+"""
+Embedding Cache
+Content-addressed cache of sentence embeddings, keyed by a hash of the
+model id plus whitespace-normalized text.
+Hot tier: byte-bounded in-memory LRU of read-only float32 vectors.
+Cold tier: append-only float16 file per model, read through numpy memmap,
+with a key log mapping each key to its row. Once the file passes
+EMBEDDING_CACHE_DISK_BYTES it is compacted down to the newest half (one row
+per key), and a generation file tells other workers to reload.
+"""
+
+import os
+import fcntl
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("document_storage", "embedding_cache"))
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.getenv("EMBEDDING_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_DISK_BYTES = int(os.getenv("EMBEDDING_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + memmap file) embedding cache for one model"""
+
+    def __init__(
+        self,
+        model_id: str,
+        dimension: int,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        memory_bytes: int = EMBEDDING_CACHE_MEMORY_BYTES,
+        disk_bytes: int = EMBEDDING_CACHE_DISK_BYTES
+    ):
+        self.model_id = model_id
+        self.dimension = dimension
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.row_bytes = dimension * np.dtype(np.float16).itemsize
+
+        os.makedirs(cache_dir, exist_ok=True)
+        safe_name = model_id.replace("/", "__")
+        self.data_path = os.path.join(cache_dir, f"{safe_name}.{dimension}.f16")
+        self.keys_path = os.path.join(cache_dir, f"{safe_name}.{dimension}.keys")
+        self.generation_path = os.path.join(cache_dir, f"{safe_name}.{dimension}.gen")
+        self.lock_path = os.path.join(cache_dir, f"{safe_name}.{dimension}.lock")
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_used = 0
+        self._rows: Dict[str, int] = {}
+        self._keys_read = 0  # Bytes of the key log already loaded
+        self._mmap: Optional[np.memmap] = None
+        self._generation = self._read_generation()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+        with self._lock, self._file_lock(shared=True):
+            self._load_key_log()
+        logger.info(f"✅ Embedding cache ready ({len(self._rows)} vectors on disk)")
+
+    def make_key(self, text: str, normalize: bool = True) -> str:
+        payload = f"{self.model_id}\0{int(normalize)}\0{normalize_text(text)}"
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    # ============= DISK TIER =============
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Exclusive for appends and compaction, shared for reads"""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.generation_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _disk_rows(self) -> int:
+        return os.path.getsize(self.data_path) // self.row_bytes if os.path.exists(self.data_path) else 0
+
+    def _load_key_log(self):
+        """Read key log entries appended since the last call (by any process); hold the file lock"""
+        generation = self._read_generation()
+        if generation != self._generation:
+            # Compacted by another worker: rows were renumbered
+            self._rows.clear()
+            self._keys_read = 0
+            self._mmap = None
+            self._generation = generation
+        if not os.path.exists(self.keys_path):
+            return
+        complete_rows = self._disk_rows()
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written entry
+                self._keys_read += len(line)
+                key, row = line.decode("ascii").split()
+                if int(row) < complete_rows:
+                    self._rows[key] = int(row)
+
+    def _read_rows(self, rows: List[int]) -> np.ndarray:
+        """Rows from the memmap, remapping if the file grew"""
+        needed = max(rows) + 1
+        if self._mmap is None or self._mmap.shape[0] < needed:
+            self._mmap = np.memmap(
+                self.data_path, dtype=np.float16, mode="r",
+                shape=(self._disk_rows(), self.dimension)
+            )
+        return np.asarray(self._mmap[rows], dtype=np.float32)
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        """Append vectors then their keys, under an exclusive file lock"""
+        with self._file_lock():
+            start_row = self._disk_rows()
+            with open(self.data_path, "ab") as data:
+                data.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+            with open(self.keys_path, "ab") as key_log:
+                key_log.write("".join(
+                    f"{key} {start_row + i}\n" for i, key in enumerate(keys)
+                ).encode("ascii"))
+            self._load_key_log()
+            if (start_row + len(keys)) * self.row_bytes > self.disk_bytes:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the disk tier with the newest rows filling half the budget, one per key"""
+        self._load_key_log()
+        keep_rows = max(1, self.disk_bytes // 2 // self.row_bytes)
+        newest = sorted(self._rows.items(), key=lambda item: item[1])[-keep_rows:]
+        old_rows = np.array([row for _, row in newest], dtype=np.int64)
+        vectors = np.memmap(self.data_path, dtype=np.float16, mode="r", shape=(self._disk_rows(), self.dimension))
+
+        suffix = f".{os.getpid()}.tmp"
+        with open(self.data_path + suffix, "wb") as data:
+            data.write(np.ascontiguousarray(vectors[old_rows]).tobytes())
+        with open(self.keys_path + suffix, "wb") as key_log:
+            key_log.write("".join(f"{key} {i}\n" for i, (key, _) in enumerate(newest)).encode("ascii"))
+        del vectors
+        os.replace(self.data_path + suffix, self.data_path)
+        os.replace(self.keys_path + suffix, self.keys_path)
+        with open(self.generation_path + suffix, "w") as f:
+            f.write(str(self._generation + 1))
+        os.replace(self.generation_path + suffix, self.generation_path)
+
+        self.compactions += 1
+        self._load_key_log()
+        logger.info(f"✅ Compacted embedding cache to {len(self._rows)} vectors ({self.model_id})")
+
+    # ============= MEMORY TIER =============
+
+    def _remember(self, key: str, vector: np.ndarray) -> np.ndarray:
+        """Keep a read-only copy (a row view would pin its whole batch array); returns it"""
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            return cached
+        cached = np.array(vector, dtype=np.float32)
+        cached.setflags(write=False)
+        self._memory[key] = cached
+        self._memory_used += cached.nbytes
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.nbytes
+        return cached
+
+    # ============= PUBLIC API =============
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached read-only float32 vectors for the keys (None for misses)"""
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            disk_lookups = []
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookups.append(i)
+
+            found = []
+            if disk_lookups:
+                with self._file_lock(shared=True):
+                    if any(keys[i] not in self._rows for i in disk_lookups) or self._read_generation() != self._generation:
+                        self._load_key_log()  # Pick up rows written (or compacted) by other workers
+
+                    found = [i for i in disk_lookups if keys[i] in self._rows]
+                    if found:
+                        vectors = self._read_rows([self._rows[keys[i]] for i in found])
+                if found:
+                    for i, vector in zip(found, vectors):
+                        results[i] = self._remember(keys[i], vector)
+                    self.disk_hits += len(found)
+            self.misses += len(disk_lookups) - len(found)
+        return results
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            new = {}
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+                if key not in self._rows:
+                    new[key] = vector
+            if new:
+                self._append(list(new), np.stack(list(new.values())))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "memory_limit_bytes": self.memory_bytes,
+                "disk_entries": len(self._rows),
+                "disk_limit_bytes": self.disk_bytes,
+                "compactions": self.compactions,
+                "disk_bytes": os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+            }
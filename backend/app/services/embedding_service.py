@@ -0,0 +1,360 @@
+"""
+Embedding Service
+Process-wide owner of the sentence embedding model (all-MiniLM-L6-v2).
+The summarizer and chatbot share this instance, so the weights are loaded
+and warmed up once and batching/threading are tuned in one place.
+
+Small encode requests go through a micro-batcher: concurrent callers are
+collected for up to EMBEDDING_BATCH_MAX_WAIT_MS (or EMBEDDING_BATCH_MAX_ITEMS
+texts) and run as one padded forward pass. Texts already seen are served
+from the embedding cache and never reach the model.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Any, Dict
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = torch default
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None  # None = auto (cuda if available)
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "64"))  # <= 1 disables batching
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+DEFAULT_MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 window
+
+# Histogram bucket upper bounds (last bucket is open-ended)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Fixed-bucket counter histogram"""
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.samples = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.samples += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.samples,
+            "mean": round(self.total / self.samples, 3) if self.samples else 0.0
+        }
+
+
+class MicroBatcher:
+    """
+    Collects encode requests from many threads into one batch.
+    A single dispatcher thread takes the first waiting request, keeps
+    collecting until max_items texts or max_wait_ms have passed, encodes
+    everything in one call and scatters the rows back to each caller.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str], bool], np.ndarray],
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+        max_items: int = EMBEDDING_BATCH_MAX_ITEMS
+    ):
+        self.encode_fn = encode_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batches = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, texts: List[str], normalize: bool = True) -> Future:
+        """Queue texts; the future resolves to their embedding rows"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((list(texts), normalize, future, time.perf_counter()))
+        return future
+
+    def _collect(self) -> list:
+        """Block for one request, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = first[3] + self.max_wait
+        while size < self.max_items:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            dispatched = time.perf_counter()
+
+            # One forward pass per normalization mode present in the batch
+            for normalize in (True, False):
+                group = [item for item in batch if item[1] == normalize]
+                if not group:
+                    continue
+                texts = [text for item in group for text in item[0]]
+                try:
+                    embeddings = self.encode_fn(texts, normalize)
+                except Exception as e:
+                    for item in group:
+                        item[2].set_exception(e)
+                    continue
+
+                offset = 0
+                for item_texts, _, future, _ in group:
+                    future.set_result(embeddings[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.batch_sizes.observe(sum(len(item[0]) for item in batch))
+                for item in batch:
+                    self.queue_wait_ms.observe((dispatched - item[3]) * 1000)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "max_wait_ms": self.max_wait * 1000,
+                "max_items": self.max_items,
+                "batches": self.batches,
+                "pending": self._queue.qsize(),
+                "batch_size": self.batch_sizes.to_dict(),
+                "queue_wait_ms": self.queue_wait_ms.to_dict()
+            }
+
+
+class EmbeddingService:
+    """Lazily loaded, shared SentenceTransformer with batched encode"""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+        device: Optional[str] = EMBEDDING_DEVICE,
+        batch_max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+        batch_max_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+        cache_enabled: bool = EMBEDDING_CACHE_ENABLED
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.device = device
+        self._model = None
+        self.cache_enabled = cache_enabled
+        self._cache: Optional[EmbeddingCache] = None
+        self._lock = threading.Lock()
+        self.encode_calls = 0
+        self.texts_encoded = 0
+        self.encode_seconds = 0.0
+        self.batcher = MicroBatcher(self._encode_now, batch_max_wait_ms, batch_max_items) if batch_max_items > 1 else None
+
+    @property
+    def model(self):
+        """Load the model on first use (one copy per process)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads > 0:
+            import torch
+            torch.set_num_threads(self.threads)
+
+        logger.info(f"Loading embedding model {self.model_name}...")
+        model = SentenceTransformer(self.model_name, device=self.device)
+        # Warmup so the first real request doesn't pay for lazy initialization
+        model.encode(["warmup"], batch_size=1, show_progress_bar=False)
+        logger.info(f"✅ Embedding model loaded on {model.device}")
+        return model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_tokens(self) -> int:
+        """Tokens embedded per text (longer texts are truncated), excluding [CLS]/[SEP]"""
+        return int(getattr(self.model, "max_seq_length", None) or DEFAULT_MAX_SEQ_LENGTH) - 2
+
+    def count_tokens(self, texts: List[str]) -> np.ndarray:
+        """Model tokenizer token counts without special tokens, in one batched call"""
+        if not texts:
+            return np.zeros(0, dtype=np.int32)
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return np.array([len(text.split()) for text in texts], dtype=np.int32)
+        encoded = tokenizer(
+            list(texts), add_special_tokens=False, truncation=False,
+            return_attention_mask=False, return_token_type_ids=False
+        )
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int32)
+
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        """Embedding cache for this model (opened once the dimension is known)"""
+        if self._cache is None and self.cache_enabled:
+            dimension = self.dimension
+            with self._lock:
+                if self._cache is None:
+                    self._cache = EmbeddingCache(self.model_name, dimension)
+        return self._cache
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        normalize: bool = True,
+        dtype: Any = np.float32
+    ) -> np.ndarray:
+        """
+        Encode texts into a (len(texts), dimension) array.
+        With normalize=True rows are unit length, so a dot product is the
+        cosine similarity. Cached texts are looked up first; small sets of
+        misses are merged with concurrent requests by the micro-batcher,
+        large ones already fill a batch and run directly.
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=dtype)
+
+        lookup = self._lookup(texts, normalize)
+        if lookup["missing"]:
+            missing = lookup["missing"]
+            if self.batcher is not None and len(missing) < self.batcher.max_items:
+                computed = self.batcher.submit(missing, normalize).result()
+            else:
+                computed = self._encode_now(missing, normalize, batch_size)
+            self._store(lookup, computed)
+        return self._assemble(lookup, dtype)
+
+    async def encode_async(
+        self,
+        texts: List[str],
+        normalize: bool = True,
+        dtype: Any = np.float32
+    ) -> np.ndarray:
+        """encode() for coroutines: waits on the batcher without blocking the event loop"""
+        if self.batcher is None or not texts or len(texts) >= self.batcher.max_items:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: self.encode(texts, normalize=normalize, dtype=dtype))
+
+        lookup = self._lookup(texts, normalize)
+        if lookup["missing"]:
+            computed = await asyncio.wrap_future(self.batcher.submit(lookup["missing"], normalize))
+            self._store(lookup, computed)
+        return self._assemble(lookup, dtype)
+
+    def _lookup(self, texts: List[str], normalize: bool) -> Dict[str, Any]:
+        """Split texts into cache hits and the distinct texts still to encode"""
+        cache = self.cache
+        if cache is None:
+            return {"keys": None, "vectors": [None] * len(texts), "missing": list(texts)}
+
+        keys = [cache.make_key(text, normalize) for text in texts]
+        vectors = cache.get_many(keys)
+        missing_keys = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing_keys:
+                missing_keys[key] = text
+        return {
+            "keys": keys,
+            "vectors": vectors,
+            "missing_keys": list(missing_keys),
+            "missing": list(missing_keys.values())
+        }
+
+    def _store(self, lookup: Dict[str, Any], computed: np.ndarray):
+        """Fill misses with freshly computed rows and write them to the cache"""
+        if lookup["keys"] is None:
+            lookup["vectors"] = list(computed)
+            return
+        self._cache.put_many(lookup["missing_keys"], computed)
+        by_key = dict(zip(lookup["missing_keys"], computed))
+        lookup["vectors"] = [
+            vector if vector is not None else by_key[key]
+            for key, vector in zip(lookup["keys"], lookup["vectors"])
+        ]
+
+    @staticmethod
+    def _assemble(lookup: Dict[str, Any], dtype: Any) -> np.ndarray:
+        return np.ascontiguousarray(np.stack(lookup["vectors"]), dtype=dtype)
+
+    def _encode_now(self, texts: List[str], normalize: bool = True, batch_size: Optional[int] = None) -> np.ndarray:
+        """One direct model call"""
+        started = time.perf_counter()
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=batch_size or self.batch_size,
+            normalize_embeddings=normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.encode_calls += 1
+            self.texts_encoded += len(texts)
+            self.encode_seconds += elapsed
+
+        return embeddings
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "loaded": self.is_loaded,
+                "batch_size": self.batch_size,
+                "encode_calls": self.encode_calls,
+                "texts_encoded": self.texts_encoded,
+                "texts_per_second": round(self.texts_encoded / self.encode_seconds, 1) if self.encode_seconds else 0.0,
+                "batcher": self.batcher.get_stats() if self.batcher else None,
+                "cache": self._cache.get_stats() if self._cache else None
+            }
+
+
+# ============= GLOBAL INSTANCE =============
+embedding_service = EmbeddingService()
@@ -0,0 +1,56 @@
+"""
+Extraction Cache
+Content-addressed cache of extracted document text.
+Extractions are keyed by the SHA-256 of the uploaded bytes (computed while
+the upload is spooled) and kept in the document store, so repeat uploads of
+the same file skip parsing entirely.
+"""
+
+import logging
+from typing import Dict, Optional, Any
+from app.services.document_store import DocumentStore, document_store
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """Maps content hash -> extracted text + metadata"""
+
+    def __init__(self, store: DocumentStore = document_store):
+        self.store = store
+
+    def get(self, content_hash: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached extraction.
+        Returns its metadata (counts, preview), or None on a miss.
+        """
+        entry = self.store.get_extraction(content_hash, file_type)
+        self.store.record_extraction_lookup(hit=entry is not None)
+        return entry
+
+    def read_text(self, entry: Dict[str, Any]) -> Optional[str]:
+        return self.store.read_extraction_text(entry["content_hash"], entry["file_type"])
+
+    def put(
+        self,
+        content_hash: str,
+        file_type: str,
+        text: str,
+        page_index: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        return self.store.put_extraction(content_hash, file_type, text, page_index)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counts kept in the store, so they cover every worker"""
+        counts = self.store.get_extraction_lookups()
+        hits, misses = counts["hits"], counts["misses"]
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
+
+
+# ============= GLOBAL INSTANCE =============
+extraction_cache = ExtractionCache()
@@ -0,0 +1,215 @@
+"""
+Ingestion Job Queue
+Bounded job queue feeding a fixed pool of ingestion workers.
+Uploads are accepted as jobs and processed in the background so HTTP
+connections are not held open while documents are parsed.
+Jobs (status, result, error, cancel flag) are rows in the shared document
+store, and every uvicorn worker process polls that table, so any process
+can report on, cancel or run any job.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Any
+from app.services.document_store import DocumentStore, document_store
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "32"))
+INGEST_JOB_RETENTION_SECONDS = int(os.getenv("INGEST_JOB_RETENTION_SECONDS", "3600"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "0.5"))  # How often idle workers check for jobs
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue is at capacity (backpressure)"""
+
+
+class JobCancelled(Exception):
+    """Raised by a job handler when it notices a cancellation request"""
+
+
+class IngestionQueue:
+    """
+    Job handlers are blocking callables `handler(payload, job)` registered
+    under a kind; they run in a thread pool sized to the worker count.
+    Payloads and results must be JSON-serializable. A handler can call
+    `job["is_cancelled"]()` between stages and raise JobCancelled to stop.
+    """
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        queue_depth: int = INGEST_QUEUE_DEPTH,
+        store: DocumentStore = document_store
+    ):
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.store = store
+        self._handlers: Dict[str, tuple] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+
+    def register(
+        self,
+        kind: str,
+        handler: JobHandler,
+        cleanup: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Register the handler for a job kind. `cleanup(payload)` always runs
+        once a job of this kind leaves the queue (finished or cancelled).
+        """
+        self._handlers[kind] = (handler, cleanup)
+
+    def start(self):
+        """Start worker tasks on the running event loop (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._tasks = [
+                asyncio.create_task(self._worker(i)) for i in range(self.workers)
+            ]
+            logger.info(
+                f"✅ Ingestion queue started with {self.workers} workers, depth {self.queue_depth}"
+            )
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a job. Raises QueueFullError when the queue is at capacity."""
+        if kind not in self._handlers:
+            raise ValueError(f"No ingestion handler registered for '{kind}'")
+        self.start()
+        self._prune()
+
+        job_id = str(uuid.uuid4())
+        if not self.store.put_ingest_job(job_id, kind, payload, self.queue_depth):
+            raise QueueFullError(
+                f"Ingestion queue is full ({self.queue_depth} jobs). Please retry shortly."
+            )
+
+        self._wake.set()
+        return self.get_job(job_id)
+
+    async def _worker(self, worker_index: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._wake.clear()
+                claimed = await loop.run_in_executor(None, self.store.claim_ingest_job, list(self._handlers))
+                if claimed is None:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=INGEST_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(claimed, loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_index} error: {e}")
+                await asyncio.sleep(INGEST_POLL_SECONDS)
+
+    async def _run(self, claimed: Dict[str, Any], loop: asyncio.AbstractEventLoop):
+        job_id = claimed["job_id"]
+        handler, cleanup = self._handlers[claimed["kind"]]
+        payload = claimed["payload"]
+        job = {"job_id": job_id, "is_cancelled": lambda: self.store.ingest_job_cancel_requested(job_id)}
+        result, error, error_status_code = None, None, None
+        started = time.perf_counter()
+
+        try:
+            result = await loop.run_in_executor(self._executor, handler, payload, job)
+            status = COMPLETED
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status = FAILED
+            error = getattr(e, "detail", None) or str(e)
+            error_status_code = getattr(e, "status_code", 500)
+            logger.error(f"Ingestion job {job_id} failed: {error}")
+        finally:
+            self._cleanup(cleanup, payload)
+
+        await loop.run_in_executor(
+            None, self.store.finish_ingest_job,
+            job_id, status, round(time.perf_counter() - started, 3), result, error, error_status_code
+        )
+
+    @staticmethod
+    def _cleanup(cleanup: Optional[Callable[[Dict[str, Any]], None]], payload: Dict[str, Any]):
+        if cleanup:
+            try:
+                cleanup(payload)
+            except Exception as e:
+                logger.warning(f"Ingestion cleanup failed: {e}")
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window"""
+        cutoff = datetime.fromtimestamp(time.time() - INGEST_JOB_RETENTION_SECONDS).isoformat()
+        self.store.prune_ingest_jobs(cutoff)
+
+    @staticmethod
+    def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in job.items() if key not in ("kind", "payload")}
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get_ingest_job(job_id)
+        return self.public_view(job) if job else None
+
+    async def wait_for_job(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return once the job finishes or the timeout expires"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get_job(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATES or remaining <= 0:
+                return job
+            await asyncio.sleep(min(INGEST_POLL_SECONDS / 2, remaining))
+
+    def cancel_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Request cancellation. Queued jobs are cancelled immediately and free
+        their queue slot; running jobs stop at the handler's next
+        cancellation check.
+        """
+        job, was_queued = self.store.cancel_ingest_job(job_id)
+        if job is None:
+            return None
+        if was_queued and job["kind"] in self._handlers:
+            self._cleanup(self._handlers[job["kind"]][1], job["payload"])
+        return self.public_view(job)
+
+    def get_stats(self) -> Dict[str, Any]:
+        statuses = self.store.count_ingest_jobs()
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "queued": statuses.get(QUEUED, 0),
+            "jobs_by_status": statuses,
+            "completed": statuses.get(COMPLETED, 0),
+            "failed": statuses.get(FAILED, 0),
+            "cancelled": statuses.get(CANCELLED, 0)
+        }
+
+
+# ============= GLOBAL INSTANCE =============
+ingestion_queue = IngestionQueue()
@@ -5,7 +5,7 @@ Supports multiple LLM providers (OpenAI, Groq, Gemini)
 
 import os
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Iterator, Optional, List, Dict, Any
 
 logger = logging.getLogger(__name__)
 
@@ -132,6 +132,39 @@ class LLMService:
             logger.error(f"LLM call failed: {str(e)}")
             raise
     
+    def _stream_llm(self, prompt: str, temperature: float = 0.7, max_tokens: int = 1000) -> Iterator[str]:
+        """
+        Like _call_llm, but yields text pieces as the provider generates them.
+        """
+        if not self.is_available():
+            raise ValueError("LLM service not available. Please configure an API key.")
+        
+        try:
+            if self.provider in ("openai", "groq"):
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            
+            elif self.provider == "gemini":
+                for chunk in self.client.generate_content(prompt, stream=True):
+                    # .text raises on chunks without parts (e.g. safety-blocked)
+                    if getattr(chunk, "parts", None):
+                        yield chunk.text
+            
+            else:
+                raise ValueError(f"Unknown provider: {self.provider}")
+        
+        except Exception as e:
+            logger.error(f"LLM stream failed: {str(e)}")
+            raise
+    
     # ============= TRANSLATION METHODS =============
     
     def translate_text(self, text: str, target_language: str, source_language: str = "auto") -> str:
@@ -157,23 +190,56 @@ Translation in {target_language}:"""
         document_context: str, 
         question: str, 
         language: str = "english",
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        *,
+        chunks: Optional[List[str]] = None
     ) -> str:
         """
         Answer questions about a document using LLM.
-        Supports multilingual responses.
+        Supports multilingual responses. Pass the retrieved `chunks` to
+        ground the answer in them (document_context is then unused);
+        otherwise the start of `document_context` is used.
         """
+        prompt = self.build_chat_prompt(question, language, conversation_history, chunks, document_context)
+        return self._call_llm(prompt, temperature=0.5, max_tokens=500)
+
+    def stream_chat_with_llm(
+        self,
+        question: str,
+        language: str = "english",
+        conversation_history: Optional[List[Dict]] = None,
+        chunks: Optional[List[str]] = None,
+        document_context: Optional[str] = None
+    ) -> Iterator[str]:
+        """chat_with_llm, yielding the answer text as it is generated"""
+        prompt = self.build_chat_prompt(question, language, conversation_history, chunks, document_context)
+        return self._stream_llm(prompt, temperature=0.5, max_tokens=500)
+
+    def build_chat_prompt(
+        self,
+        question: str,
+        language: str = "english",
+        conversation_history: Optional[List[Dict]] = None,
+        chunks: Optional[List[str]] = None,
+        document_context: Optional[str] = None
+    ) -> str:
+        """Chat prompt over retrieved excerpts (or the start of the document)"""
         
         # Build conversation context
         history_text = ""
         if conversation_history:
-            for entry in conversation_history[-3:]:  # Last 3 exchanges
+            for entry in list(conversation_history)[-3:]:  # Last 3 exchanges
                 history_text += f"Q: {entry.get('question', '')}\nA: {entry.get('answer', '')}\n\n"
         
-        prompt = f"""You are a helpful assistant answering questions about a document.
+        if chunks is not None:
+            excerpts = "\n\n".join(f"[{i}] {chunk}" for i, chunk in enumerate(chunks, 1))
+            document_section = f"Relevant Document Excerpts:\n{excerpts}"
+        else:
+            document_section = f"Document Content:\n{(document_context or '')[:3000]}"
+        
+        return f"""You are a helpful assistant answering questions about a document.
 
-Document Content:
-{document_context[:3000]}
+{document_section}
 
 {history_text}
 Current Question: {question}
@@ -182,8 +248,6 @@ Please answer the question based on the document content in {language}.
 Be concise and accurate. If the answer is not in the document, say so.
 
 Answer:"""
-        
-        return self._call_llm(prompt, temperature=0.5, max_tokens=500)
     
     # ============= FLASHCARD METHODS =============
     
@@ -0,0 +1,144 @@
+"""
+Mapped Text
+Memory-mapped access to stored document text.
+Each extraction is materialized once as a plain UTF-8 file next to a sparse
+char -> byte checkpoint index, so byte ranges and character windows can be
+served straight from the page cache without decoding the whole document.
+"""
+
+import os
+import mmap
+import logging
+import threading
+from array import array
+from typing import Iterator, Optional
+from app.services.document_store import DocumentStore, document_store
+
+logger = logging.getLogger(__name__)
+
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join("document_storage", "text_cache"))
+CHECKPOINT_CHARS = 4096
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class MappedText:
+    """Read-only mmap of a UTF-8 text file plus its checkpoint index"""
+
+    def __init__(self, text_path: str, checkpoints: array, character_count: int):
+        self.character_count = character_count
+        self.checkpoints = checkpoints
+        self._file = open(text_path, "rb")
+        self.byte_size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.byte_size else b""
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def byte_offset(self, char_offset: int) -> int:
+        """Byte position of a character offset: nearest checkpoint, then
+        decode at most CHECKPOINT_CHARS characters forward."""
+        char_offset = max(0, min(char_offset, self.character_count))
+        checkpoint, remainder = divmod(char_offset, CHECKPOINT_CHARS)
+        start = self.checkpoints[checkpoint]
+        if remainder == 0:
+            return start
+        window = self._mm[start:start + remainder * 4]
+        prefix = window.decode("utf-8", errors="ignore")[:remainder]
+        return start + len(prefix.encode("utf-8"))
+
+    def iter_bytes(self, start: int, end: int, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        """Yield bytes [start, end) in chunks straight from the mapping"""
+        end = min(end, self.byte_size)
+        position = max(0, start)
+        while position < end:
+            next_position = min(position + chunk_size, end)
+            yield self._mm[position:next_position]
+            position = next_position
+
+    def char_range(self, offset: int, limit: Optional[int] = None) -> tuple:
+        """Byte range [start, end) covering `limit` characters from `offset`"""
+        end_char = self.character_count if limit is None else offset + limit
+        return self.byte_offset(offset), self.byte_offset(end_char)
+
+    def read_chars(self, offset: int, limit: Optional[int] = None) -> str:
+        start, end = self.char_range(offset, limit)
+        return self._mm[start:end].decode("utf-8")
+
+
+class MappedTextCache:
+    """Materializes stored extractions as mmap-able files on first use"""
+
+    def __init__(self, store: DocumentStore = document_store, cache_dir: str = TEXT_CACHE_DIR):
+        self.store = store
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _paths(self, content_hash: str, file_type: str) -> tuple:
+        base = os.path.join(self.cache_dir, f"{content_hash}.{file_type}")
+        return f"{base}.txt", f"{base}.idx"
+
+    def _materialize(self, content_hash: str, file_type: str, text_path: str, index_path: str):
+        text = self.store.read_extraction_text(content_hash, file_type)
+        if text is None:
+            raise KeyError(f"No stored text for {content_hash}")
+
+        # Byte offset of every CHECKPOINT_CHARS-th character
+        checkpoints = array("Q", [0])
+        tmp_text_path = f"{text_path}.{os.getpid()}.tmp"
+        with open(tmp_text_path, "wb") as f:
+            written = 0
+            for start in range(0, len(text), CHECKPOINT_CHARS):
+                encoded = text[start:start + CHECKPOINT_CHARS].encode("utf-8")
+                f.write(encoded)
+                written += len(encoded)
+                checkpoints.append(written)
+
+        tmp_index_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_index_path, "wb") as f:
+            checkpoints.tofile(f)
+
+        # The text file is published last; its presence marks a complete entry
+        os.replace(tmp_index_path, index_path)
+        os.replace(tmp_text_path, text_path)
+
+    def open(self, content_hash: str, file_type: str, character_count: int) -> MappedText:
+        """Map a stored extraction, materializing it on first access"""
+        text_path, index_path = self._paths(content_hash, file_type)
+        if not os.path.exists(text_path):
+            with self._lock:
+                if not os.path.exists(text_path):
+                    logger.info(f"Materializing text {content_hash[:12]} for mmap access")
+                    self._materialize(content_hash, file_type, text_path, index_path)
+
+        checkpoints = array("Q")
+        with open(index_path, "rb") as f:
+            checkpoints.frombytes(f.read())
+        return MappedText(text_path, checkpoints, character_count)
+
+    def remove(self, content_hash: str, file_type: str):
+        """Delete the materialized files of a released extraction (open mappings stay valid)"""
+        for path in self._paths(content_hash, file_type):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def open_document(self, document_id: str) -> Optional[MappedText]:
+        doc = self.store.get_document(document_id)
+        if doc is None:
+            return None
+        return self.open(doc["content_hash"], doc["file_type"], doc["character_count"])
+
+
+# ============= GLOBAL INSTANCE =============
+mapped_text_cache = MappedTextCache()
@@ -2,6 +2,7 @@ from transformers import pipeline
 import re
 from typing import List, Dict, Optional
 import logging
+from app.services.text_analysis import TextAnalysis
 
 logger = logging.getLogger(__name__)
 
@@ -28,8 +29,11 @@ def get_summarizer():
     return _summarizer
 
 
-def split_into_topics(text: str) -> Dict[str, str]:
+def split_into_topics(text: str, analysis: Optional[TextAnalysis] = None) -> Dict[str, str]:
     """Split text into topic-wise blocks"""
+    if analysis is not None:
+        return analysis.topics()
+
     topic_blocks = {}
     current_topic = "Introduction"
     current_text = []
@@ -57,6 +61,7 @@ def generate_flashcards(
     card_type: str = "question_answer",
     focus_topics: Optional[List[str]] = None,
     language: str = "english",
+    analysis: Optional[TextAnalysis] = None,
     **kwargs
 ) -> List[Dict[str, str]]:
     """Generate flashcards with configurable parameters"""
@@ -70,7 +75,10 @@ def generate_flashcards(
     qna_pipeline = get_qna_pipeline()
     summarizer = get_summarizer()
     
-    topics = split_into_topics(text)
+    topics = split_into_topics(text, analysis=analysis)
+    topic_spans = {}
+    if analysis is not None:
+        topic_spans = {title: span for title, _, span in analysis.topic_blocks()}
     flashcards = []
 
     # Filter topics if focus_topics specified
@@ -138,7 +146,10 @@ def generate_flashcards(
 
         # Generate additional Q&A
         if len(flashcards) < num_cards:
-            sentences = re.split(r'(?<=[.!?]) +', topic_text)
+            if topic in topic_spans:
+                sentences = analysis.sentences_in_span(*topic_spans[topic], limit=3)
+            else:
+                sentences = re.split(r'(?<=[.!?]) +', topic_text)
             for sentence in sentences[:3]:
                 if len(flashcards) >= num_cards:
                     break
@@ -0,0 +1,80 @@
+"""
+Embedding Quantization
+Compact storage for L2-normalized embedding matrices:
+  float32  4 bytes per dimension (exact)
+  float16  2 bytes per dimension
+  int8     1 byte per dimension plus one float32 scale per vector
+Scores are computed straight from the stored arrays, dequantizing one
+block of rows at a time so a full float32 copy never exists.
+"""
+
+import os
+from typing import Optional
+import numpy as np
+
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32").lower()
+STORAGE_MODES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 1024
+
+
+class QuantizedEmbeddings:
+    """(N, d) embedding matrix stored as float32, float16 or int8 + per-row scale"""
+
+    def __init__(self, data: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.data = data
+        self.scales = scales
+        self.mode = "int8" if scales is not None else str(data.dtype)
+
+    @classmethod
+    def quantize(cls, embeddings: np.ndarray, mode: str = EMBEDDING_STORAGE) -> "QuantizedEmbeddings":
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown embedding storage '{mode}', expected one of {STORAGE_MODES}")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(0, 0) if embeddings.size == 0 else embeddings.reshape(1, -1)
+
+        if mode == "float32":
+            return cls(np.ascontiguousarray(embeddings))
+        if mode == "float16":
+            return cls(embeddings.astype(np.float16))
+
+        # Symmetric per-vector scale: the largest component maps to +-127
+        scales = np.abs(embeddings).max(axis=1) / 127.0 if len(embeddings) else np.zeros(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        data = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return cls(data, scales)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def shape(self) -> tuple:
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def rows(self, ids) -> np.ndarray:
+        """Dequantized float32 rows"""
+        rows = np.asarray(self.data[ids], dtype=np.float32)
+        if self.scales is not None:
+            rows *= self.scales[ids][..., None]
+        return rows
+
+    def dot(self, queries: np.ndarray) -> np.ndarray:
+        """(Q, N) scores of float32 queries against every stored row"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.mode == "float32":
+            return queries @ self.data.T
+
+        scores = np.empty((len(queries), len(self.data)), dtype=np.float32)
+        for start in range(0, len(self.data), SCORE_BLOCK_ROWS):
+            block = self.data[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def to_float32(self) -> np.ndarray:
+        return self.rows(slice(None))
@@ -0,0 +1,249 @@
+"""
+Retrieval Index
+Per-document chunk list plus L2-normalized embedding matrix, built once per
+document text and shared by stateless questions and every chat session on
+the same document. Embeddings are stored as float32, float16 or int8
+(EMBEDDING_STORAGE) and scored without a float32 copy.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Tuple, Union
+import numpy as np
+from app.services.bm25 import BM25Index
+from app.services.quantization import QuantizedEmbeddings, EMBEDDING_STORAGE
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "32"))
+# Same budget as resident chat sessions unless set on its own
+RETRIEVAL_INDEX_CACHE_BYTES = int(os.getenv(
+    "RETRIEVAL_INDEX_CACHE_BYTES", os.getenv("CHAT_SESSION_MEMORY_BYTES", str(256 * 1024 * 1024))
+))
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+def top_k_similar(
+    matrix: Union[np.ndarray, QuantizedEmbeddings],
+    queries: np.ndarray,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k rows of a normalized (N, d) matrix (plain or quantized) for one (d,)
+    or several (Q, d) normalized queries: one matrix product, then
+    argpartition (O(N)) and a sort of only the k winners. Returns
+    (indices, scores), each (Q, k), best first.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if isinstance(matrix, QuantizedEmbeddings):
+        scores = matrix.dot(queries)
+    else:
+        scores = queries @ matrix.T
+    k = min(top_k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class RetrievalIndex:
+    """Chunks of one document and their normalized, optionally quantized, embeddings"""
+
+    def __init__(
+        self,
+        key: str,
+        chunks: List[str],
+        embeddings: Union[np.ndarray, QuantizedEmbeddings],
+        storage: str = EMBEDDING_STORAGE,
+        chunk_tokens: Optional[np.ndarray] = None,
+        sentences: Optional[List[str]] = None,
+        sentence_bounds: Optional[np.ndarray] = None,
+        sentence_embeddings: Optional[QuantizedEmbeddings] = None
+    ):
+        self.key = key
+        self.chunks = chunks
+        self.storage = storage
+        self.chunk_tokens = chunk_tokens  # Model tokens per chunk, when known
+        if not isinstance(embeddings, QuantizedEmbeddings):
+            embeddings = QuantizedEmbeddings.quantize(embeddings, storage)
+        self.embeddings = embeddings
+        self.created_at = datetime.now().isoformat()
+        self._bm25: Optional[BM25Index] = None
+        self._sentence_bm25: Optional[BM25Index] = None
+        # Sentences the chunks were packed from; chunk c spans sentence_bounds[c]
+        self.sentences = sentences
+        self.sentence_bounds = sentence_bounds
+        self.sentence_embeddings = sentence_embeddings
+        self._sentence_lock = threading.Lock()
+
+    @property
+    def bm25(self) -> BM25Index:
+        """Lexical index over the chunks (built on first use)"""
+        if self._bm25 is None:
+            self._bm25 = BM25Index(self.chunks)
+        return self._bm25
+
+    def _ensure_sentences(self):
+        """Without chunker sentences, split each chunk (regex) into its own sentences"""
+        if self.sentences is not None:
+            return
+        sentences = []
+        bounds = []
+        for chunk in self.chunks:
+            chunk_sentences = _SENTENCE_SPLIT.split(chunk)
+            bounds.append((len(sentences), len(sentences) + len(chunk_sentences)))
+            sentences.extend(chunk_sentences)
+        self.sentence_bounds = np.array(bounds, dtype=np.int32).reshape(-1, 2)
+        self.sentences = sentences
+
+    @property
+    def sentence_bm25(self) -> BM25Index:
+        """Lexical index over the document's sentences, for answer selection
+        (document-wide term statistics)"""
+        if self._sentence_bm25 is None:
+            self._ensure_sentences()
+            self._sentence_bm25 = BM25Index(self.sentences)
+        return self._sentence_bm25
+
+    def sentences_for_chunks(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Sorted ids of the sentences in the given chunks (overlaps counted once)"""
+        self._ensure_sentences()
+        ranges = [np.arange(first, last) for first, last in self.sentence_bounds[chunk_ids].tolist()]
+        return np.unique(np.concatenate(ranges)) if ranges else np.zeros(0, dtype=np.int64)
+
+    def ensure_sentence_embeddings(self, encode: Callable[[List[str]], np.ndarray]) -> QuantizedEmbeddings:
+        """Embed every sentence once (stored like the chunk embeddings)"""
+        if self.sentence_embeddings is None:
+            with self._sentence_lock:
+                if self.sentence_embeddings is None:
+                    self._ensure_sentences()
+                    self.sentence_embeddings = QuantizedEmbeddings.quantize(
+                        encode(self.sentences), self.embeddings.mode
+                    )
+        return self.sentence_embeddings
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query_embeddings: np.ndarray, top_k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, scores) of the best chunks for each normalized query row"""
+        return top_k_similar(self.embeddings, query_embeddings, top_k)
+
+    def similarity(self, query_embedding: np.ndarray, chunk_ids: np.ndarray) -> np.ndarray:
+        """Cosine scores of the given chunks against one normalized query"""
+        return self.embeddings.rows(chunk_ids) @ np.asarray(query_embedding, dtype=np.float32)
+
+    def sentence_similarity(self, query_embedding: np.ndarray, sentence_ids: np.ndarray) -> np.ndarray:
+        """Cosine scores of the given sentences (needs sentence embeddings)"""
+        return self.sentence_embeddings.rows(sentence_ids) @ np.asarray(query_embedding, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        sentence_bytes = self.sentence_embeddings.nbytes if self.sentence_embeddings is not None else 0
+        return self.embeddings.nbytes + sentence_bytes + sum(len(chunk) for chunk in self.chunks)
+
+
+def index_key(text: str, chunking: Any) -> str:
+    """Content key: the same text with the same chunking settings shares one index"""
+    return f"{hashlib.sha256(text.encode('utf-8')).hexdigest()}:{chunking}"
+
+
+class RetrievalIndexCache:
+    """
+    LRU of retrieval indexes keyed by document content, bounded by bytes
+    (and entry count). Evicted indexes are only weakly referenced, so one
+    still held by a chat session is reused rather than rebuilt, and is freed
+    once the last session lets go of it.
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_INDEX_CACHE_SIZE, max_bytes: int = RETRIEVAL_INDEX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, RetrievalIndex]" = OrderedDict()
+        self._shared: "weakref.WeakValueDictionary[str, RetrievalIndex]" = weakref.WeakValueDictionary()
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def get_or_build(self, key: str, build: Callable[[], RetrievalIndex]) -> RetrievalIndex:
+        """Return the cached index for key, building it at most once concurrently"""
+        with self._lock:
+            index = self._lookup(key)
+            if index is not None:
+                return index
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                index = self._lookup(key)
+                if index is not None:
+                    return index
+
+            index = build()
+            logger.info(f"Built retrieval index {key[:12]} ({len(index)} chunks)")
+
+            with self._lock:
+                self.builds += 1
+                self._entries[key] = index
+                self._shared[key] = index
+                self._enforce_limits()
+                self._building.pop(key, None)
+        return index
+
+    def _lookup(self, key: str):
+        index = self._entries.get(key)
+        if index is None:
+            index = self._shared.get(key)  # Evicted but still held by a session
+            if index is None:
+                return None
+            self._entries[key] = index
+        self._entries.move_to_end(key)
+        self._enforce_limits()
+        self.hits += 1
+        return index
+
+    def resident_nbytes(self) -> int:
+        """Bytes of the strongly held indexes (sentence embeddings grow them after insertion)"""
+        return sum(index.nbytes for index in self._entries.values())
+
+    def _enforce_limits(self):
+        """Drop least recently used indexes until under both bounds (the newest always stays)"""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.resident_nbytes() > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "indexes": len(self._entries),
+                "max_indexes": self.max_entries,
+                "shared_indexes": len(self._shared),
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions,
+                "storage": EMBEDDING_STORAGE,
+                "bytes": self.resident_nbytes(),
+                "max_bytes": self.max_bytes
+            }
+
+
+# ============= GLOBAL INSTANCE =============
+retrieval_index_cache = RetrievalIndexCache()
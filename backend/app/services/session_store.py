@@ -0,0 +1,387 @@
+"""
+Session Store
+Chat sessions persisted in the shared SQLite document store, so any uvicorn
+worker can serve any session and a restart resumes them:
+  - metadata and history (a ring buffer of CHAT_HISTORY_MAX_TURNS
+    exchanges) are rows in the database
+  - chunk embeddings are .npy snapshots, one per document content, that are
+    memory-mapped on load instead of re-encoded
+Each worker keeps recently used sessions resident under a byte budget and
+an idle TTL; evicted ones are reloaded from the snapshot on their next
+access.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+import numpy as np
+from app.services.retrieval_index import RetrievalIndex, retrieval_index_cache
+from app.services.quantization import QuantizedEmbeddings
+from app.services.document_store import DocumentStore, document_store
+
+logger = logging.getLogger(__name__)
+
+CHAT_SESSION_MEMORY_BYTES = int(os.getenv("CHAT_SESSION_MEMORY_BYTES", str(256 * 1024 * 1024)))
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800"))
+CHAT_SESSION_SNAPSHOT_DIR = os.getenv("CHAT_SESSION_SNAPSHOT_DIR", os.path.join("document_storage", "chat_snapshots"))
+CHAT_SESSION_RETENTION_SECONDS = int(os.getenv("CHAT_SESSION_RETENTION_SECONDS", str(7 * 24 * 3600)))
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "50"))
+
+SWEEP_INTERVAL_SECONDS = 60
+TOUCH_INTERVAL_SECONDS = 60  # How stale the persisted last_access may get
+
+
+def history_nbytes(history) -> int:
+    return sum(len(entry.get("question", "")) + len(entry.get("answer", "")) for entry in history)
+
+
+class SessionStore:
+    """
+    Dict-like store of chat sessions. A session is a dict holding
+    document_text, index (a shared RetrievalIndex), metadata,
+    conversation_history and created_at. History must be changed through
+    append_history / clear_history so other workers see it.
+    """
+
+    def __init__(
+        self,
+        store: DocumentStore = document_store,
+        memory_bytes: int = CHAT_SESSION_MEMORY_BYTES,
+        ttl_seconds: int = CHAT_SESSION_TTL_SECONDS,
+        snapshot_dir: str = CHAT_SESSION_SNAPSHOT_DIR,
+        retention_seconds: int = CHAT_SESSION_RETENTION_SECONDS,
+        history_turns: int = CHAT_HISTORY_MAX_TURNS
+    ):
+        self.store = store
+        self.memory_bytes = memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_dir = snapshot_dir
+        self.retention_seconds = retention_seconds
+        self.history_turns = history_turns
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._persisted_access: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = 0.0
+        self.evictions = 0
+        self.loads = 0
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    # ============= DICT INTERFACE =============
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.store.get_chat_session(session_id) is not None
+
+    def __len__(self) -> int:
+        return self.store.count_chat_sessions()
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Dict[str, Any]):
+        """Persist a new session (its snapshot is written once per document)"""
+        index: RetrievalIndex = session["index"]
+        now = time.time()
+        # The row goes in first: from then on no other worker treats the
+        # snapshot as unused, so it cannot be removed under this session
+        self.store.put_chat_session(
+            session_id, index.key, session["metadata"], len(session["document_text"]),
+            session["created_at"], now
+        )
+        try:
+            self._write_snapshot(index, session["document_text"])
+        except Exception:
+            self._remove_snapshots(self.store.delete_chat_sessions([session_id]))
+            raise
+        history = list(session.get("conversation_history") or [])[-self.history_turns:]
+        version = 0
+        for entry in history:
+            version = self.store.append_chat_turn(session_id, entry, self.history_turns)
+        session["conversation_history"] = deque(history, maxlen=self.history_turns)
+
+        with self._lock:
+            self._make_resident(session_id, session, version, now)
+
+    def __delitem__(self, session_id: str):
+        if not self.pop(session_id):
+            raise KeyError(session_id)
+
+    def get(self, session_id: str, default: Any = None) -> Optional[Dict[str, Any]]:
+        """Session by id, loaded from the shared store if this worker lacks it"""
+        row = self.store.get_chat_session(session_id)
+        if row is None:
+            with self._lock:
+                self._forget(session_id)  # Deleted by another worker
+            return default
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                try:
+                    session = self._load(row)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Could not load chat session {session_id}: {e}")
+                    return default
+                self.loads += 1
+            elif row["history_version"] != self._versions.get(session_id):
+                # Another worker answered or cleared since we last looked
+                session["conversation_history"] = deque(
+                    self.store.get_chat_history(session_id), maxlen=self.history_turns
+                )
+
+            now = time.time()
+            self._make_resident(session_id, session, row["history_version"], now)
+            if now - max(row["last_access"], self._persisted_access.get(session_id, 0)) > TOUCH_INTERVAL_SECONDS:
+                self.store.touch_chat_session(session_id, now)
+                self._persisted_access[session_id] = now
+            return session
+
+    def pop(self, session_id: str) -> bool:
+        """Delete a session everywhere; False if it did not exist"""
+        existed = self.store.get_chat_session(session_id) is not None
+        unused_keys = self.store.delete_chat_sessions([session_id])
+        self._remove_snapshots(unused_keys)
+        with self._lock:
+            existed = self._forget(session_id) or existed
+        return existed
+
+    # ============= HISTORY =============
+
+    def append_history(self, session_id: str, entry: Dict[str, Any]) -> bool:
+        version = self.store.append_chat_turn(session_id, entry, self.history_turns)
+        if version is None:
+            return False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if version == self._versions.get(session_id, 0) + 1:
+                    session["conversation_history"].append(entry)
+                else:
+                    session["conversation_history"] = deque(
+                        self.store.get_chat_history(session_id), maxlen=self.history_turns
+                    )
+                self._versions[session_id] = version
+        return True
+
+    def clear_history(self, session_id: str) -> bool:
+        version = self.store.clear_chat_history(session_id)
+        if version is None:
+            return False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["conversation_history"].clear()
+                self._versions[session_id] = version
+        return True
+
+    # ============= MEMORY ACCOUNTING =============
+
+    def session_nbytes(self, session: Dict[str, Any]) -> int:
+        """Approximate bytes held by one session, including its retrieval index"""
+        return (
+            len(session["document_text"])
+            + history_nbytes(session["conversation_history"])
+            + session["index"].nbytes
+        )
+
+    def resident_nbytes(self) -> int:
+        """Bytes held by resident sessions; indexes shared by sessions count once"""
+        total = 0
+        indexes = {}
+        for session in self._sessions.values():
+            total += len(session["document_text"]) + history_nbytes(session["conversation_history"])
+            indexes[id(session["index"])] = session["index"].nbytes
+        return total + sum(indexes.values())
+
+    def _make_resident(self, session_id: str, session: Dict[str, Any], version: int, now: float):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = now
+        self._versions[session_id] = version
+        self._enforce_limits(keep=session_id)
+
+    def _forget(self, session_id: str) -> bool:
+        self._last_access.pop(session_id, None)
+        self._persisted_access.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        return self._sessions.pop(session_id, None) is not None
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        """Drop idle sessions, then least recently used ones until under budget.
+        They stay persisted and reload on their next access."""
+        now = time.time()
+        for session_id in list(self._sessions):
+            if session_id != keep and now - self._last_access[session_id] > self.ttl_seconds:
+                self._forget(session_id)
+                self.evictions += 1
+
+        while len(self._sessions) > 1 and self.resident_nbytes() > self.memory_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(keep)
+                oldest = next(iter(self._sessions))
+            self._forget(oldest)
+            self.evictions += 1
+
+        if now - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+            self._last_sweep = now
+            self._sweep_expired(now)
+
+    def _sweep_expired(self, now: float):
+        """Delete sessions unused for longer than the retention period"""
+        expired = self.store.expired_chat_sessions(now - self.retention_seconds)
+        if expired:
+            self._remove_snapshots(self.store.delete_chat_sessions(expired))
+            for session_id in expired:
+                self._forget(session_id)
+            logger.info(f"Deleted {len(expired)} expired chat sessions")
+
+    # ============= SNAPSHOTS =============
+
+    def _snapshot_path(self, index_key: str, suffix: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{index_key.replace(':', '_')}.{suffix}")
+
+    @contextmanager
+    def _snapshot_lock(self):
+        """Cross-process lock serializing snapshot writes with removals"""
+        with open(os.path.join(self.snapshot_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_snapshot(self, index: RetrievalIndex, document_text: str):
+        """Chunks, text and (possibly quantized) embeddings of one document.
+        Written via temp files and renames; the .json file marks completion."""
+        with self._snapshot_lock():
+            if not os.path.exists(self._snapshot_path(index.key, "json")):
+                self._save_snapshot(index, document_text)
+
+    def _save_snapshot(self, index: RetrievalIndex, document_text: str):
+        self._save_embeddings(index.key, "", index.embeddings)
+        if index.sentence_embeddings is not None:
+            self._save_embeddings(index.key, "sentences.", index.sentence_embeddings)
+        payload = json.dumps({
+            "document_text": document_text,
+            "chunks": index.chunks,
+            "chunk_tokens": index.chunk_tokens.tolist() if index.chunk_tokens is not None else None,
+            "sentences": index.sentences,
+            "sentence_bounds": index.sentence_bounds.tolist() if index.sentence_bounds is not None else None
+        }).encode("utf-8")
+        self._write_atomic(self._snapshot_path(index.key, "json"), lambda f: f.write(payload))
+
+    def _save_embeddings(self, index_key: str, prefix: str, embeddings: QuantizedEmbeddings):
+        arrays = {f"{prefix}npy": embeddings.data}
+        if embeddings.scales is not None:
+            arrays[f"{prefix}scales.npy"] = embeddings.scales
+        for suffix, array in arrays.items():
+            self._write_atomic(self._snapshot_path(index_key, suffix), lambda f: np.save(f, array))
+
+    def _load_embeddings(self, index_key: str, prefix: str) -> Optional[QuantizedEmbeddings]:
+        """Memory-mapped embeddings from a snapshot (None if not saved)"""
+        path = self._snapshot_path(index_key, f"{prefix}npy")
+        if not os.path.exists(path):
+            return None
+        scales_path = self._snapshot_path(index_key, f"{prefix}scales.npy")
+        return QuantizedEmbeddings(
+            np.load(path, mmap_mode="r"),
+            np.load(scales_path) if os.path.exists(scales_path) else None
+        )
+
+    @staticmethod
+    def _write_atomic(path: str, write):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+
+    def _load(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild a session from its row, history and snapshot (no re-encoding)"""
+        key = row["index_key"]
+        with open(self._snapshot_path(key, "json"), encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+        def load_index() -> RetrievalIndex:
+            chunk_tokens = snapshot.get("chunk_tokens")
+            sentence_bounds = snapshot.get("sentence_bounds")
+            return RetrievalIndex(
+                key, snapshot["chunks"], self._load_embeddings(key, ""),
+                chunk_tokens=np.array(chunk_tokens, dtype=np.int32) if chunk_tokens is not None else None,
+                sentences=snapshot.get("sentences"),
+                sentence_bounds=np.array(sentence_bounds, dtype=np.int32).reshape(-1, 2) if sentence_bounds is not None else None,
+                sentence_embeddings=self._load_embeddings(key, "sentences.")
+            )
+
+        # Stateless questions or another session may already hold the index
+        index = retrieval_index_cache.get_or_build(key, load_index)
+        return {
+            "document_text": snapshot["document_text"],
+            "chunks": index.chunks,
+            "chunk_embeddings": index.embeddings,
+            "index": index,
+            "metadata": row["metadata"],
+            "conversation_history": deque(
+                self.store.get_chat_history(row["session_id"]), maxlen=self.history_turns
+            ),
+            "created_at": row["created_at"]
+        }
+
+    def _remove_snapshots(self, index_keys: List[str]):
+        """Remove snapshots of keys released by a delete, unless a session
+        created since then uses the key again (checked under the lock)"""
+        if not index_keys:
+            return
+        with self._snapshot_lock():
+            for key in index_keys:
+                if self.store.chat_index_key_in_use(key):
+                    continue
+                for suffix in ("json", "npy", "scales.npy", "sentences.npy", "sentences.scales.npy"):
+                    try:
+                        os.remove(self._snapshot_path(key, suffix))
+                    except FileNotFoundError:
+                        pass
+
+    # ============= REPORTING =============
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """One entry per persisted session with the memory it holds in this worker"""
+        with self._lock:
+            sessions = []
+            for row in self.store.list_chat_sessions():
+                resident = self._sessions.get(row["session_id"])
+                sessions.append({
+                    "session_id": row["session_id"],
+                    "document_name": row["metadata"].get("document_name", "Unknown"),
+                    "created_at": row["created_at"],
+                    "total_questions": row["turns"],
+                    "document_length": row["document_length"],
+                    "resident": resident is not None,
+                    "memory_bytes": self.session_nbytes(resident) if resident is not None else 0
+                })
+            return sessions
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "persisted_sessions": self.store.count_chat_sessions(),
+                "resident_sessions": len(self._sessions),
+                "resident_bytes": self.resident_nbytes(),
+                "memory_budget_bytes": self.memory_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "retention_seconds": self.retention_seconds,
+                "history_max_turns": self.history_turns,
+                "evictions": self.evictions,
+                "loads": self.loads
+            }
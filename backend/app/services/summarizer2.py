@@ -11,10 +11,10 @@ from typing import Dict, Optional, Any
 import torch
 import nltk
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import networkx as nx
 import numpy as np
+from app.services.text_analysis import TextAnalysis
+from app.services.embedding_service import embedding_service
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
@@ -57,9 +57,8 @@ class HybridSummarizer:
             self.doc_classifier = None
             self.label_mappings = None
         
-        # Load sentence transformer for extractive summarization
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("✅ Sentence transformer loaded")
+        # Sentence embeddings come from the shared embedding service
+        self.embedder = embedding_service
         
         # Load abstractive summarization model
         self.abs_tokenizer = AutoTokenizer.from_pretrained("google/flan-t5-base")
@@ -101,12 +100,21 @@ class HybridSummarizer:
         
         return 'unknown'
     
-    def extractive_summarize(self, text: str, num_sentences: int = 5) -> str:
+    def extractive_summarize(
+        self,
+        text: str,
+        num_sentences: int = 5,
+        analysis: Optional[TextAnalysis] = None
+    ) -> str:
         """Extract key sentences using graph-based ranking"""
-        try:
-            sentences = nltk.sent_tokenize(text)
-        except:
-            sentences = [s.strip() + '.' for s in text.split('.') if s.strip()]
+        if analysis is not None:
+            # Sentence spans were computed at ingest; only slice them
+            sentences = analysis.sentences(max_chars=len(text))
+        else:
+            try:
+                sentences = nltk.sent_tokenize(text)
+            except:
+                sentences = [s.strip() + '.' for s in text.split('.') if s.strip()]
         
         if len(sentences) <= num_sentences:
             return ' '.join(sentences)
@@ -116,8 +124,9 @@ class HybridSummarizer:
             return ' '.join(sentences[:num_sentences])
         
         # Encode sentences
-        embeddings = self.sentence_model.encode(cleaned_sentences)
-        similarity_matrix = cosine_similarity(embeddings)
+        embeddings = self.embedder.encode(cleaned_sentences)
+        # Rows are unit length, so the Gram matrix is the cosine similarity matrix
+        similarity_matrix = embeddings @ embeddings.T
         
         # PageRank on similarity graph
         nx_graph = nx.from_numpy_array(similarity_matrix)
@@ -180,7 +189,8 @@ class HybridSummarizer:
         profession: str,
         purpose: str = "overview",
         num_sentences: int = 5,
-        document_type: str = "auto"
+        document_type: str = "auto",
+        analysis: Optional[TextAnalysis] = None
     ) -> Dict[str, Any]:
         """Complete hybrid summarization pipeline"""
         
@@ -195,7 +205,7 @@ class HybridSummarizer:
         doc_type = self.classify_document(text) if document_type.lower() == "auto" else document_type.lower()
         
         # Extractive summarization
-        extractive_summary = self.extractive_summarize(text, num_sentences)
+        extractive_summary = self.extractive_summarize(text, num_sentences, analysis=analysis)
         
         if not extractive_summary.strip():
             return {"error": "Could not extract key sentences from the document."}
@@ -232,7 +242,8 @@ def summarize(
     num_sentences: int = 5,
     profession: str = "general reader",
     purpose: str = "overview",
-    document_type: str = "auto"
+    document_type: str = "auto",
+    analysis: Optional[TextAnalysis] = None
 ) -> str:
     """
     Module-level function for easy API access.
@@ -244,7 +255,8 @@ def summarize(
             profession=profession,
             purpose=purpose,
             num_sentences=num_sentences,
-            document_type=document_type
+            document_type=document_type,
+            analysis=analysis
         )
         
         if "error" in result:
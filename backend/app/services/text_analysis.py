@@ -0,0 +1,328 @@
+"""
+Text Analysis
+One analysis pass per document, computed at ingest and shared by the
+summarizer, chatbot and flashcard services: sentence spans, token counts
+and topic blocks. Everything is stored as offset arrays into the document
+text rather than lists of strings.
+"""
+
+import io
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.services.document_store import DocumentStore, document_store
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_SIZE = 32  # Analyses kept in memory
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+_TOPIC_PATTERN = re.compile(r"^\d+\.?\s+[A-Z][\w\s\-]{2,}")
+
+# Punkt sentence tokenizer, loaded once per process (see load_sentence_tokenizer)
+_sentence_tokenizer = None
+_sentence_tokenizer_loaded = False
+_sentence_tokenizer_lock = threading.Lock()
+
+
+def load_sentence_tokenizer(download: bool = False):
+    """
+    Load punkt once, fetching the NLTK data first if download is set (done
+    at app startup, never on the ingest path). Every caller waits for the
+    load, so no document is split with the regex fallback by accident.
+    """
+    global _sentence_tokenizer, _sentence_tokenizer_loaded
+    with _sentence_tokenizer_lock:
+        if _sentence_tokenizer_loaded:
+            return _sentence_tokenizer
+        try:
+            import nltk
+            try:
+                _sentence_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+            except LookupError:
+                if not download:
+                    raise
+                nltk.download('punkt', quiet=True)
+                _sentence_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+        except Exception as e:
+            logger.warning(f"⚠️ Punkt tokenizer not available, using regex sentence split: {e}")
+            _sentence_tokenizer = None
+        _sentence_tokenizer_loaded = True
+        return _sentence_tokenizer
+
+
+def get_sentence_tokenizer():
+    """Punkt tokenizer if NLTK data is available, otherwise None (regex fallback)"""
+    if _sentence_tokenizer_loaded:
+        return _sentence_tokenizer
+    return load_sentence_tokenizer()
+
+
+def find_sentence_spans(text: str) -> np.ndarray:
+    """(N, 2) int32 array of [start, end) sentence offsets"""
+    tokenizer = get_sentence_tokenizer()
+    if tokenizer is not None:
+        spans = list(tokenizer.span_tokenize(text))
+    else:
+        spans = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+
+    spans = [(start, end) for start, end in spans if text[start:end].strip()]
+    return np.array(spans, dtype=np.int32).reshape(-1, 2)
+
+
+def count_sentence_tokens(text: str, sentence_spans: np.ndarray) -> np.ndarray:
+    """Whitespace token count per sentence"""
+    return np.array(
+        [len(text[start:end].split()) for start, end in sentence_spans],
+        dtype=np.int32
+    )
+
+
+def find_topic_blocks(text: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Topic blocks as detected by qna_generator.split_into_topics: a numbered
+    title or an ALL CAPS line starts a new topic.
+    Returns (titles, (T, 2) int32 body spans).
+    """
+    titles = []
+    spans = []
+    current_topic = "Introduction"
+    body_start = 0
+    has_lines = False
+    position = 0
+
+    for line in text.splitlines(keepends=True):
+        content = line.rstrip('\r\n')
+        if _TOPIC_PATTERN.match(content) or content.isupper():
+            if has_lines:
+                titles.append(current_topic)
+                spans.append((body_start, position))
+            current_topic = content.strip()
+            body_start = position + len(line)
+            has_lines = False
+        else:
+            has_lines = True
+        position += len(line)
+
+    if has_lines:
+        titles.append(current_topic)
+        spans.append((body_start, position))
+
+    return titles, np.array(spans, dtype=np.int32).reshape(-1, 2)
+
+
+class TextAnalysis:
+    """Offset-array view over one document's text"""
+
+    def __init__(
+        self,
+        text: str,
+        sentence_spans: np.ndarray,
+        sentence_tokens: np.ndarray,
+        topic_titles: List[str],
+        topic_spans: np.ndarray
+    ):
+        self.text = text
+        self.sentence_spans = sentence_spans
+        self.sentence_tokens = sentence_tokens
+        self.topic_titles = topic_titles
+        self.topic_spans = topic_spans
+
+    # ============= SENTENCES =============
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_spans)
+
+    def sentence(self, index: int) -> str:
+        start, end = self.sentence_spans[index]
+        return self.text[start:end]
+
+    def sentences(self, max_chars: Optional[int] = None) -> List[str]:
+        """Sentence strings, optionally only those ending within max_chars"""
+        spans = self.sentence_spans
+        if max_chars is not None:
+            spans = spans[spans[:, 1] <= max_chars]
+        return [self.text[start:end] for start, end in spans]
+
+    def sentence_range(self, start: int, end: int) -> Tuple[int, int]:
+        """Indices [first, last) of sentences overlapping char span [start, end)"""
+        first = int(np.searchsorted(self.sentence_spans[:, 1], start, side='right'))
+        last = int(np.searchsorted(self.sentence_spans[:, 0], end, side='left'))
+        return first, max(first, last)
+
+    def sentences_in_span(self, start: int, end: int, limit: Optional[int] = None) -> List[str]:
+        """Sentences overlapping [start, end), clipped to the span"""
+        first, last = self.sentence_range(start, end)
+        if limit is not None:
+            last = min(last, first + limit)
+        return [
+            self.text[max(s, start):min(e, end)]
+            for s, e in self.sentence_spans[first:last].tolist()
+        ]
+
+    # ============= TOPICS =============
+
+    def topic_blocks(self) -> List[Tuple[str, str, Tuple[int, int]]]:
+        """(title, text, (start, end)) per topic, text normalized line by line"""
+        blocks = []
+        for title, (start, end) in zip(self.topic_titles, self.topic_spans):
+            lines = self.text[start:end].splitlines()
+            blocks.append((title, "\n".join(line.strip() for line in lines).strip(), (int(start), int(end))))
+        return blocks
+
+    def topics(self) -> Dict[str, str]:
+        """Same shape as qna_generator.split_into_topics"""
+        return {title: text for title, text, _ in self.topic_blocks()}
+
+    # ============= WINDOWS =============
+
+    def slice(self, start: int, end: int) -> "TextAnalysis":
+        """Analysis of text[start:end] with offsets rebased (sentences must lie wholly inside)"""
+        first = int(np.searchsorted(self.sentence_spans[:, 0], start, side='left'))
+        last = int(np.searchsorted(self.sentence_spans[:, 1], end, side='right'))
+        last = max(first, last)
+        topic_spans = np.clip(self.topic_spans, start, end)
+        keep = topic_spans[:, 1] > topic_spans[:, 0]
+        return TextAnalysis(
+            text=self.text[start:end],
+            sentence_spans=self.sentence_spans[first:last] - start,
+            sentence_tokens=self.sentence_tokens[first:last],
+            topic_titles=[title for title, kept in zip(self.topic_titles, keep.tolist()) if kept],
+            topic_spans=(topic_spans[keep] - start).astype(np.int32)
+        )
+
+    def window(self, max_chars: int, focus_topics: Optional[List[str]] = None) -> "TextAnalysis":
+        """
+        At most max_chars of the document, cut on a topic or sentence
+        boundary so the precomputed offsets stay usable. Long documents
+        start the window at the first topic matching focus_topics.
+        """
+        if len(self.text) <= max_chars:
+            return self
+
+        start = 0
+        if focus_topics:
+            wanted = [topic.lower() for topic in focus_topics]
+            for title, (topic_start, _) in zip(self.topic_titles, self.topic_spans.tolist()):
+                if any(topic in title.lower() for topic in wanted):
+                    start = topic_start
+                    break
+        limit = start + max_chars
+
+        # End on a topic boundary if that keeps at least half the window
+        topic_ends = self.topic_spans[:, 1]
+        topic_ends = topic_ends[(topic_ends > start) & (topic_ends <= limit)]
+        sentence_ends = self.sentence_spans[:, 1]
+        sentence_ends = sentence_ends[(sentence_ends > start) & (sentence_ends <= limit)]
+        if len(topic_ends) and topic_ends.max() - start >= max_chars // 2:
+            end = int(topic_ends.max())
+        elif len(sentence_ends):
+            end = int(sentence_ends.max())
+        else:
+            end = min(limit, len(self.text))
+        return self.slice(start, end)
+
+    # ============= SERIALIZATION =============
+
+    def to_bytes(self) -> bytes:
+        """Compact binary form (the text itself is stored separately)"""
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            sentence_spans=self.sentence_spans,
+            sentence_tokens=self.sentence_tokens,
+            topic_spans=self.topic_spans,
+            topic_titles=np.frombuffer(json.dumps(self.topic_titles).encode("utf-8"), dtype=np.uint8)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, text: str, data: bytes) -> "TextAnalysis":
+        arrays = np.load(io.BytesIO(data), allow_pickle=False)
+        return cls(
+            text=text,
+            sentence_spans=arrays["sentence_spans"],
+            sentence_tokens=arrays["sentence_tokens"],
+            topic_titles=json.loads(arrays["topic_titles"].tobytes().decode("utf-8")),
+            topic_spans=arrays["topic_spans"]
+        )
+
+
+def analyze_text(text: str) -> TextAnalysis:
+    """Run the full analysis pass over a document"""
+    sentence_spans = find_sentence_spans(text)
+    sentence_tokens = count_sentence_tokens(text, sentence_spans)
+    topic_titles, topic_spans = find_topic_blocks(text)
+    return TextAnalysis(text, sentence_spans, sentence_tokens, topic_titles, topic_spans)
+
+
+class AnalysisCache:
+    """Loads stored analyses by document_id, with a small in-memory LRU"""
+
+    def __init__(self, store: DocumentStore = document_store, max_entries: int = ANALYSIS_CACHE_SIZE):
+        self.store = store
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], TextAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, content_hash: str, file_type: str, analysis: TextAnalysis):
+        self.store.put_analysis(content_hash, file_type, analysis.to_bytes())
+        self._remember((content_hash, file_type), analysis)
+
+    def _remember(self, key: Tuple[str, str], analysis: TextAnalysis):
+        with self._lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, content_hash: str, file_type: str):
+        """Drop a released extraction's analysis from memory"""
+        with self._lock:
+            self._entries.pop((content_hash, file_type), None)
+
+    def get_for_document(self, document_id: str) -> Optional[TextAnalysis]:
+        """Analysis of an ingested document; computed and stored on first
+        use for extractions ingested before analyses existed."""
+        doc = self.store.get_document(document_id)
+        if doc is None:
+            return None
+
+        key = (doc["content_hash"], doc["file_type"])
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                return analysis
+
+        text = self.store.read_extraction_text(*key)
+        if text is None:
+            return None
+
+        data = self.store.get_analysis(*key)
+        if data is not None:
+            analysis = TextAnalysis.from_bytes(text, data)
+            self._remember(key, analysis)
+        else:
+            analysis = analyze_text(text)
+            self.save(*key, analysis)
+        return analysis
+
+
+# ============= GLOBAL INSTANCE =============
+analysis_cache = AnalysisCache()
+
+
+def get_document_analysis(document_id: str) -> Optional[TextAnalysis]:
+    """Shared analysis artifact for an ingested document"""
+    return analysis_cache.get_for_document(document_id)
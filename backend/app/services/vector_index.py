@@ -0,0 +1,442 @@
+"""
+Vector Index
+Corpus-wide approximate nearest-neighbour index over the chunk embeddings
+of every ingested document (IVF-flat, pure numpy).
+
+Layout in VECTOR_INDEX_DIR:
+  meta.json     embedding dimension and compaction generation
+  vectors.f32   append-only float32 rows (one per chunk)
+  rows.log      append-only "document_id chunk_index start end" per row
+  deleted.log   append-only deleted document ids (tombstones)
+  ivf.npz       trained centroids + list assignment of the rows seen at training
+
+All writers append under an exclusive flock and every reader picks up new
+rows/tombstones from the logs (under a shared flock), so all uvicorn workers
+serve the same index. Once VECTOR_INDEX_COMPACT_RATIO of the rows belong to
+deleted documents the files are rewritten without them and the generation
+is bumped, which makes every reader reload from scratch.
+Below VECTOR_INDEX_TRAIN_MIN vectors the index is an exact flat scan.
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+import numpy as np
+from app.services.retrieval_index import top_k_similar
+from app.services.embedding_service import embedding_service
+from app.services.text_analysis import get_document_analysis
+from app.services.chunker import chunk_by_tokens, locate_sentences
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join("document_storage", "vector_index"))
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+VECTOR_INDEX_TRAIN_MIN = int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "4096"))  # Flat scan below this
+VECTOR_INDEX_COMPACT_RATIO = float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", "0.25"))  # Deleted share that triggers compaction
+VECTOR_INDEX_RETRAIN_GROWTH = 4  # Retrain once the index is this many times its trained size
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of normalized vectors"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty lists keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+def assign_to_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid of each row, in blocks to bound memory"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class VectorIndex:
+    """IVF-flat index of (document_id, chunk) embeddings persisted as append-only files"""
+
+    def __init__(
+        self,
+        index_dir: str = VECTOR_INDEX_DIR,
+        nprobe: int = VECTOR_INDEX_NPROBE,
+        train_min: int = VECTOR_INDEX_TRAIN_MIN
+    ):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self.train_min = train_min
+        os.makedirs(index_dir, exist_ok=True)
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.rows_path = os.path.join(index_dir, "rows.log")
+        self.deleted_path = os.path.join(index_dir, "deleted.log")
+        self.ivf_path = os.path.join(index_dir, "ivf.npz")
+        self.lock_path = os.path.join(index_dir, "index.lock")
+
+        self.dimension: Optional[int] = None
+        self._generation = 0
+        self._meta_mtime = None
+        self._reset_state()
+
+        self._lock = threading.RLock()
+        with self._lock:
+            self._sync()
+        logger.info(f"✅ Vector index ready ({self.alive_count} vectors)")
+
+    def _reset_state(self):
+        """Forget every row, tombstone and list assignment read so far"""
+        self._vectors: Optional[np.memmap] = None
+        self._row_count = 0
+        self._row_documents: List[str] = []
+        self._row_chunks = np.zeros((0, 3), dtype=np.int64)  # chunk_index, start, end
+        self._alive = np.zeros(0, dtype=bool)
+        self._document_rows: Dict[str, List[int]] = {}
+        self._deleted_documents = set()
+        self._rows_offset = 0
+        self._deleted_offset = 0
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_rows = 0
+        self._ivf_mtime = None
+        self._list_order: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+
+    # ============= FILE SYNC =============
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Lock across processes: exclusive for appends, training and compaction, shared for reads"""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stored_vector_rows(self) -> int:
+        if self.dimension is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dimension * 4)
+
+    @staticmethod
+    def _read_new_lines(path: str, offset: int) -> tuple:
+        """Complete lines appended after `offset`; returns (lines, new_offset)"""
+        if not os.path.exists(path) or os.path.getsize(path) <= offset:
+            return [], offset
+        lines = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written entry
+                offset += len(line)
+                lines.append(line.decode("utf-8").rstrip("\n"))
+        return lines, offset
+
+    def _write_meta(self):
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dimension": self.dimension, "generation": self._generation}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _sync(self):
+        """_refresh under a shared file lock, so a compaction is never seen half done"""
+        with self._file_lock(shared=True):
+            self._refresh()
+
+    def _refresh(self):
+        """Load rows, tombstones and IVF training written since the last call"""
+        if not os.path.exists(self.meta_path):
+            return
+        mtime = os.stat(self.meta_path).st_mtime_ns
+        if mtime != self._meta_mtime:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get("generation", 0) != self._generation:
+                self._reset_state()  # Compacted by another worker
+            self.dimension = meta["dimension"]
+            self._generation = meta.get("generation", 0)
+            self._meta_mtime = mtime
+
+        lines, self._rows_offset = self._read_new_lines(self.rows_path, self._rows_offset)
+        if lines:
+            first_row = self._row_count
+            chunks = np.zeros((len(lines), 3), dtype=np.int64)
+            for i, line in enumerate(lines):
+                document_id, chunk_index, start, end = line.split("\t")
+                self._row_documents.append(document_id)
+                self._document_rows.setdefault(document_id, []).append(first_row + i)
+                chunks[i] = (int(chunk_index), int(start), int(end))
+            self._row_chunks = np.concatenate([self._row_chunks, chunks])
+            self._alive = np.concatenate([self._alive, np.ones(len(lines), dtype=bool)])
+            self._row_count += len(lines)
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(self._row_count, self.dimension)
+            )
+            for document_id in self._deleted_documents.intersection(set(self._row_documents[first_row:])):
+                self._alive[self._document_rows[document_id]] = False
+
+        deleted, self._deleted_offset = self._read_new_lines(self.deleted_path, self._deleted_offset)
+        for document_id in deleted:
+            self._deleted_documents.add(document_id)
+            rows = self._document_rows.get(document_id)
+            if rows:
+                self._alive[rows] = False
+
+        if os.path.exists(self.ivf_path):
+            mtime = os.stat(self.ivf_path).st_mtime_ns
+            if mtime != self._ivf_mtime:
+                with np.load(self.ivf_path) as ivf:
+                    self._centroids = ivf["centroids"]
+                    self._assignments = ivf["assignments"]
+                self._trained_rows = len(self._assignments)
+                self._ivf_mtime = mtime
+                self._list_order = None
+
+        # Rows added after training go to their nearest existing list
+        if self._centroids is not None and len(self._assignments) < self._row_count:
+            new_rows = self._vectors[len(self._assignments):self._row_count]
+            self._assignments = np.concatenate([self._assignments, assign_to_lists(new_rows, self._centroids)])
+            self._list_order = None
+
+    # ============= MUTATIONS =============
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            self._sync()
+            return document_id in self._document_rows and document_id not in self._deleted_documents
+
+    def _truncate_to_rows(self):
+        """Cut vectors.f32 and rows.log back to the rows that are fully logged (call under the file lock)"""
+        if os.path.exists(self.rows_path) and os.path.getsize(self.rows_path) > self._rows_offset:
+            os.truncate(self.rows_path, self._rows_offset)
+        vector_bytes = self._row_count * self.dimension * 4
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > vector_bytes:
+            logger.warning(
+                f"⚠️ Dropping {os.path.getsize(self.vectors_path) - vector_bytes} orphan bytes from {self.vectors_path}"
+            )
+            os.truncate(self.vectors_path, vector_bytes)
+
+    def add_document(self, document_id: str, chunk_spans: np.ndarray, embeddings: np.ndarray) -> int:
+        """Append one document's normalized chunk embeddings (and char spans); returns rows added"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not len(embeddings):
+            return 0
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dimension is None:
+                self.dimension = embeddings.shape[1]
+                self._write_meta()
+            elif embeddings.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-d embeddings, got {embeddings.shape[1]}")
+
+            # Re-checked under the lock: a reindex and an ingest may race
+            if document_id in self._document_rows and document_id not in self._deleted_documents:
+                return 0
+
+            # Rows map to vectors by position, so drop anything a failed
+            # writer left past the last complete log line before appending
+            self._truncate_to_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.write(embeddings.tobytes())
+            with open(self.rows_path, "ab") as f:
+                f.write("".join(
+                    f"{document_id}\t{i}\t{int(start)}\t{int(end)}\n"
+                    for i, (start, end) in enumerate(chunk_spans)
+                ).encode("utf-8"))
+
+            self._refresh()
+            self._maybe_train()
+        return len(embeddings)
+
+    def delete_document(self, document_id: str) -> bool:
+        with self._lock, self._file_lock():
+            self._refresh()
+            if document_id not in self._document_rows or document_id in self._deleted_documents:
+                return False
+            with open(self.deleted_path, "ab") as f:
+                f.write(f"{document_id}\n".encode("utf-8"))
+            self._refresh()
+            if self._row_count - self.alive_count > self._row_count * VECTOR_INDEX_COMPACT_RATIO:
+                self._compact()
+        return True
+
+    def compact(self) -> int:
+        """Rewrite the index without rows of deleted documents; returns rows dropped"""
+        with self._lock, self._file_lock():
+            self._refresh()
+            return self._compact()
+
+    def _compact(self) -> int:
+        """Compaction body; the caller holds the exclusive file lock"""
+        dropped = self._row_count - self.alive_count
+        if not dropped:
+            return 0
+
+        started = time.perf_counter()
+        self._truncate_to_rows()
+        keep = np.flatnonzero(self._alive)
+        suffix = f".{os.getpid()}.tmp"
+        with open(self.vectors_path + suffix, "wb") as f:
+            for start in range(0, len(keep), ASSIGN_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(self._vectors[keep[start:start + ASSIGN_BLOCK_ROWS]]).tobytes())
+        with open(self.rows_path + suffix, "wb") as f:
+            f.write("".join(
+                f"{self._row_documents[row]}\t{chunk_index}\t{start}\t{end}\n"
+                for row, (chunk_index, start, end) in zip(keep.tolist(), self._row_chunks[keep].tolist())
+            ).encode("utf-8"))
+        if self._centroids is not None:
+            ivf_tmp_path = f"{self.ivf_path}{suffix}.npz"
+            np.savez(ivf_tmp_path, centroids=self._centroids, assignments=self._assignments[keep])
+            os.replace(ivf_tmp_path, self.ivf_path)
+
+        os.replace(self.vectors_path + suffix, self.vectors_path)
+        os.replace(self.rows_path + suffix, self.rows_path)
+        open(self.deleted_path, "wb").close()
+        # Bumping the generation last tells every reader to reload
+        self._generation += 1
+        self._write_meta()
+        self._reset_state()
+        self._refresh()
+        logger.info(
+            f"✅ Compacted vector index: dropped {dropped} deleted rows, kept {len(keep)} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return dropped
+
+    def _maybe_train(self):
+        """(Re)train the coarse quantizer when the index has grown enough"""
+        alive = self.alive_count
+        if alive < self.train_min:
+            return
+        if self._centroids is not None and self._row_count < self._trained_rows * VECTOR_INDEX_RETRAIN_GROWTH:
+            return
+
+        started = time.perf_counter()
+        alive_rows = np.flatnonzero(self._alive)
+        nlist = max(1, min(int(4 * np.sqrt(alive)), alive // 39))
+        centroids = train_centroids(self._vectors[alive_rows], nlist)
+        assignments = assign_to_lists(self._vectors, centroids)
+
+        tmp_path = f"{self.ivf_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, assignments=assignments)
+        os.replace(tmp_path, self.ivf_path)
+        self._refresh()
+        logger.info(
+            f"✅ Trained IVF index: {nlist} lists over {alive} vectors "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    # ============= SEARCH =============
+
+    @property
+    def alive_count(self) -> int:
+        return int(self._alive.sum())
+
+    def _lists(self) -> tuple:
+        """Rows grouped by list: (row order, per-list start offsets)"""
+        if self._list_order is None:
+            order = np.argsort(self._assignments, kind="stable")
+            counts = np.bincount(self._assignments, minlength=len(self._centroids))
+            self._list_order = order
+            self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self._list_order, self._list_offsets
+
+    def search(self, query: np.ndarray, top_k: int = 10, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top chunks across all documents for one normalized query vector"""
+        with self._lock:
+            self._sync()
+            if not self._row_count:
+                return []
+            vectors, alive = self._vectors, self._alive
+
+            if self._centroids is None:
+                # Exact flat scan
+                candidates = np.flatnonzero(alive)
+            else:
+                order, offsets = self._lists()
+                probes = min(nprobe or self.nprobe, len(self._centroids))
+                probe_lists, _ = top_k_similar(self._centroids, query, probes)
+                candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe_lists[0]])
+                candidates = np.sort(candidates[alive[candidates]])
+
+            row_documents = self._row_documents
+            row_chunks = self._row_chunks
+
+        if not len(candidates):
+            return []
+        best, scores = top_k_similar(vectors[candidates], query, top_k)
+        results = []
+        for position, score in zip(best[0], scores[0]):
+            row = candidates[position]
+            chunk_index, start, end = row_chunks[row]
+            results.append({
+                "document_id": row_documents[row],
+                "chunk_index": int(chunk_index),
+                "start": int(start),
+                "end": int(end),
+                "score": float(score)
+            })
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            return {
+                "enabled": VECTOR_INDEX_ENABLED,
+                "dimension": self.dimension,
+                "vectors": self.alive_count,
+                "stored_rows": self._row_count,
+                "deleted_rows": self._row_count - self.alive_count,
+                "generation": self._generation,
+                "documents": len(set(self._document_rows) - self._deleted_documents),
+                "trained": self._centroids is not None,
+                "lists": len(self._centroids) if self._centroids is not None else 0,
+                "nprobe": self.nprobe,
+                "disk_bytes": self._stored_vector_rows() * (self.dimension or 0) * 4
+            }
+
+
+# ============= GLOBAL INSTANCE =============
+vector_index = VectorIndex()
+
+
+def index_document(document_id: str) -> int:
+    """Embed an ingested document's chunks and add them to the corpus index"""
+    # Cheap early skip; add_document re-checks under the file lock
+    if vector_index.has_document(document_id):
+        return 0
+    analysis = get_document_analysis(document_id)
+    if analysis is None:
+        return 0
+    # Token-bounded like chat chunks, so nothing is truncated at encode time
+    chunks, _, sentences, bounds = chunk_by_tokens(
+        analysis.text, embedding_service.count_tokens, embedding_service.max_tokens,
+        overlap_tokens=0, sentences=analysis.sentences()
+    )
+    if not chunks:
+        return 0
+    sentence_spans = locate_sentences(analysis.text, sentences)
+    chunk_spans = np.stack([sentence_spans[bounds[:, 0], 0], sentence_spans[bounds[:, 1] - 1, 1]], axis=1)
+    return vector_index.add_document(document_id, chunk_spans, embedding_service.encode(chunks))
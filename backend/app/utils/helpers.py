@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Dict, Any, Optional, Tuple
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# Upload limits
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # 10MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Boundaries, part headers and small form fields
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload passes the size limit while it is being spooled"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File too large. Maximum size is {max_bytes / (1024 * 1024):g}MB.")
+
+
+def _hash_and_write(digest, out, chunk: bytes):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def spool_upload(
+    upload: UploadFile,
+    directory: str,
+    suffix: str = "",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """
+    Copy an upload to a temp file in `directory` chunk by chunk, computing
+    the SHA-256 and size on the way; hashing and disk writes run in the
+    threadpool so the event loop never blocks on them.
+    Starlette has already received the whole multipart body (spooled to its
+    own temp file) when the handler runs, so this only bounds memory:
+    oversized requests are turned away before parsing by
+    UploadSizeLimitMiddleware, and the size check here is the backstop for
+    bodies sent without a Content-Length.
+    Returns {"path", "size", "sha256"}; the caller owns (and removes) the file.
+    """
+    # Reject before copying when the multipart parser already knows the size
+    known_size = getattr(upload, "size", None)
+    if known_size is not None and known_size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                await run_in_threadpool(_hash_and_write, digest, out, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return {"path": path, "size": size, "sha256": digest.hexdigest()}
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that answers 413 to multipart requests whose declared
+    Content-Length exceeds the upload limit, before the body is read.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope.get("headers") or [])
+            content_type = headers.get(b"content-type", b"")
+            content_length = headers.get(b"content-length", b"")
+            if (
+                content_type.startswith(b"multipart/form-data")
+                and content_length.isdigit()
+                and int(content_length) > self.max_bytes + MULTIPART_OVERHEAD_BYTES
+            ):
+                body = json.dumps({"detail": str(UploadTooLargeError(self.max_bytes))}).encode("utf-8")
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode("ascii")),
+                        (b"connection", b"close")
+                    ]
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range HTTP Range header ("bytes=start-end", "bytes=start-"
+    or "bytes=-suffix") against a body of `size` bytes.
+    Returns an inclusive (start, end) pair, or None if unsatisfiable
+    (always for an empty body, which has no byte to point at).
+    """
+    if size <= 0:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, _, end_str = spec.strip().partition("-")
+    try:
+        if not start_str:
+            suffix = int(end_str)
+            if suffix <= 0:
+                return None
+            return max(0, size - suffix), size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,90 @@
+"""
+Benchmark the registered PDF text backends.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pdf_backends.py [file.pdf ...] [--repeat N]
+
+Defaults to the bundled sample documents. For every file and backend it
+reports wall time, pages/sec, how many pages fell back to pdfplumber and
+how closely the text matches the pdfplumber baseline.
+"""
+
+import os
+import sys
+import time
+import argparse
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.document_parser import PDF_BACKENDS, extract_pdf_pages  # noqa: E402
+
+SAMPLE_DOCS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "frontend", "assets", "sample_docs"
+)
+
+
+def default_files():
+    if not os.path.isdir(SAMPLE_DOCS_DIR):
+        return []
+    return [
+        os.path.join(SAMPLE_DOCS_DIR, name)
+        for name in sorted(os.listdir(SAMPLE_DOCS_DIR))
+        if name.lower().endswith(".pdf")
+    ]
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Word-level similarity ratio between two extractions"""
+    return SequenceMatcher(None, a.split(), b.split(), autojunk=False).ratio()
+
+
+def bench_file(path: str, repeat: int):
+    print(f"\n{os.path.basename(path)}")
+    print(f"{'backend':<12}{'seconds':>10}{'pages/s':>10}{'fallback':>10}{'chars':>10}{'match':>8}")
+
+    baseline = None
+    for backend in ["pdfplumber"] + sorted(b for b in PDF_BACKENDS if b != "pdfplumber"):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = extract_pdf_pages(path, parallel=False, backend=backend)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        text = "\n".join(page["text"] for page in result["pages"])
+        if baseline is None:
+            baseline = text
+        pages_per_sec = result["page_count"] / best if best > 0 else 0.0
+
+        print(
+            f"{backend:<12}{best:>10.3f}{pages_per_sec:>10.1f}"
+            f"{result['fallback_pages']:>10}{len(text):>10}"
+            f"{text_similarity(baseline, text):>8.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF text backends")
+    parser.add_argument("files", nargs="*", help="PDF files (default: bundled sample docs)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend; best time is reported")
+    args = parser.parse_args()
+
+    files = args.files or default_files()
+    if not files:
+        print("No PDF files to benchmark.")
+        return
+
+    print(f"Backends: {', '.join(sorted(PDF_BACKENDS))}")
+    for path in files:
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            print(f"\nSkipping {path}: missing or empty")
+            continue
+        try:
+            bench_file(path, args.repeat)
+        except Exception as e:
+            print(f"\nSkipping {path}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark quantized embedding storage (float16, int8) against float32 for
+chat retrieval.
+
+Usage (from the backend directory):
+    python benchmarks/bench_quantization.py [--chunks N] [--dim D] [--queries Q] [--top-k K]
+    python benchmarks/bench_quantization.py --document path/to/document.txt
+
+With --document, the text is chunked exactly like a chat session and
+embedded with the configured model; questions are sentences sampled from
+the document. Otherwise synthetic clustered unit vectors stand in for
+chunk embeddings. Reports embedding bytes, recall@k against float32 and
+p50/p95 search latency per storage mode.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.retrieval_index import RetrievalIndex  # noqa: E402
+from app.services.quantization import STORAGE_MODES  # noqa: E402
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def document_workload(path: str, queries: int) -> tuple:
+    """Chunk embeddings and question embeddings for a real document"""
+    from app.services.chatbot import document_chatbot
+    from app.services.embedding_service import embedding_service
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    chunks = document_chatbot.chunk_document(text)
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', text) if len(s.split()) >= 5]
+    rng = np.random.default_rng(1)
+    questions = [sentences[i] for i in rng.choice(len(sentences), min(queries, len(sentences)), replace=False)]
+    return embedding_service.encode(chunks), embedding_service.encode(questions)
+
+
+def synthetic_workload(chunks: int, dim: int, queries: int) -> tuple:
+    vectors = make_vectors(chunks, dim, clusters=max(4, chunks // 50))
+    rng = np.random.default_rng(1)
+    picked = vectors[rng.choice(len(vectors), min(queries, len(vectors)), replace=False)]
+    picked = picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(dim)
+    return vectors, picked / np.linalg.norm(picked, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", help="Text file to chunk and embed (needs the embedding model)")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.document:
+        embeddings, queries = document_workload(args.document, args.queries)
+    else:
+        embeddings, queries = synthetic_workload(args.chunks, args.dim, args.queries)
+    chunks = [""] * len(embeddings)
+    print(f"{len(embeddings)} chunks x {embeddings.shape[1]} dims, {len(queries)} queries, top_k={args.top_k}")
+
+    exact = None
+    baseline_bytes = None
+    print(f"\n{'storage':<10}{'bytes':>12}{'saved':>8}{'recall@' + str(args.top_k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in STORAGE_MODES:
+        index = RetrievalIndex(mode, chunks, embeddings, storage=mode)
+        found = []
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            best, _ = index.search(query, args.top_k)
+            timings.append(time.perf_counter() - start)
+            found.append(set(best[0].tolist()))
+
+        if exact is None:
+            exact, baseline_bytes = found, index.embeddings.nbytes
+        recall = sum(len(f & e) for f, e in zip(found, exact)) / sum(len(e) for e in exact)
+        saved = 1 - index.embeddings.nbytes / baseline_bytes
+        ms = np.array(timings) * 1000
+        print(
+            f"{mode:<10}{index.embeddings.nbytes:>12,}{saved:>8.0%}{recall:>10.3f}"
+            f"{np.percentile(ms, 50):>10.3f}{np.percentile(ms, 95):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
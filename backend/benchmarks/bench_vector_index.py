@@ -0,0 +1,99 @@
+"""
+Benchmark the corpus vector index (IVF-flat) against brute-force search.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_index.py [--vectors N] [--dim D] [--queries Q] [--top-k K]
+
+Builds an index over synthetic clustered unit vectors (embeddings of real
+text cluster by topic) in a temporary directory, then reports recall@k and
+p50/p95 latency for several nprobe settings next to an exact numpy scan.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_index import VectorIndex  # noqa: E402
+from app.services.retrieval_index import top_k_similar  # noqa: E402
+
+DOCUMENT_CHUNKS = 100  # Vectors added per add_document call
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentiles(timings: list) -> tuple:
+    ms = np.array(timings) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dim, clusters=max(8, args.vectors // 500))
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = VectorIndex(index_dir=index_dir, train_min=min(4096, args.vectors))
+        start = time.perf_counter()
+        for first in range(0, len(vectors), DOCUMENT_CHUNKS):
+            block = vectors[first:first + DOCUMENT_CHUNKS]
+            spans = np.stack([np.arange(len(block)), np.arange(len(block)) + 1], axis=1)
+            index.add_document(f"doc-{first}", spans, block)
+        build_seconds = time.perf_counter() - start
+        stats = index.get_stats()
+        print(
+            f"Indexed {stats['vectors']} x {args.dim} vectors in {build_seconds:.2f}s "
+            f"({stats['lists']} lists, trained={stats['trained']})"
+        )
+
+        # Exact baseline
+        exact = []
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            best, _ = top_k_similar(vectors, query, args.top_k)
+            timings.append(time.perf_counter() - start)
+            exact.append(set(best[0].tolist()))
+        p50, p95 = percentiles(timings)
+
+        print(f"\n{'method':<16}{'recall@' + str(args.top_k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'brute force':<16}{1.0:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+
+        for nprobe in (1, 4, 8, 16, 32):
+            if stats["trained"] and nprobe > stats["lists"]:
+                break
+            hits = 0
+            timings = []
+            for query, truth in zip(queries, exact):
+                start = time.perf_counter()
+                results = index.search(query, top_k=args.top_k, nprobe=nprobe)
+                timings.append(time.perf_counter() - start)
+                found = {int(r["document_id"][4:]) + r["chunk_index"] for r in results}
+                hits += len(found & truth)
+            p50, p95 = percentiles(timings)
+            recall = hits / (len(queries) * args.top_k)
+            print(f"{'ivf nprobe=' + str(nprobe):<16}{recall:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+            if not stats["trained"]:
+                break  # Flat index: nprobe has no effect
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,15 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from fastapi.concurrency import run_in_threadpool
+from app.utils.helpers import UploadSizeLimitMiddleware
+from app.services.text_analysis import load_sentence_tokenizer
+
 app = FastAPI(title="IntelliDoc API")
 
+# Added first so CORS (added last, outermost) still decorates its 413s
+app.add_middleware(UploadSizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -14,11 +21,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from app.api.endpoints import documents, flashcards, summarize
+from app.api.endpoints import documents, flashcards, summarize, search, chat
 
 app.include_router(documents.router, prefix="/api", tags=["Documents"])
 app.include_router(flashcards.router, prefix="/api", tags=["Flashcards"])
 app.include_router(summarize.router, prefix="/api", tags=["Summarize"])
+app.include_router(search.router, prefix="/api", tags=["Search"])
+app.include_router(chat.router, prefix="/api", tags=["Chat"])
+
+@app.on_event("startup")
+async def load_sentence_tokenizer_data():
+    """Fetch punkt before serving, so ingest jobs never download it"""
+    await run_in_threadpool(load_sentence_tokenizer, True)
 
 @app.get("/")
 def root():
@@ -0,0 +1,71 @@
+"""
+Shared test setup.
+
+Run from the backend directory:
+    python -m pytest -q
+
+The services create their singletons (and storage directories) on import,
+so every storage path is pointed at a throwaway directory before any app
+module is imported.
+"""
+
+import os
+import sys
+import zlib
+import atexit
+import shutil
+import tempfile
+
+STORAGE_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+atexit.register(shutil.rmtree, STORAGE_DIR, ignore_errors=True)
+
+os.environ.setdefault("DOCUMENT_DB_PATH", os.path.join(STORAGE_DIR, "documents.db"))
+os.environ.setdefault("TEXT_CACHE_DIR", os.path.join(STORAGE_DIR, "text_cache"))
+os.environ.setdefault("VECTOR_INDEX_DIR", os.path.join(STORAGE_DIR, "vector_index"))
+os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(STORAGE_DIR, "embedding_cache"))
+os.environ.setdefault("CHAT_SESSION_SNAPSHOT_DIR", os.path.join(STORAGE_DIR, "chat_snapshots"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from app.services.document_store import DocumentStore  # noqa: E402
+from app.services.embedding_service import embedding_service  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A fresh document store (SQLite file) per test"""
+    return DocumentStore(str(tmp_path / "documents.db"))
+
+
+class HashingModel:
+    """Deterministic bag-of-words stand-in for the sentence transformer
+    (no tokenizer, so token counts are word counts)"""
+
+    dimension = 64
+    max_seq_length = 128
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % self.dimension] += 1.0
+        out[:, 0] += 1e-3  # No all-zero rows
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """The shared embedding service backed by HashingModel, without the disk cache"""
+    model = HashingModel()
+    monkeypatch.setattr(embedding_service, "_model", model)
+    monkeypatch.setattr(embedding_service, "cache_enabled", False)
+    monkeypatch.setattr(embedding_service, "_cache", None)
+    return model
@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.services.bm25 import BM25Index, exact_terms, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "The invoice INV-1077 was paid in March.",
+    "Shipping labels are printed by the warehouse.",
+    "The warehouse ships invoices and labels every day.",
+    "Quarterly report for the board.",
+]
+
+
+def test_tokenize_splits_compound_codes():
+    assert tokenize("Invoice INV-1077, v2.1") == ["invoice", "inv-1077", "inv", "1077", "v2.1", "v2", "1"]
+
+
+def test_exact_terms_are_numbers_codes_and_acronyms():
+    assert exact_terms("Where is INV-1077 in the NASA report from 2021?") == ["inv-1077", "nasa", "2021"]
+
+
+def test_top_k_ranks_matching_texts_only():
+    index = BM25Index(TEXTS)
+    ids, scores = index.top_k("warehouse labels", 10)
+    assert set(ids.tolist()) == {1, 2}
+    assert list(scores) == sorted(scores, reverse=True)
+    assert np.all(scores > 0)
+    assert index.top_k("INV-1077", 1)[0].tolist() == [0]
+
+
+def test_contains_and_document_frequency():
+    index = BM25Index(TEXTS)
+    assert index.contains(0, "1077") and not index.contains(1, "1077")
+    assert index.document_frequency("warehouse") == 2
+    assert index.document_frequency("absent") == 0
+
+
+def test_score_subset_masks_other_texts():
+    index = BM25Index(TEXTS)
+    scores = index.score("warehouse", subset=np.array([2]))
+    assert scores[1] == 0 and scores[2] > 0
+
+
+def test_rare_terms_weigh_more():
+    index = BM25Index(TEXTS)
+    scores = index.score("the march")
+    assert scores[0] > scores[2]  # "march" is rarer than "the"
+
+
+def test_reciprocal_rank_fusion():
+    dense = np.array([3, 1, 2])
+    lexical = np.array([1, 2, 0])
+    # 1 ranks well in both lists; 3 and 0 appear in only one
+    assert reciprocal_rank_fusion([dense, lexical], top_k=4).tolist() == [1, 2, 3, 0]
+    assert reciprocal_rank_fusion([dense, lexical], top_k=2).tolist() == [1, 2]
+    assert reciprocal_rank_fusion([np.array([], dtype=np.int64)], top_k=3).tolist() == []
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import chat
+from app.services.llm_service import llm_service
+
+DOCUMENT = " ".join(
+    f"Section {i}: the {['billing', 'shipping', 'payroll'][i % 3]} module stores record {i * 13} in table T{i}."
+    for i in range(60)
+)
+
+
+class StreamingCompletions:
+    def create(self, model, messages, temperature, max_tokens, stream=False):
+        pieces = ["Record ", "91 ", "is in ", "table T7."]
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))]) for piece in pieces])
+
+
+@pytest.fixture
+def client(embedder, monkeypatch):
+    monkeypatch.setattr(llm_service, "provider", "openai")
+    monkeypatch.setattr(llm_service, "model", "test-model")
+    monkeypatch.setattr(
+        llm_service, "client", SimpleNamespace(chat=SimpleNamespace(completions=StreamingCompletions()))
+    )
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    return TestClient(app)
+
+
+def create_session(client) -> str:
+    response = client.post("/api/chat/upload/", json={"document_text": DOCUMENT, "document_name": "records"})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append({"event": fields["event"], **json.loads(fields["data"])})
+    return events
+
+
+def parse_ndjson(body: str) -> list:
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+@pytest.mark.parametrize("stream_format, media_type, parse", [
+    ("sse", "text/event-stream", parse_sse),
+    ("ndjson", "application/x-ndjson", parse_ndjson),
+])
+def test_stream_llm_answer(client, stream_format, media_type, parse):
+    session_id = create_session(client)
+    response = client.post(
+        f"/api/chat/ask/stream/?format={stream_format}",
+        json={"session_id": session_id, "question": "Where is record 91 stored?", "use_llm": True}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+
+    events = parse(response.text)
+    assert [event["event"] for event in events] == ["sources", "token", "token", "token", "token", "done"]
+    assert events[0]["sources"] and -1.0 <= events[0]["confidence_score"] <= 1.0
+    assert events[-1]["answer"] == "Record 91 is in table T7."
+
+    history = client.get(f"/api/chat/history/{session_id}/").json()["conversation"]
+    assert history[-1] == {**history[-1], "type": "answer", "content": "Record 91 is in table T7."}
+
+
+def test_stream_extractive_answer_ndjson(client):
+    session_id = create_session(client)
+    response = client.post(
+        "/api/chat/ask/stream/?format=ndjson",
+        json={"session_id": session_id, "question": "Which module stores record 91?"}
+    )
+    events = parse_ndjson(response.text)
+    assert [event["event"] for event in events] == ["sources", "token", "done"]
+    assert events[1]["text"] == events[2]["answer"]
+
+
+def test_stream_unknown_session_is_404(client):
+    response = client.post(
+        "/api/chat/ask/stream/", json={"session_id": "missing", "question": "Where is it?", "use_llm": True}
+    )
+    assert response.status_code == 404
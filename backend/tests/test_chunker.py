@@ -0,0 +1,59 @@
+import numpy as np
+
+from app.services.chunker import chunk_by_tokens, chunk_length_stats, find_window_bounds, locate_sentences
+
+
+def count_words(texts):
+    return np.array([len(text.split()) for text in texts], dtype=np.int32)
+
+
+SENTENCES = [" ".join(f"s{i}w{j}" for j in range(3 + i % 5)) + "." for i in range(40)]
+TEXT = " ".join(SENTENCES)
+
+
+def test_chunks_stay_within_token_budget():
+    chunks, tokens, sentences, bounds = chunk_by_tokens(TEXT, count_words, max_tokens=20, overlap_tokens=5, sentences=SENTENCES)
+    assert tokens.tolist() == count_words(chunks).tolist()
+    assert tokens.max() <= 20
+    assert len(chunks) == len(bounds)
+    # Every sentence is covered, in order, starting with the first and ending with the last
+    assert bounds[0, 0] == 0 and bounds[-1, 1] == len(sentences)
+    assert np.all(np.diff(bounds[:, 0]) > 0)
+    assert np.all(bounds[1:, 0] <= bounds[:-1, 1])
+
+
+def test_overlap_repeats_at_most_the_overlap_budget():
+    counts = count_words(SENTENCES)
+    _, _, _, bounds = chunk_by_tokens(TEXT, count_words, max_tokens=20, overlap_tokens=5, sentences=SENTENCES)
+    overlaps = [int(counts[next_first:last].sum()) for (_, last), (next_first, _) in zip(bounds[:-1], bounds[1:])]
+    assert max(overlaps) <= 5
+    assert any(overlaps)
+
+    _, _, _, no_overlap = chunk_by_tokens(TEXT, count_words, max_tokens=20, overlap_tokens=0, sentences=SENTENCES)
+    assert np.array_equal(no_overlap[1:, 0], no_overlap[:-1, 1])
+
+
+def test_long_sentences_are_split_to_fit():
+    long_sentence = " ".join(f"w{i}" for i in range(95)) + "."
+    chunks, tokens, _, _ = chunk_by_tokens(long_sentence, count_words, max_tokens=20, overlap_tokens=0, sentences=[long_sentence])
+    assert tokens.max() <= 20
+    assert " ".join(chunks).split() == long_sentence.split()
+
+
+def test_window_bounds_keep_oversized_sentence_alone():
+    bounds = find_window_bounds(np.array([3, 50, 3, 3]), max_tokens=10)
+    assert bounds.tolist() == [[0, 1], [1, 2], [2, 4]]
+
+
+def test_empty_text():
+    chunks, tokens, sentences, bounds = chunk_by_tokens("   ", count_words, sentences=["  "])
+    assert chunks == [] and len(tokens) == 0 and bounds.shape == (0, 2)
+    assert chunk_length_stats(tokens, 20, 5)["chunks"] == 0
+
+
+def test_locate_sentences_finds_split_pieces_in_the_text():
+    text = "First  sentence here.\n\nA much longer second sentence that\twill be split. Last one."
+    sentences = ["First  sentence here.", "A much longer", "second sentence that will", "be split.", "Last one."]
+    spans = locate_sentences(text, sentences)
+    assert [text[start:end].split() for start, end in spans.tolist()] == [sentence.split() for sentence in sentences]
+    assert spans[-1, 1] == len(text)
@@ -0,0 +1,150 @@
+import pytest
+
+from app.services import document_parser
+from app.services.document_parser import extract_document, extract_pdf_pages, shutdown_pdf_pool
+
+
+def write_pdf(path, page_texts):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+PAGES = [f"Page {number} of the report" for number in range(1, 10)]
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    return write_pdf(tmp_path / "report.pdf", PAGES)
+
+
+@pytest.fixture
+def pdf_pool(monkeypatch):
+    monkeypatch.setattr(document_parser, "PDF_WORKERS", 2)
+    yield
+    shutdown_pdf_pool()
+
+
+def test_parallel_extraction_keeps_page_order(pdf_path, pdf_pool):
+    serial = extract_pdf_pages(pdf_path, parallel=False)
+    parallel = extract_pdf_pages(pdf_path, parallel=True)
+
+    assert not serial["parallel"] and parallel["parallel"]
+    assert parallel["workers"] == 2 and parallel["page_count"] == len(PAGES)
+    assert [page["page"] for page in parallel["pages"]] == list(range(1, len(PAGES) + 1))
+    assert [page["text"] for page in parallel["pages"]] == [page["text"] for page in serial["pages"]]
+    assert [page["text"].strip() for page in serial["pages"]] == PAGES
+
+
+def test_shutdown_stops_the_pool(pdf_path, pdf_pool):
+    extract_pdf_pages(pdf_path, parallel=True)
+    pool = document_parser._pdf_pool
+    assert pool is not None
+
+    shutdown_pdf_pool()
+    assert document_parser._pdf_pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(len, [])
+
+
+def test_page_index_offsets_slice_the_joined_text(pdf_path):
+    result = extract_document(pdf_path, "pdf", parallel=False)
+    text = result["text"]
+    pages = result["page_index"]["pages"]
+
+    assert [page for page, _, _ in pages] == list(range(1, len(PAGES) + 1))
+    assert [text[start:end].strip() for _, start, end in pages] == PAGES
+    assert pages[-1][2] == len(text)
+
+
+@pytest.mark.parametrize("backend", ["pdfminer", pytest.param("pypdfium2", marks=pytest.mark.skipif(
+    document_parser.pdfium is None, reason="pypdfium2 not installed"))])
+def test_fast_backends_match_pdfplumber(pdf_path, backend):
+    result = extract_pdf_pages(pdf_path, parallel=False, backend=backend)
+    assert result["backend"] == backend and result["fallback_pages"] == 0
+    assert [page["text"].strip() for page in result["pages"]] == PAGES
+
+
+def test_garbled_pages_fall_back_to_pdfplumber(pdf_path, monkeypatch):
+    def cid_backend(file_path, page_numbers):
+        for number in page_numbers:
+            yield "(cid:12)(cid:34)" if number % 2 else f"Page {number + 1} of the report"
+
+    monkeypatch.setitem(document_parser.PDF_BACKENDS, "cid", cid_backend)
+    result = extract_pdf_pages(pdf_path, parallel=False, backend="cid")
+
+    assert [page["text"].strip() for page in result["pages"]] == PAGES
+    assert [page["backend"] for page in result["pages"]] == ["cid", "pdfplumber"] * 4 + ["cid"]
+    assert result["fallback_pages"] == 4
+
+
+def test_backend_names_are_resolved(monkeypatch):
+    assert document_parser.resolve_pdf_backend("PDFMiner") == "pdfminer"
+    with pytest.raises(ValueError):
+        document_parser.resolve_pdf_backend("missing")
+
+    monkeypatch.delitem(document_parser.PDF_BACKENDS, "pypdfium2", raising=False)
+    assert document_parser.resolve_pdf_backend("auto") == "pdfminer"
+
+
+def write_docx(path):
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.add_heading("1. Overview", level=1)
+    paragraph = document.add_paragraph("Tabs\tand ")
+    paragraph.add_run("breaks").add_break()
+    paragraph.add_run("across runs")
+    document.add_paragraph("")
+    table = document.add_table(rows=2, cols=2)
+    for row in range(2):
+        for col in range(2):
+            table.cell(row, col).text = f"r{row}c{col}"
+    table.cell(1, 1).add_paragraph("second line")
+    document.add_paragraph("After the table")
+    document.save(str(path))
+    return str(path), docx
+
+
+def test_docx_paragraphs_match_python_docx(tmp_path):
+    path, docx = write_docx(tmp_path / "notes.docx")
+    expected = [paragraph.text for paragraph in docx.Document(path).paragraphs]
+
+    blocks = list(document_parser.iter_docx_blocks(path))
+    assert [block["text"] for block in blocks if block["type"] == "paragraph"] == expected
+    assert document_parser.extract_text_from_docx(path, include_tables=False) == "\n".join(expected)
+
+
+def test_docx_tables_are_emitted_in_place(tmp_path):
+    path, _ = write_docx(tmp_path / "notes.docx")
+    cells = [block for block in document_parser.iter_docx_blocks(path) if block["type"] == "table_cell"]
+    assert [(cell["table"], cell["row"], cell["col"]) for cell in cells] == [(0, 0, 0), (0, 0, 1), (0, 1, 0), (0, 1, 1)]
+    assert cells[-1]["text"] == "r1c1\nsecond line"
+
+    lines = document_parser.extract_text_from_docx(path).split("\n")
+    assert lines[-3:] == ["r0c0\tr0c1", "r1c0\tr1c1 second line", "After the table"]
@@ -0,0 +1,74 @@
+import pytest
+
+
+def add(store, document_id, text, file_type="txt", size=100):
+    extraction = store.put_extraction(f"hash-{text}", file_type, text)
+    return store.add_document(document_id, f"{document_id}.{file_type}", file_type, size, extraction)
+
+
+def test_keyset_cursor_pages_through_every_document_once(store):
+    ids = [f"doc-{i:02d}" for i in range(7)]
+    for document_id in ids:
+        add(store, document_id, f"text of {document_id}")
+
+    seen, cursor = [], None
+    while True:
+        page = store.list_documents(limit=3, cursor=cursor)
+        seen.extend(doc["document_id"] for doc in page["documents"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ids
+    assert store.list_documents(limit=7)["next_cursor"] is None
+
+
+def test_cursor_is_stable_when_earlier_documents_are_deleted(store):
+    for i in range(4):
+        add(store, f"doc-{i}", f"text {i}")
+    first = store.list_documents(limit=2)
+    store.delete_document("doc-0")
+
+    rest = store.list_documents(limit=2, cursor=first["next_cursor"])
+    assert [doc["document_id"] for doc in rest["documents"]] == ["doc-2", "doc-3"]
+
+
+def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.list_documents(cursor="not a cursor")
+
+
+def test_running_totals_follow_adds_and_deletes(store):
+    add(store, "a", "one two three", "txt", 10)
+    add(store, "b", "four five", "pdf", 20)
+    add(store, "c", "one two three", "txt", 10)  # Same extraction as "a"
+    assert store.get_stats() == {
+        "total_documents": 3, "total_size_bytes": 40, "total_words": 8,
+        "file_types": {"txt": 2, "pdf": 1}
+    }
+
+    assert store.delete_document("b")["text_released"]
+    assert store.delete_document("b") is None  # Counted once
+    assert store.get_stats() == {
+        "total_documents": 2, "total_size_bytes": 20, "total_words": 6, "file_types": {"txt": 2}
+    }
+
+
+def test_extraction_released_with_its_last_document(store):
+    add(store, "a", "shared text")
+    add(store, "b", "shared text")
+
+    assert not store.delete_document("a")["text_released"]
+    assert store.get_text("b") == "shared text"
+    assert store.delete_document("b")["text_released"]
+    assert store.get_extraction("hash-shared text", "txt") is None
+
+
+def test_add_document_needs_a_stored_extraction(store):
+    extraction = store.put_extraction("hash", "txt", "text")
+    store.add_document("a", "a.txt", "txt", 1, extraction)
+    store.delete_document("a")
+
+    with pytest.raises(LookupError):
+        store.add_document("b", "b.txt", "txt", 1, extraction)
+    assert store.get_stats()["total_documents"] == 0
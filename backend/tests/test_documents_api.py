@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import documents
+from app.services.mapped_text import MappedTextCache
+from app.utils.helpers import parse_byte_range
+
+TEXT = "page one text\npage two text — ünïcode\n"
+
+
+@pytest.fixture
+def client(store, tmp_path, monkeypatch):
+    for document_id, text in (("doc", TEXT), ("empty", "")):
+        extraction = store.put_extraction(f"hash-{document_id}", "txt", text, {
+            "pages": [[1, 0, 14], [2, 14, len(text)]] if text else [[1, 0, 0]],
+            "headings": []
+        })
+        store.add_document(document_id, f"{document_id}.txt", "txt", len(text), extraction)
+
+    cache = MappedTextCache(store, str(tmp_path / "text_cache"))
+    opened_on_loop = []
+    open_document = cache.open_document
+
+    def record_open(document_id):
+        try:
+            asyncio.get_running_loop()
+            opened_on_loop.append(document_id)
+        except RuntimeError:
+            pass
+        return open_document(document_id)
+
+    monkeypatch.setattr(cache, "open_document", record_open)
+    monkeypatch.setattr(documents, "document_store", store)
+    monkeypatch.setattr(documents, "mapped_text_cache", cache)
+
+    app = FastAPI()
+    app.include_router(documents.router)
+    client = TestClient(app)
+    client.opened_on_loop = opened_on_loop
+    return client
+
+
+def test_stream_and_page_open_the_text_off_the_event_loop(client):
+    response = client.get("/documents/doc/full_text/stream/")
+    assert response.status_code == 200
+    assert response.text == TEXT
+
+    response = client.get("/documents/doc/pages/2/")
+    assert response.status_code == 200
+    assert response.json()["text"] == TEXT[14:]
+
+    assert client.opened_on_loop == []
+
+
+def test_range_requests(client):
+    response = client.get("/documents/doc/full_text/stream/", headers={"Range": "bytes=5-7"})
+    assert response.status_code == 206
+    assert response.content == TEXT.encode("utf-8")[5:8]
+
+    response = client.get("/documents/empty/full_text/stream/", headers={"Range": "bytes=-10"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */0"
+
+
+def test_parse_byte_range():
+    assert parse_byte_range("bytes=0-", 10) == (0, 9)
+    assert parse_byte_range("bytes=-4", 10) == (6, 9)
+    assert parse_byte_range("bytes=5-100", 10) == (5, 9)
+    assert parse_byte_range("bytes=10-", 10) is None
+    assert parse_byte_range("bytes=-10", 0) is None
+    assert parse_byte_range("bytes=0-", 0) is None
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_service import MicroBatcher
+
+
+class RecordingEncoder:
+    """Row i of a call encodes to [value of text, normalize flag]"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, normalize):
+        self.calls.append((list(texts), normalize))
+        if "boom" in texts:
+            raise RuntimeError("encoder failed")
+        return np.array([[float(text), float(normalize)] for text in texts])
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_wait_ms=200, max_items=64)
+    futures = [batcher.submit([str(i), str(i + 10)]) for i in range(3)]
+
+    for i, future in enumerate(futures):
+        np.testing.assert_array_equal(future.result(timeout=5), [[i, 1], [i + 10, 1]])
+    assert encoder.calls == [(["0", "10", "1", "11", "2", "12"], True)]
+
+    stats = batcher.get_stats()
+    assert stats["batches"] == 1 and stats["pending"] == 0
+
+
+def test_batches_are_capped_and_split_by_normalization():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_wait_ms=200, max_items=4)
+    first = batcher.submit(["1", "2"])
+    second = batcher.submit(["3", "4"], normalize=False)
+    third = batcher.submit(["5", "6"])
+
+    np.testing.assert_array_equal(second.result(timeout=5), [[3, 0], [4, 0]])
+    np.testing.assert_array_equal(first.result(timeout=5), [[1, 1], [2, 1]])
+    np.testing.assert_array_equal(third.result(timeout=5), [[5, 1], [6, 1]])
+    assert encoder.calls == [(["1", "2"], True), (["3", "4"], False), (["5", "6"], True)]
+
+
+def test_encoder_errors_reach_every_caller_in_the_batch():
+    encoder = RecordingEncoder()
+    batcher = MicroBatcher(encoder, max_wait_ms=200, max_items=64)
+    futures = [batcher.submit(["boom"]), batcher.submit(["1"])]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="encoder failed"):
+            future.result(timeout=5)
+    np.testing.assert_array_equal(batcher.submit(["7"]).result(timeout=5), [[7, 1]])
@@ -0,0 +1,23 @@
+from app.services.extraction_cache import ExtractionCache
+
+
+def test_repeat_upload_hits_the_stored_extraction(store):
+    cache = ExtractionCache(store)
+    assert cache.get("hash", "txt") is None
+
+    cache.put("hash", "txt", "some extracted text", {"pages": [[1, 0, 19]], "headings": []})
+    entry = cache.get("hash", "txt")
+    assert entry["word_count"] == 3 and entry["character_count"] == 19
+    assert cache.read_text(entry) == "some extracted text"
+    assert cache.get("hash", "pdf") is None
+
+
+def test_hit_counts_are_shared_between_workers(store):
+    # Each worker process has its own ExtractionCache over the same database
+    first, second = ExtractionCache(store), ExtractionCache(store)
+    first.put("hash", "txt", "text")
+    first.get("hash", "txt")
+    second.get("hash", "txt")
+    second.get("other", "txt")
+
+    assert first.get_stats() == second.get_stats() == {"hits": 2, "misses": 1, "hit_rate": 0.667}
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import documents
+from app.services.ingestion_jobs import CANCELLED, QUEUED, IngestionQueue, QueueFullError
+
+
+def test_full_queue_rejects_and_cancel_frees_the_slot(store):
+    cleaned = []
+
+    async def scenario():
+        queue = IngestionQueue(workers=1, queue_depth=1, store=store)
+        queue.register("noop", lambda payload, job: {"ok": True}, cleanup=cleaned.append)
+
+        # No await in between, so no worker can claim the first job yet
+        first = queue.submit("noop", {"n": 1})
+        with pytest.raises(QueueFullError):
+            queue.submit("noop", {"n": 2})
+
+        cancelled = queue.cancel_job(first["job_id"])
+        assert cancelled["status"] == CANCELLED
+        assert cleaned == [{"n": 1}]
+
+        third = queue.submit("noop", {"n": 3})
+        assert third["status"] == QUEUED
+        assert queue.get_stats()["cancelled"] == 1
+
+        finished = await queue.wait_for_job(third["job_id"], timeout=5)
+        assert finished["status"] == "completed" and finished["result"] == {"ok": True}
+        for task in queue._tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_job_kind(store):
+    with pytest.raises(ValueError):
+        IngestionQueue(store=store).submit("missing", {})
+
+
+@pytest.fixture
+def client(store, tmp_path, monkeypatch):
+    # A queue whose workers never start, so uploads stay queued
+    queue = IngestionQueue(workers=1, queue_depth=1, store=store)
+    queue.register("document", documents.ingest_document, cleanup=documents.remove_spooled_upload)
+    queue._wake = asyncio.Event()
+    monkeypatch.setattr(queue, "start", lambda: None)
+    monkeypatch.setattr(documents, "ingestion_queue", queue)
+    monkeypatch.setattr(documents, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    os.makedirs(tmp_path / "uploads")
+
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api")
+    return TestClient(app)
+
+
+def upload(client, name: str):
+    return client.post("/api/upload_file/", files={"file": (name, b"Some plain text to ingest.", "text/plain")})
+
+
+def test_upload_gets_503_when_queue_is_full(client, tmp_path):
+    accepted = upload(client, "first.txt")
+    assert accepted.status_code == 202
+
+    rejected = upload(client, "second.txt")
+    assert rejected.status_code == 503
+    assert "Retry-After" in rejected.headers
+    assert len(os.listdir(tmp_path / "uploads")) == 1  # Rejected upload's spool file removed
+
+    job_id = accepted.json()["job_id"]
+    cancelled = client.delete(f"/api/ingest/jobs/{job_id}/")
+    assert cancelled.status_code == 200 and cancelled.json()["status"] == CANCELLED
+    assert os.listdir(tmp_path / "uploads") == []
+
+    assert upload(client, "third.txt").status_code == 202
+    assert client.delete("/api/ingest/jobs/missing/").status_code == 404
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from app.services.llm_service import llm_service
+
+
+class GeminiChunk:
+    def __init__(self, text=None):
+        self.parts = [text] if text else []
+        self._text = text
+
+    @property
+    def text(self):
+        if not self.parts:
+            raise ValueError("The response has no parts")  # Like a safety-blocked chunk
+        return self._text
+
+
+def test_gemini_stream_skips_chunks_without_parts(monkeypatch):
+    chunks = [GeminiChunk("Hello "), GeminiChunk(), GeminiChunk("world")]
+    monkeypatch.setattr(llm_service, "provider", "gemini")
+    monkeypatch.setattr(llm_service, "client", SimpleNamespace(generate_content=lambda prompt, stream: iter(chunks)))
+
+    assert list(llm_service._stream_llm("prompt")) == ["Hello ", "world"]
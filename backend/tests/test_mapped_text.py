@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from app.services.mapped_text import CHECKPOINT_CHARS, MappedTextCache
+
+# Mixed 1-, 2-, 3- and 4-byte characters, spanning several checkpoints
+TEXT = "".join(f"line {i}: naïve café — 東京 🚀\n" for i in range(1000))
+
+
+@pytest.fixture
+def cache(store, tmp_path):
+    store.put_extraction("hash", "txt", TEXT)
+    return MappedTextCache(store, str(tmp_path / "text_cache"))
+
+
+def test_byte_offsets_match_utf8_encoding(cache):
+    assert len(TEXT) > 3 * CHECKPOINT_CHARS
+    with cache.open("hash", "txt", len(TEXT)) as mapped:
+        assert mapped.byte_size == len(TEXT.encode("utf-8"))
+        for offset in (0, 1, 17, CHECKPOINT_CHARS - 1, CHECKPOINT_CHARS, CHECKPOINT_CHARS + 5,
+                       2 * CHECKPOINT_CHARS + 123, len(TEXT) - 1, len(TEXT)):
+            assert mapped.byte_offset(offset) == len(TEXT[:offset].encode("utf-8"))
+        assert mapped.byte_offset(len(TEXT) + 10) == mapped.byte_size
+
+
+def test_char_windows_and_byte_streaming(cache):
+    with cache.open("hash", "txt", len(TEXT)) as mapped:
+        assert mapped.read_chars(CHECKPOINT_CHARS - 3, 50) == TEXT[CHECKPOINT_CHARS - 3:CHECKPOINT_CHARS + 47]
+        assert mapped.read_chars(len(TEXT) - 10) == TEXT[-10:]
+
+        start, end = mapped.char_range(100, 5000)
+        streamed = b"".join(mapped.iter_bytes(start, end, chunk_size=1000))
+        assert streamed.decode("utf-8") == TEXT[100:5100]
+
+
+def test_remove_deletes_materialized_files(cache):
+    cache.open("hash", "txt", len(TEXT)).close()
+    assert len(os.listdir(cache.cache_dir)) == 2
+    cache.remove("hash", "txt")
+    assert os.listdir(cache.cache_dir) == []
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.services.quantization import QuantizedEmbeddings
+
+
+def unit_vectors(rows=200, dim=384, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("mode, max_error, nbytes_per_value", [
+    ("float32", 0.0, 4),
+    ("float16", 1e-3, 2),
+    ("int8", 2e-2, 1),
+])
+def test_round_trip_error(mode, max_error, nbytes_per_value):
+    vectors = unit_vectors()
+    quantized = QuantizedEmbeddings.quantize(vectors, mode)
+    assert quantized.mode == mode
+    assert quantized.data.nbytes == vectors.size * nbytes_per_value
+
+    restored = quantized.to_float32()
+    assert np.abs(restored - vectors).max() <= max_error
+    # Scores against a query stay within the same bound
+    query = unit_vectors(1, seed=1)[0]
+    assert np.abs(quantized.dot(query)[0] - vectors @ query).max() <= max_error * 10
+
+
+def test_int8_error_is_within_half_a_step():
+    vectors = unit_vectors()
+    quantized = QuantizedEmbeddings.quantize(vectors, "int8")
+    step = np.abs(vectors).max(axis=1) / 127.0
+    error = np.abs(quantized.to_float32() - vectors).max(axis=1)
+    assert np.all(error <= step / 2 + 1e-6)
+
+
+def test_int8_zero_rows_and_rows_subset():
+    vectors = np.vstack([np.zeros(8, dtype=np.float32), unit_vectors(2, 8)])
+    quantized = QuantizedEmbeddings.quantize(vectors, "int8")
+    assert np.all(quantized.rows([0]) == 0)
+    assert np.allclose(quantized.rows([2, 1]), vectors[[2, 1]], atol=1e-2)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        QuantizedEmbeddings.quantize(unit_vectors(2, 4), "int4")
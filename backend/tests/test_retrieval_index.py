@@ -0,0 +1,51 @@
+import gc
+
+import numpy as np
+
+from app.services.retrieval_index import RetrievalIndex, RetrievalIndexCache
+
+
+def make_index(key: str, rows: int = 64, dim: int = 32) -> RetrievalIndex:
+    rng = np.random.default_rng(abs(hash(key)) % 2**32)
+    embeddings = rng.standard_normal((rows, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return RetrievalIndex(key, [f"chunk {i}" for i in range(rows)], embeddings, storage="float32")
+
+
+def test_cache_resident_bytes_stay_under_budget():
+    index_bytes = make_index("probe").nbytes
+    cache = RetrievalIndexCache(max_entries=100, max_bytes=3 * index_bytes)
+
+    for i in range(10):
+        cache.get_or_build(f"doc-{i}", lambda i=i: make_index(f"doc-{i}"))
+        assert cache.resident_nbytes() <= cache.max_bytes
+
+    stats = cache.get_stats()
+    assert stats["indexes"] == 3
+    assert stats["evictions"] == 7
+
+
+def test_cache_keeps_newest_index_over_budget():
+    cache = RetrievalIndexCache(max_entries=100, max_bytes=1)
+    index = cache.get_or_build("big", lambda: make_index("big"))
+    assert cache.get_or_build("big", lambda: make_index("other")) is index
+
+
+def test_evicted_index_is_reused_while_referenced_and_freed_after():
+    index_bytes = make_index("probe").nbytes
+    cache = RetrievalIndexCache(max_entries=100, max_bytes=index_bytes)
+
+    held = cache.get_or_build("held", lambda: make_index("held"))
+    cache.get_or_build("other", lambda: make_index("other"))
+    assert cache.get_stats()["indexes"] == 1
+
+    # Still referenced (e.g. by a chat session): found again, not rebuilt
+    assert cache.get_or_build("held", lambda: make_index("rebuilt")) is held
+    assert cache.builds == 2
+
+    cache.get_or_build("other", lambda: make_index("other"))
+    builds = cache.builds
+    del held
+    gc.collect()
+    cache.get_or_build("held", lambda: make_index("held"))
+    assert cache.builds == builds + 1
@@ -0,0 +1,61 @@
+import os
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from app.services.retrieval_index import RetrievalIndex
+from app.services.session_store import SessionStore
+
+
+def make_session(key: str = "doc:chunking") -> dict:
+    embeddings = np.eye(4, 8, dtype=np.float32)
+    index = RetrievalIndex(key, [f"chunk {i}" for i in range(4)], embeddings, storage="float32")
+    return {
+        "document_text": "chunk 0 chunk 1 chunk 2 chunk 3",
+        "index": index,
+        "metadata": {},
+        "conversation_history": deque(),
+        "created_at": datetime.now().isoformat()
+    }
+
+
+def make_workers(store, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    return SessionStore(store, snapshot_dir=snapshot_dir), SessionStore(store, snapshot_dir=snapshot_dir)
+
+
+def test_snapshot_survives_delete_racing_a_new_session(store, tmp_path):
+    worker_a, worker_b = make_workers(store, tmp_path)
+    worker_b["old"] = make_session()
+    snapshot = worker_b._snapshot_path("doc:chunking", "json")
+
+    # Worker A adds a session on the same document after B's delete
+    # committed but before B removes the (apparently unused) snapshot
+    delete = worker_b.store.delete_chat_sessions
+
+    def delete_then_race(session_ids):
+        unused = delete(session_ids)
+        assert unused == ["doc:chunking"]
+        worker_a["new"] = make_session()
+        return unused
+
+    worker_b.store.delete_chat_sessions = delete_then_race
+    assert worker_b.pop("old")
+    del worker_b.store.delete_chat_sessions
+
+    assert os.path.exists(snapshot)
+    worker_a._forget("new")  # Force a reload from the snapshot
+    assert worker_a.get("new")["index"].chunks == [f"chunk {i}" for i in range(4)]
+
+
+def test_snapshot_removed_with_last_session(store, tmp_path):
+    worker_a, worker_b = make_workers(store, tmp_path)
+    worker_a["one"] = make_session()
+    worker_b["two"] = make_session()
+    snapshot = worker_a._snapshot_path("doc:chunking", "json")
+
+    worker_a.pop("one")
+    assert os.path.exists(snapshot)
+    worker_b.pop("two")
+    assert not os.path.exists(snapshot)
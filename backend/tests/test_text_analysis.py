@@ -0,0 +1,97 @@
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from app.services import text_analysis
+from app.services.text_analysis import analyze_text
+
+DOCUMENT = "".join(
+    f"{topic}. {name.upper()}\n" + " ".join(f"The {name} section states fact {i}." for i in range(40)) + "\n"
+    for topic, name in enumerate(["intro", "methods", "results", "discussion"], 1)
+)
+
+
+class FakePunkt:
+    def span_tokenize(self, text):
+        return iter([(0, len(text))])
+
+
+@pytest.fixture
+def fresh_tokenizer(monkeypatch):
+    """Unloaded tokenizer state and an nltk whose load is slow and counted"""
+    loads = []
+
+    def load(resource):
+        loads.append(resource)
+        time.sleep(0.05)
+        return FakePunkt()
+
+    nltk = types.SimpleNamespace(data=types.SimpleNamespace(load=load), download=lambda *args, **kwargs: None)
+    monkeypatch.setitem(sys.modules, "nltk", nltk)
+    monkeypatch.setattr(text_analysis, "_sentence_tokenizer", None)
+    monkeypatch.setattr(text_analysis, "_sentence_tokenizer_loaded", False)
+    return loads
+
+
+def test_concurrent_first_use_waits_for_one_load(fresh_tokenizer):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(text_analysis.get_sentence_tokenizer()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fresh_tokenizer) == 1
+    assert len(results) == 8 and all(isinstance(result, FakePunkt) for result in results)
+
+
+def test_missing_punkt_is_only_downloaded_when_asked(monkeypatch):
+    downloads = []
+
+    def load(resource):
+        if not downloads:
+            raise LookupError(resource)
+        return FakePunkt()
+
+    nltk = types.SimpleNamespace(data=types.SimpleNamespace(load=load), download=lambda *args, **kwargs: downloads.append(args))
+    monkeypatch.setitem(sys.modules, "nltk", nltk)
+    monkeypatch.setattr(text_analysis, "_sentence_tokenizer_loaded", False)
+    assert text_analysis.load_sentence_tokenizer() is None
+    assert downloads == []
+
+    monkeypatch.setattr(text_analysis, "_sentence_tokenizer_loaded", False)
+    assert isinstance(text_analysis.load_sentence_tokenizer(download=True), FakePunkt)
+    assert len(downloads) == 1
+
+
+def test_window_ends_on_a_topic_boundary():
+    analysis = analyze_text(DOCUMENT)
+    window = analysis.window(len(DOCUMENT) // 2 + 50)
+
+    assert len(window.text) <= len(DOCUMENT) // 2 + 50
+    assert DOCUMENT.startswith(window.text)
+    assert window.topic_titles == analysis.topic_titles[:len(window.topic_titles)]
+    assert window.text.endswith("\n")  # Cut where a topic body ends
+    assert set(window.sentences()) <= set(analysis.sentences())
+
+
+def test_window_starts_at_the_focus_topic():
+    analysis = analyze_text(DOCUMENT)
+    window = analysis.window(len(DOCUMENT) // 3, focus_topics=["results"])
+
+    assert window.text.startswith("The results section")
+    assert window.topic_titles[0] == "3. RESULTS"
+    assert np.all(window.sentence_spans >= 0) and np.all(window.sentence_spans[:, 1] <= len(window.text))
+    assert all(window.text[start:end] in DOCUMENT for start, end in window.sentence_spans.tolist())
+
+
+def test_short_documents_are_not_windowed():
+    analysis = analyze_text(DOCUMENT)
+    assert analysis.window(len(DOCUMENT)) is analysis
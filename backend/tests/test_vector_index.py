@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from app.services import vector_index as vector_index_module
+from app.services.document_store import document_store
+from app.services.text_analysis import analysis_cache, analyze_text
+from app.services.vector_index import VectorIndex
+
+DIMENSION = 16
+CHUNKS_PER_DOCUMENT = 40
+
+
+def document_vectors(doc: int) -> np.ndarray:
+    """Chunks of one document cluster around their own direction"""
+    rng = np.random.default_rng(doc)
+    center = rng.standard_normal(DIMENSION)
+    vectors = center + 0.1 * rng.standard_normal((CHUNKS_PER_DOCUMENT, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def spans(rows: int) -> np.ndarray:
+    return np.array([(i * 100, i * 100 + 100) for i in range(rows)])
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), nprobe=64, train_min=100)
+    for doc in range(6):
+        assert index.add_document(f"doc-{doc}", spans(CHUNKS_PER_DOCUMENT), document_vectors(doc)) == CHUNKS_PER_DOCUMENT
+    return index
+
+
+def test_search_after_training_finds_the_exact_chunk(index):
+    stats = index.get_stats()
+    assert stats["trained"] and stats["lists"] > 1
+    assert stats["vectors"] == 6 * CHUNKS_PER_DOCUMENT
+
+    query = document_vectors(3)[7]
+    best = index.search(query, top_k=5)
+    assert (best[0]["document_id"], best[0]["chunk_index"], best[0]["start"], best[0]["end"]) == ("doc-3", 7, 700, 800)
+    assert best[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert [hit["score"] for hit in best] == sorted((hit["score"] for hit in best), reverse=True)
+
+
+def test_adding_a_document_twice_is_a_no_op(index):
+    assert index.add_document("doc-0", spans(CHUNKS_PER_DOCUMENT), document_vectors(0)) == 0
+    assert index.get_stats()["stored_rows"] == 6 * CHUNKS_PER_DOCUMENT
+
+
+def test_deleted_documents_disappear_from_search(index):
+    assert index.delete_document("doc-3")
+    assert not index.delete_document("doc-3")
+    assert not index.has_document("doc-3")
+
+    hits = index.search(document_vectors(3)[7], top_k=20)
+    assert hits and all(hit["document_id"] != "doc-3" for hit in hits)
+    assert index.get_stats()["deleted_rows"] == CHUNKS_PER_DOCUMENT
+
+
+def test_compaction_drops_deleted_rows_for_every_reader(index, tmp_path):
+    reader = VectorIndex(str(tmp_path / "index"), nprobe=64, train_min=100)
+    assert reader.get_stats()["vectors"] == 6 * CHUNKS_PER_DOCUMENT
+
+    for doc in (0, 1):
+        index.delete_document(f"doc-{doc}")
+    stats = index.get_stats()
+    assert stats["generation"] == 1  # Over the compaction ratio
+    assert stats["stored_rows"] == stats["vectors"] == 4 * CHUNKS_PER_DOCUMENT
+
+    # Another instance (worker) reloads after the generation bump
+    assert reader.get_stats()["stored_rows"] == 4 * CHUNKS_PER_DOCUMENT
+    best = reader.search(document_vectors(5)[11], top_k=1)[0]
+    assert (best["document_id"], best["chunk_index"]) == ("doc-5", 11)
+    assert all(hit["document_id"] not in ("doc-0", "doc-1") for hit in reader.search(document_vectors(0)[0], top_k=40))
+
+
+def test_mismatched_dimension(index):
+    with pytest.raises(ValueError):
+        index.add_document("other", spans(1), np.ones((1, DIMENSION + 1), dtype=np.float32))
+
+
+def test_index_document_embeds_token_bounded_chunks(embedder, tmp_path, monkeypatch):
+    text = " ".join(
+        f"Sentence {i} talks about topic {i % 7} with some extra filler words to pad it out." for i in range(30)
+    ) + " " + " ".join(f"word{i}" for i in range(90)) + "."
+    extraction = document_store.put_extraction("index-document-hash", "txt", text)
+    document_store.add_document("indexed-doc", "indexed.txt", "txt", len(text), extraction)
+    analysis_cache.save("index-document-hash", "txt", analyze_text(text))
+
+    embedder.max_seq_length = 22  # 20 tokens (words) per chunk
+    index = VectorIndex(str(tmp_path / "index"))
+    monkeypatch.setattr(vector_index_module, "vector_index", index)
+    added = vector_index_module.index_document("indexed-doc")
+
+    spans = [tuple(chunk) for _, chunk in sorted(
+        (row, index._row_chunks[row][1:].tolist()) for row in range(index.get_stats()["stored_rows"])
+    )]
+    assert added == len(spans) > 1
+    chunk_words = [text[start:end].split() for start, end in spans]
+    assert max(len(words) for words in chunk_words) <= 20
+    # Chunks tile the document in order without overlap
+    assert sum(chunk_words, []) == text.split()
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    assert vector_index_module.index_document("indexed-doc") == 0